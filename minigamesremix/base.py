@@ -4,8 +4,12 @@ from typing import List, Optional, Type, Union
 from datetime import datetime
 from redbot.core import commands, bank, errors
 
+from minigames.rng import RngService
+
 
 class BaseMinigameCog(commands.Cog):
+    rng: RngService
+
     @abstractmethod
     async def is_economy_enabled(self, guild: discord.Guild) -> bool:
         pass
@@ -27,7 +31,9 @@ class Minigame(ABC):
         self.bet = bet
         self.players = players
         self.channel = channel
+        self.rng = cog.rng.stream(f"{type(self).__name__} {channel.id}")  # for the bot's moves
         self.message: Optional[discord.Message] = None
+        self.view: Optional[discord.ui.View] = None  # the latest one that never times out
         self.last_interacted: datetime = datetime.now()
         self.init_done = False
         self.payout_done = False
@@ -1,4 +1,3 @@
-import random
 import discord
 from enum import Enum
 from typing import List, Optional
@@ -98,7 +97,7 @@ class ConnectFourGame(Minigame):
                 moves.pop(move)
         least_loses = min(moves.values())
         final_options = [col for col, val in moves.items() if val == least_loses]
-        move = random.choice(final_options)
+        move = self.rng.choice(final_options)
         await self.do_turn(self.member(self.current), move)
 
     def is_finished(self) -> bool:
@@ -155,12 +154,11 @@ class ConnectFourGame(Minigame):
     def available_columns(cls, board: Board): 
         return [col for col in range(board.width) if cls.get_highest_slot(board, col) is not None]
     
-    @classmethod
-    def get_random_unoccupied(cls, board: Board) -> int:
-        available_columns = cls.available_columns(board)
+    def get_random_unoccupied(self, board: Board) -> int:
+        available_columns = self.available_columns(board)
         if not available_columns:
             raise ValueError("No available columns")
-        return random.choice(available_columns)
+        return self.rng.choice(available_columns)
     
     @classmethod
     def may_lose_count(cls, board: Board, color: Player, current: Player, time: int, depth: int):
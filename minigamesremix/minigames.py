@@ -1,6 +1,6 @@
 import logging
 import discord
-from typing import Dict, List, Optional, Type, Union
+from typing import List, Optional, Type, Union
 from datetime import datetime
 from redbot.core import commands, app_commands, bank, Config
 from redbot.core.bot import Red
@@ -8,6 +8,8 @@ from redbot.core.utils.chat_formatting import humanize_timedelta
 
 from minigames.base import Minigame, BaseMinigameCog
 from minigames.connect4 import ConnectFourGame
+from minigames.registry import GameRegistry
+from minigames.rng import RngService
 from minigames.tictactoe import TicTacToeGame
 from minigames.views.replace_view import ReplaceView
 
@@ -26,7 +28,8 @@ class Minigames(BaseMinigameCog):
         super().__init__()
         self.bot = bot
         self.allowedguilds = set()
-        self.games: Dict[int, Minigame] = {}
+        self.games = GameRegistry()
+        self.rng = RngService()
         self.config = Config.get_conf(self, identifier=7669699620)
         default_config = {
             "connect4_payout": 100,
@@ -35,6 +38,14 @@ class Minigames(BaseMinigameCog):
         self.config.register_guild(**default_config)
         self.config.register_global(**default_config)
 
+    async def cog_load(self) -> None:
+        self.games.start()
+
+    async def cog_unload(self) -> None:
+        self.games.close()
+        metrics = self.games.metrics()
+        log.info(f"Cleaned up {metrics['evicted']} finished and {metrics['abandoned']} abandoned games this session, {metrics['games']} were left")
+
     async def is_economy_enabled(self, guild: discord.Guild) -> bool:
         economy = self.bot.get_cog("Economy")
         return economy is not None and not await self.bot.cog_disabled_in_guild(economy, guild)
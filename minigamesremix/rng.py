@@ -0,0 +1,39 @@
+import random
+import logging
+import secrets
+from typing import Optional
+
+log = logging.getLogger("red.crab-cogs.minigames.rng")
+
+SEED_BITS = 64
+
+
+class GameRng(random.Random):
+    """A stream of random numbers for one game, which remembers the seed it started from."""
+
+    def __init__(self, seed: int, purpose: str):
+        super().__init__(seed)
+        self.initial_seed = seed
+        self.purpose = purpose
+
+
+class RngService:
+    """
+    Hands out the random number streams of the games. Each game draws from its own Mersenne Twister,
+    seeded from the system's cryptographically secure generator, and the seed is logged,
+    so that the bot's moves in a game can be played again exactly the same way from it.
+    Given a master seed of its own, every stream it hands out is reproducible, for tests.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self.master = random.Random(seed) if seed is not None else None
+
+    def seed(self, purpose: str) -> int:
+        """A new seed, logged."""
+        seed = self.master.getrandbits(SEED_BITS) if self.master else secrets.randbits(SEED_BITS)
+        log.debug(f"Seeded {purpose} with {seed:#x}")
+        return seed
+
+    def stream(self, purpose: str) -> GameRng:
+        """A new stream for a single game."""
+        return GameRng(self.seed(purpose), purpose)
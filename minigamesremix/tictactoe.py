@@ -1,4 +1,3 @@
-import random
 import discord
 from enum import Enum
 from typing import List, Optional, Tuple
@@ -116,7 +115,7 @@ class TicTacToeGame(Minigame):
                     empty_slots.append((x, y))
         if not empty_slots:
             raise ValueError("No empty slots")
-        return random.choice(empty_slots)
+        return self.rng.choice(empty_slots)
     
 
     async def get_content(self) -> Optional[str]:
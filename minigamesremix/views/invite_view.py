@@ -12,6 +12,7 @@ class InviteView(discord.ui.View):
     def __init__(self, game: Minigame, currency_name: str):
         super().__init__(timeout=None)
         self.game = game
+        game.view = self
         currency_name = re.sub(r"<a?:(\w+):\d+>", r"\1", currency_name)  # extract emoji name
         label = "Accept" if game.bet == 0 else f"Accept and bet {humanize_number(game.bet)} {currency_name}"[:MAX_BUTTON_LABEL]
         accept_button = discord.ui.Button(label=label, style=discord.ButtonStyle.primary)
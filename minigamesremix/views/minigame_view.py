@@ -7,6 +7,7 @@ class MinigameView(discord.ui.View):
     def __init__(self, game: Minigame):
         super().__init__(timeout=None)
         self.game = game
+        game.view = self
         if not self.game.is_finished():
             bump_button = discord.ui.Button(emoji="⬇️", label="Bump", style=discord.ButtonStyle.primary, row=4)
             end_button = discord.ui.Button(emoji="🏳️", label="Surrender", style=discord.ButtonStyle.danger, row=4)
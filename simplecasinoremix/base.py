@@ -1,26 +1,48 @@
-import random
+import base64
+import asyncio
+import logging
 import discord
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Dict, List, Optional, Set, Tuple, Union
 from datetime import datetime
-from redbot.core import Config, commands
+from redbot.core import Config, bank, commands
 from redbot.core.bot import Red
+from redbot.core.data_manager import cog_data_path
 
-from simplecasino.card import Card, make_deck
-from simplecasino.utils import POKER_MAX_PLAYERS, POKER_MINIMUM_BET, PokerState
+from simplecasino.card import Shoe
+from simplecasino.equity import EquityCalculator
+from simplecasino.history import HandHistory
+from simplecasino.pokercore import PokerEngine
+from simplecasino.registry import GameRegistry
+from simplecasino.rng import RngService
+from simplecasino.scheduler import EditScheduler
+from simplecasino.settlement import SettlementJournal
+from simplecasino.stats import GLOBAL_SCOPE, StatsAggregator
+from simplecasino.utils import POKER_MINIMUM_BET
+
+log = logging.getLogger("red.crab-cogs.simplecasino")
+
+SHOE_SAVE_DELAY = 30  # seconds, a blackjack shoe is saved at most this long after being dealt from
 
 
 class BaseCasinoCog(commands.Cog):
     def __init__(self, bot: Red):
         self.bot = bot
-        self.poker_games: Dict[int, BasePokerGame] = {}
+        self.poker_games = GameRegistry()
+        self.equity = EquityCalculator()
+        self.edits = EditScheduler()
+        self.saves_avoided = 0  # poker state writes skipped by coalescing them
         self.config = Config.get_conf(self, identifier=766962065)
         default_config = {
             "bjmin": 10,
             "bjmax": 1000,
             "bjtime": 5,
+            "bjdecks": 6,
+            "bjpenetration": 75,  # percent of the shoe dealt before reshuffling
+            "bjhints": True,
             "pokermin": POKER_MINIMUM_BET,
             "pokermax": 1000,
+            "pokerbots": False,
             "coinfreespin": True,
             "sloteasy": False,
         }
@@ -33,6 +55,7 @@ class BaseCasinoCog(commands.Cog):
         }
         channel_config = {
             "game": {},  # poker
+            "bjshoe": "",  # base64
         }
         user_stats = {
             "slotcount": 0,
@@ -55,8 +78,80 @@ class BaseCasinoCog(commands.Cog):
         self.config.register_user(**user_stats)
         self.config.register_member(**user_stats)
         self.config.register_channel(**channel_config)
-        self.config.register_guild(**default_config)
+        self.config.register_guild(**default_config, tournament={})
         self.config.register_global(**default_config, **emojis_config)
+        self.emojis: Dict[str, str] = {key[len("emoji_"):]: value for key, value in emojis_config.items()}
+        self.currency_names: Dict[int, str] = {}  # by guild
+        self.shoes: Dict[int, Shoe] = {}  # by channel
+        self.shoe_save_tasks: Dict[int, asyncio.Task] = {}
+        self.stats = StatsAggregator(self.config, cog_data_path(self) / "stats_journal.jsonl")
+        self.history = HandHistory(cog_data_path(self) / "poker_history.db")
+        self.settlements = SettlementJournal(cog_data_path(self) / "poker_settlements.jsonl")
+        self.rng = RngService()
+
+    async def load_emoji_cache(self) -> None:
+        for name in self.emojis:
+            self.emojis[name] = await self.config.__getattr__("emoji_" + name)()
+
+    def emoji(self, name: str) -> str:
+        return self.emojis[name]
+
+    async def set_emoji(self, name: str, value: str) -> None:
+        await self.config.__getattr__("emoji_" + name).set(value)
+        self.emojis[name] = value
+
+    async def get_currency_name(self, guild: discord.Guild) -> str:
+        if guild.id not in self.currency_names:
+            self.currency_names[guild.id] = await bank.get_currency_name(guild)
+        return self.currency_names[guild.id]
+
+    async def get_shoe(self, channel: discord.TextChannel) -> Shoe:
+        """The blackjack shoe of a channel, shuffled if the cut card was reached and ready for a new round."""
+        is_global = await bank.is_global()
+        settings = self.config if is_global else self.config.guild(channel.guild)
+        decks = await settings.bjdecks()
+        penetration = await settings.bjpenetration() / 100
+        shoe = self.shoes.get(channel.id)
+        if shoe is None and (data := await self.config.channel(channel).bjshoe()):
+            try:
+                shoe = Shoe.from_bytes(base64.b64decode(data))
+            except ValueError:
+                log.warning(f"Discarding invalid blackjack shoe in {channel.id}")
+        if shoe is None or shoe.decks != decks:
+            shoe = Shoe(decks, penetration)
+            shoe.size = 0  # shuffled with its own stream below
+        else:
+            shoe.set_penetration(penetration)
+        if shoe.rng is None:
+            shoe.rng = self.rng.stream(f"blackjack {channel.id}")
+        if shoe.needs_shuffle:
+            shoe.shuffle(shoe.rng)
+        self.shoes[channel.id] = shoe
+        return shoe
+
+    def save_shoe(self, channel_id: int) -> None:
+        if channel_id not in self.shoe_save_tasks:
+            self.shoe_save_tasks[channel_id] = asyncio.create_task(self.delayed_save_shoe(channel_id))
+
+    async def delayed_save_shoe(self, channel_id: int) -> None:
+        await asyncio.sleep(SHOE_SAVE_DELAY)
+        await self.flush_shoe(channel_id)
+
+    async def flush_shoe(self, channel_id: int) -> None:
+        task = self.shoe_save_tasks.pop(channel_id, None)
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+        if channel_id in self.shoes:
+            data = base64.b64encode(self.shoes[channel_id].to_bytes()).decode()
+            await self.config.channel_from_id(channel_id).bjshoe.set(data)
+
+    async def stats_scope(self, guild: discord.Guild) -> int:
+        return GLOBAL_SCOPE if await bank.is_global() else guild.id
+
+    @commands.Cog.listener()
+    async def on_command_completion(self, ctx: commands.Context):
+        if ctx.command.qualified_name in ("bankset creditsname", "bankset toggleglobal"):
+            self.currency_names.clear()
 
     @abstractmethod
     async def slot(self, ctx: Union[discord.Interaction, commands.Context], bet: int):
@@ -67,11 +162,13 @@ class BaseCasinoCog(commands.Cog):
         pass
 
     @abstractmethod
-    async def poker(self, ctx: Union[discord.Interaction, commands.Context], players: List[discord.Member], starting_bet: int) -> bool:
+    async def poker(self, ctx: Union[discord.Interaction, commands.Context], players: List[discord.Member], starting_bet: int, bots: int = 0) -> bool:
         pass
 
 
-class BasePokerGame(ABC):
+class BasePokerGame(PokerEngine, ABC):
+    """A game of poker in a channel, applying the events of its rules to the bank and to Discord."""
+
     def __init__(
         self,
         cog: BaseCasinoCog,
@@ -79,22 +176,20 @@ class BasePokerGame(ABC):
         channel: Union[discord.TextChannel, discord.Thread],
         minimum_bet: int = 0,
     ):
+        rng = cog.rng.stream(f"poker {channel.id}")
+        super().__init__([p.id for p in players], minimum_bet, rng)
         self.cog = cog
-        self.players_ids = [p.id for p in players][:POKER_MAX_PLAYERS]
         self.channel = channel
-        self.deck: List[Card] = make_deck()
-        random.shuffle(self.deck)
-        self.table: List[Card] = []
-        self.state: PokerState = PokerState.WaitingForPlayers
-        self.minimum_bet = minimum_bet
-        self.current_bet = minimum_bet
-        self.pot = 0
-        self.turn: Optional[int] = None  # index of current player
-        self.all_hands_finished: bool = False
         self.last_interacted: datetime = datetime.now()
-        self.message: Optional[discord.Message] = None
+        self.message: Optional[Union[discord.Message, discord.PartialMessage]] = None
         self.view: Optional[discord.ui.View] = None
-        self.is_cancelled = False
+        self.save_task: Optional[asyncio.Task] = None  # pending write of unsaved changes
+        self.finished_saved = False
+        self.hand_id: Optional[int] = None  # in the hand history, once finished
+        self.bot_equities: Dict[Tuple[int, int], float] = {}  # by bot id and number of cards on the table
+        self.rng = rng  # deals every hand of the session, and decides for the bots
+        self.leaving: Set[int] = set()  # players who won't be dealt the next hand of the session
+        self.balance_cache: Dict[int, Tuple[int, float]] = {}  # by user id, with when it was asked from the bank
 
     @abstractmethod
     async def update_message(self, interaction: Optional[discord.Interaction] = None):
@@ -104,30 +199,16 @@ class BasePokerGame(ABC):
     async def send_cards(self, interaction: discord.Interaction) -> None:
         pass
 
-    @abstractmethod
-    def try_add_player(self, user_id: int) -> Tuple[bool, str]:
-        pass
-
-    @abstractmethod
-    def try_remove_player(self, user_id: int) -> Tuple[bool, str]:
-        pass
-
     @abstractmethod
     async def cancel(self) -> None:
         pass
 
-    @property
     @abstractmethod
-    def can_check(self) -> bool:
-        pass
-
-    @property
-    @abstractmethod
-    def is_finished(self) -> bool:
+    async def start_hand(self) -> None:
         pass
 
     @abstractmethod
-    async def start_hand(self) -> None:
+    async def next_hand(self) -> bool:
         pass
 
     @abstractmethod
@@ -143,13 +224,17 @@ class BasePokerGame(ABC):
         pass
 
     @abstractmethod
-    async def end_hand(self, *winners_indices: int) -> None:
+    async def get_embed(self) -> discord.Embed:
         pass
 
     @abstractmethod
-    async def get_embed(self) -> discord.Embed:
+    async def get_currency_name(self) -> str:
         pass
 
     @abstractmethod
     async def save_state(self) -> None:
         pass
+
+    @abstractmethod
+    async def flush_state(self) -> None:
+        pass
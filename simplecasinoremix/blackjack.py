@@ -1,60 +1,22 @@
-import random
 import logging
 import asyncio
 import discord
-from typing import List
+from functools import partial
 from redbot.core import bank, errors
 from redbot.core.utils.chat_formatting import humanize_number
 
 from simplecasino.base import BaseCasinoCog
-from simplecasino.card import Card, CardValue, CARD_EMOJI, make_deck
+from simplecasino.blackjackcore import TWENTYONE, BlackjackRound, get_hand_value
+from simplecasino.card import CARD_EMOJI, Shoe
+from simplecasino.metrics import phase, timed
+from simplecasino.strategy import advise
 from simplecasino.views.again_view import AgainView
 
 log = logging.getLogger("red.crab-cogs.simplecasino.blackjack")
 
-TWENTYONE = 21
-DEALER_STAND = 17
-MAX_HANDS = 4
 ERROR_PLAYER = "You're not the one playing!"
 
 
-def get_hand_value(hand: List[Card]) -> int:
-    total = 0
-    aces = 0
-    for card in hand:
-        if card.value == CardValue.ACE:
-            aces += 1
-            total += 11  # assume Ace is 11 for now
-        else:
-            total += min(10, card.value.value)
-    while total > TWENTYONE and aces > 0:
-        total -= 10
-        aces -= 1
-    return total
-
-
-class BlackjackHand:
-    def __init__(self, cards: List[Card], bet: int, is_split: bool = False, is_doubled: bool = False):
-        self.cards = cards
-        self.bet = bet
-        self.is_split = is_split
-        self.is_doubled = is_doubled
-        self.is_complete = False
-    
-    def get_value(self) -> int:
-        return get_hand_value(self.cards)
-    
-    def can_split(self) -> bool:
-        if len(self.cards) != 2 or self.is_split:
-            return False
-        val1 = 11 if self.cards[0].value == CardValue.ACE else min(10, self.cards[0].value.value)
-        val2 = 11 if self.cards[1].value == CardValue.ACE else min(10, self.cards[1].value.value)
-        return val1 == val2
-    
-    def can_double(self) -> bool:
-        return len(self.cards) == 2 and not self.is_doubled
-
-
 class Blackjack(discord.ui.View):
     def __init__(self,
                  cog: BaseCasinoCog,
@@ -63,6 +25,8 @@ class Blackjack(discord.ui.View):
                  bet: int,
                  embed_color: discord.Color,
                  include_author: bool,
+                 shoe: Shoe,
+                 hints: bool = False,
                  ):
         super().__init__(timeout=None)
         self.cog = cog
@@ -71,270 +35,196 @@ class Blackjack(discord.ui.View):
         self.initial_bet = bet
         self.embed_color = embed_color
         self.include_author = include_author
-        self.dealer: List[Card] = []
-        self.hands: List[BlackjackHand] = []
-        self.current_hand_index = 0
-        self.deck = make_deck()
-        random.shuffle(self.deck)
-        
-        # deal initial cards
-        initial_cards = [self.deck.pop(), self.deck.pop()]
-        self.hands.append(BlackjackHand(initial_cards, bet))
-        self.dealer.append(self.deck.pop())
-        self.dealer.append(self.deck.pop())
-        
-        self.facedown = True
-        self.dealer_turn_started = False
+        self.round = BlackjackRound(shoe, bet)
+        self.decks = shoe.decks
+        self.hints = hints
         self.payout_done = False
-        self.total_bet = bet
 
         # create buttons
         self.hit_button = discord.ui.Button(label="Hit", style=discord.ButtonStyle.green)
         self.stand_button = discord.ui.Button(label="Stand", style=discord.ButtonStyle.red)
         self.double_button = discord.ui.Button(label="Double", style=discord.ButtonStyle.blurple)
         self.split_button = discord.ui.Button(label="Split", style=discord.ButtonStyle.grey)
+        self.hint_button = discord.ui.Button(emoji="💡", style=discord.ButtonStyle.grey)
         
         self.hit_button.callback = self.hit
         self.stand_button.callback = self.stand
         self.double_button.callback = self.double_down
         self.split_button.callback = self.split
+        self.hint_button.callback = self.hint
         
         self.update_buttons()
 
     def update_buttons(self):
-        self.clear_items()
-        current_hand = self.hands[self.current_hand_index]
-        
-        # natural 21
-        if current_hand.get_value() == TWENTYONE and len(current_hand.cards) == 2:
-            current_hand.is_complete = True
-            self.move_to_next_hand()
+        if self.round.dealer_turn_started:  # the buttons stay, disabled, for the dealer's turn
             return
-        
-        if current_hand.get_value() < TWENTYONE and not current_hand.is_doubled:
-            self.add_item(self.hit_button)
-            self.add_item(self.stand_button)
-            if current_hand.can_double():
-                self.add_item(self.double_button)
-            if current_hand.can_split() and len(self.hands) < MAX_HANDS:
-                self.add_item(self.split_button)
-
-        elif current_hand.is_doubled or current_hand.get_value() >= TWENTYONE:
-            current_hand.is_complete = True
-            self.move_to_next_hand()
-
-    def move_to_next_hand(self):
-        self.current_hand_index += 1
-        if self.current_hand_index < len(self.hands):
-            self.update_buttons()
-        else:
-            self.facedown = False
-            self.dealer_turn_started = True
-
-    def is_over(self) -> bool:
-        if not self.dealer_turn_started:
-            return False
-        if all(hand.get_value() > TWENTYONE for hand in self.hands):
-            return True
-        if len(self.hands) == 1 and self.hands[0].get_value() == TWENTYONE and len(self.hands[0].cards) == 2:  # natural 21
-            return True
-        dealer_total = get_hand_value(self.dealer)
-        return dealer_total >= DEALER_STAND
-
-    def is_tie(self, hand: BlackjackHand) -> bool:
-        player_total = hand.get_value()
-        dealer_total = get_hand_value(self.dealer)
-        return player_total <= TWENTYONE and dealer_total <= TWENTYONE and player_total == dealer_total
-
-    def is_win(self, hand: BlackjackHand) -> bool:
-        player_total = hand.get_value()
-        dealer_total = get_hand_value(self.dealer)
-        if player_total > TWENTYONE:
-            return False
-        if dealer_total > TWENTYONE:
-            return True
-        return player_total > dealer_total
-    
-    def payout_amount(self, hand: BlackjackHand) -> int:
-        if self.is_tie(hand):
-            return hand.bet
-        if not self.is_win(hand):
-            return 0
-        
-        player_total = hand.get_value()
-        dealer_total = get_hand_value(self.dealer)
-        is_player_natural = len(hand.cards) == 2 and player_total == TWENTYONE and not hand.is_split
-        is_dealer_natural = len(self.dealer) == 2 and dealer_total == TWENTYONE
-        
-        if is_player_natural and not is_dealer_natural:
-            return hand.bet * 5 // 2
-        else:
-            return 2 * hand.bet
+        self.clear_items()
+        self.add_item(self.hit_button)
+        self.add_item(self.stand_button)
+        if self.round.can_double():
+            self.add_item(self.double_button)
+        if self.round.can_split():
+            self.add_item(self.split_button)
+        if self.hints:
+            self.add_item(self.hint_button)
 
-    def total_payout(self) -> int:
-        return sum(self.payout_amount(hand) for hand in self.hands)
-    
     async def check_payout(self):
-        if not self.payout_done and self.is_over():
+        if not self.payout_done and self.round.is_over():
             self.payout_done = True
-            total_payout = self.total_payout()
+            self.cog.save_shoe(self.channel.id)
+            total_payout = self.round.total_payout()
             if total_payout > 0:
-                try:
-                    await bank.deposit_credits(self.player, total_payout)
-                except errors.BalanceTooHigh:
-                    await bank.deposit_credits(self.player, await bank.get_max_balance(self.channel.guild))
+                with phase("bank"):
+                    try:
+                        await bank.deposit_credits(self.player, total_payout)
+                    except errors.BalanceTooHigh:
+                        await bank.deposit_credits(self.player, await bank.get_max_balance(self.channel.guild))
             # stats
-            statconfig = self.cog.config.user(self.player) if await bank.is_global() else self.cog.config.member(self.player)
-            async with statconfig.all() as stats:
-                stats["bjcount"] += 1
-                total_payout = self.total_payout()
-                net_profit = total_payout - self.total_bet
-                stats["bjprofit"] += total_payout
-                stats["bjbetted"] += self.total_bet
-                if net_profit > 0:
-                    stats["bjwincount"] += 1
-                elif net_profit < 0:
-                    stats["bjlosscount"] += 1
-                else:
-                    stats["bjtiecount"] += 1
-                for hand in self.hands:
-                    if hand.get_value() == TWENTYONE:
-                        stats["bj21count"] += 1
-                if len(self.hands) == 1 and len(self.hands[0].cards) == 2 and self.hands[0].get_value() == TWENTYONE:
-                    stats["bjnatural21count"] += 1
-
+            net_profit = total_payout - self.round.total_bet
+            with phase("stats"):
+                await self.cog.stats.add(await self.cog.stats_scope(self.channel.guild), self.player.id, {
+                    "bjcount": 1,
+                    "bjprofit": total_payout,
+                    "bjbetted": self.round.total_bet,
+                    "bjwincount": int(net_profit > 0),
+                    "bjlosscount": int(net_profit < 0),
+                    "bjtiecount": int(net_profit == 0),
+                    "bj21count": sum(hand.get_value() == TWENTYONE for hand in self.round.hands),
+                    "bjnatural21count": int(self.round.is_natural()),
+                })
+
+    @timed("blackjack.hit")
     async def hit(self, interaction: discord.Interaction):
         if interaction.user != self.player:
             return await interaction.response.send_message(ERROR_PLAYER, ephemeral=True)
         
-        current_hand = self.hands[self.current_hand_index]
-        current_hand.cards.append(self.deck.pop())
-        
-        if current_hand.get_value() >= TWENTYONE:
-            current_hand.is_complete = True
-            self.move_to_next_hand()
-            
-            if self.dealer_turn_started:
-                await self.dealer_turn(interaction)
-            else:
-                await interaction.response.edit_message(embed=await self.get_embed(), view=self)
-        else:
-            self.update_buttons()
-            await interaction.response.edit_message(embed=await self.get_embed(), view=self)
+        self.round.hit()
+        await self.after_action(interaction)
         
+    @timed("blackjack.stand")
     async def stand(self, interaction: discord.Interaction):
         if interaction.user != self.player:
             return await interaction.response.send_message(ERROR_PLAYER, ephemeral=True)
         
-        current_hand = self.hands[self.current_hand_index]
-        current_hand.is_complete = True
-        self.move_to_next_hand()
-        
-        if self.dealer_turn_started:
-            await self.dealer_turn(interaction)
-        else:
-            await interaction.response.edit_message(embed=await self.get_embed(), view=self)
+        self.round.stand()
+        await self.after_action(interaction)
     
+    @timed("blackjack.double_down")
     async def double_down(self, interaction: discord.Interaction):
         if interaction.user != self.player:
             return await interaction.response.send_message(ERROR_PLAYER, ephemeral=True)
         
-        current_hand = self.hands[self.current_hand_index]
+        current_hand = self.round.current_hand
         
-        if not await bank.can_spend(self.player, current_hand.bet):
-            currency_name = await bank.get_currency_name(self.channel.guild)
+        with phase("bank"):
+            can_spend = await bank.can_spend(self.player, current_hand.bet)
+            if can_spend:
+                await bank.withdraw_credits(self.player, current_hand.bet)
+        if not can_spend:
+            currency_name = await self.cog.get_currency_name(self.channel.guild)
             return await interaction.response.send_message(f"You don't have enough {currency_name} to double down!", ephemeral=True)
-        await bank.withdraw_credits(self.player, current_hand.bet)
-        
-        self.total_bet += current_hand.bet
-        current_hand.bet *= 2
-        current_hand.is_doubled = True
         
-        # deal one card and automatic stand
-        current_hand.cards.append(self.deck.pop())
-        current_hand.is_complete = True
-        self.move_to_next_hand()
-        
-        if self.dealer_turn_started:
-            await self.dealer_turn(interaction)
-        else:
-            await interaction.response.edit_message(embed=await self.get_embed(), view=self)
+        self.round.double_down()
+        await self.after_action(interaction)
     
+    @timed("blackjack.split")
     async def split(self, interaction: discord.Interaction):
         if interaction.user != self.player:
             return await interaction.response.send_message(ERROR_PLAYER, ephemeral=True)
         
-        current_hand = self.hands[self.current_hand_index]
+        current_hand = self.round.current_hand
         
-        if not await bank.can_spend(self.player, current_hand.bet):
-            currency_name = await bank.get_currency_name(self.channel.guild)
+        with phase("bank"):
+            can_spend = await bank.can_spend(self.player, current_hand.bet)
+            if can_spend:
+                await bank.withdraw_credits(self.player, current_hand.bet)
+        if not can_spend:
+            currency_name = await self.cog.get_currency_name(self.channel.guild)
             return await interaction.response.send_message(f"You don't have enough {currency_name} to split!", ephemeral=True)
-        await bank.withdraw_credits(self.player, current_hand.bet)
         
-        self.total_bet += current_hand.bet
-        card1 = current_hand.cards[0]
-        card2 = current_hand.cards[1]
-        
-        current_hand.cards = [card1, self.deck.pop()]
-        current_hand.is_split = True
-        
-        new_hand = BlackjackHand([card2, self.deck.pop()], current_hand.bet, is_split=True)
-        self.hands.insert(self.current_hand_index + 1, new_hand)
-        
-        self.update_buttons()
-        await interaction.response.edit_message(embed=await self.get_embed(), view=self)
+        self.round.split()
+        await self.after_action(interaction)
+
+    async def after_action(self, interaction: discord.Interaction):
+        if self.round.dealer_turn_started:
+            await self.dealer_turn(interaction)
+        else:
+            self.update_buttons()
+            with phase("render"):
+                embed = await self.get_embed()
+            with phase("discord"):
+                await interaction.response.edit_message(embed=embed, view=self)
+
+    async def hint(self, interaction: discord.Interaction):
+        if interaction.user != self.player:
+            return await interaction.response.send_message(ERROR_PLAYER, ephemeral=True)
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        current_hand = self.round.current_hand
+        upcard = self.round.dealer[0]
+        seen = [card for hand in self.round.hands for card in hand.cards] + [upcard]
+        values = await asyncio.to_thread(advise, current_hand.cards, upcard, seen, self.decks, self.round.can_double(), self.round.can_split())
+        best = max(values, key=values.__getitem__)
+        lines = [f"💡 The best play is to **{best.value}**. Average result of each play:"]
+        lines += [f"- {action.value}: {value:+.1%} of your bet" for action, value in sorted(values.items(), key=lambda item: item[1], reverse=True)]
+        await interaction.followup.send("\n".join(lines), ephemeral=True)
 
     async def dealer_turn(self, interaction: discord.Interaction):
         self.stop()
-        self.facedown = False
-        self.dealer_turn_started = True
+        self.round.start_dealer_turn()
         
         await self.check_payout()
         self.hit_button.disabled = True
         self.stand_button.disabled = True
         self.double_button.disabled = True
         self.split_button.disabled = True
-        currency_name = await bank.get_currency_name(self.channel.guild)
-        view = AgainView(self.cog.blackjack, self.initial_bet, interaction.message, currency_name) if self.is_over() else self
+        currency_name = await self.cog.get_currency_name(self.channel.guild)
+        view = AgainView(self.cog.blackjack, self.initial_bet, interaction.message, currency_name) if self.round.is_over() else self
         
+        with phase("render"):
+            embed = await self.get_embed()
         try:  # we catch any connection errors and continue because we want the user to get the payout even if something goes wrong
-            await interaction.response.edit_message(embed=await self.get_embed(), view=view)
+            with phase("discord"):
+                await interaction.response.edit_message(embed=embed, view=view)
         except discord.DiscordException:
             log.error("Failed to respond during dealer turn", exc_info=True)
         
-        while not self.is_over():
-            self.dealer.append(self.deck.pop())
-            await asyncio.sleep(1)
+        while not self.round.is_over():
+            self.round.dealer_draw()
+            with phase("animation"):
+                await asyncio.sleep(1)
             await self.check_payout()
-            view = AgainView(self.cog.blackjack, self.initial_bet, interaction.message, currency_name) if self.is_over() else self
-            try:
-                await interaction.edit_original_response(embed=await self.get_embed(), view=view)
-            except discord.DiscordException:
-                log.error("Failed to respond during dealer turn", exc_info=True)
+            view = AgainView(self.cog.blackjack, self.initial_bet, interaction.message, currency_name) if self.round.is_over() else self
+            frame = partial(interaction.edit_original_response, embed=await self.get_embed(), view=view)
+            if self.round.is_over():
+                await self.cog.edits.edit(interaction.id, interaction.id, frame)
+            else:  # may be dropped if the next frame catches up with it
+                self.cog.edits.submit(interaction.id, interaction.id, frame)
 
     async def get_embed(self) -> discord.Embed:
-        currency_name = await bank.get_currency_name(self.channel.guild)
-        dealer_str = " ".join("⬇️" if self.facedown and i == 1 else CARD_EMOJI[card.value] for i, card in enumerate(self.dealer))
+        currency_name = await self.cog.get_currency_name(self.channel.guild)
+        game = self.round
+        dealer_str = " ".join("⬇️" if game.facedown and i == 1 else CARD_EMOJI[card.value] for i, card in enumerate(game.dealer))
 
         embed = discord.Embed(color=self.embed_color)
-        embed.add_field(name=f"Dealer ({'?' if self.facedown else get_hand_value(self.dealer)})", value=dealer_str, inline=False)
+        embed.add_field(name=f"Dealer ({'?' if game.facedown else get_hand_value(game.dealer)})", value=dealer_str, inline=False)
         
-        for i, hand in enumerate(self.hands):
+        for i, hand in enumerate(game.hands):
             hand_str = " ".join(CARD_EMOJI[card.value] for card in hand.cards)
-            hand_label = f"Hand {i + 1}" if len(self.hands) > 1 else "Hand"
+            hand_label = f"Hand {i + 1}" if len(game.hands) > 1 else "Hand"
             
-            if len(self.hands) > 1 and i == self.current_hand_index and not self.dealer_turn_started:
+            if len(game.hands) > 1 and i == game.current_hand_index and not game.dealer_turn_started:
                 hand_label += " ⬅️"
             
             hand_label += f" ({hand.get_value()})"
             embed.add_field(name=hand_label, value=hand_str, inline=False)
         
-        bet_label = "Bet" if len(self.hands) == 1 else "Total Bet"
-        embed.add_field(name=bet_label, value=f"{humanize_number(self.total_bet)} {currency_name}")
+        bet_label = "Bet" if len(game.hands) == 1 else "Total Bet"
+        embed.add_field(name=bet_label, value=f"{humanize_number(game.total_bet)} {currency_name}")
         
-        if self.dealer_turn_started and self.is_over():
-            total_payout = self.total_payout()
-            net_profit = total_payout - self.total_bet
+        if game.dealer_turn_started and game.is_over():
+            total_payout = game.total_payout()
+            net_profit = total_payout - game.total_bet
             
             net_label = "Net Winnings" if net_profit >= 0 else "Net Loss"
             embed.add_field(name=net_label, value=f"{'+' if net_profit > 0 else ''}{humanize_number(net_profit)} {currency_name}")
@@ -0,0 +1,201 @@
+from typing import List
+
+from simplecasino.card import Card, CardValue, Deck, Shoe
+
+TWENTYONE = 21
+DEALER_STAND = 17
+MAX_HANDS = 4
+
+
+def get_hand_value(hand: List[Card]) -> int:
+    total = 0
+    aces = 0
+    for card in hand:
+        total += card.blackjack_value  # aces count as 11 for now
+        if card.value is CardValue.ACE:
+            aces += 1
+    while total > TWENTYONE and aces > 0:
+        total -= 10
+        aces -= 1
+    return total
+
+
+class BlackjackHand:
+    def __init__(self, cards: List[Card], bet: int, is_split: bool = False, is_doubled: bool = False):
+        self.cards = cards
+        self.bet = bet
+        self.is_split = is_split
+        self.is_doubled = is_doubled
+        self.is_complete = False
+
+    def get_value(self) -> int:
+        return get_hand_value(self.cards)
+
+    def can_split(self) -> bool:
+        if len(self.cards) != 2 or self.is_split:
+            return False
+        return self.cards[0].blackjack_value == self.cards[1].blackjack_value
+
+    def can_double(self) -> bool:
+        return len(self.cards) == 2 and not self.is_doubled
+
+
+class BlackjackRound:
+    """
+    A round of blackjack between one player and the dealer, following the rules of the game
+    without any Discord or bank interaction. Bets are only tracked, paying them is up to the caller.
+    """
+
+    def __init__(self, deck: Deck, bet: int):
+        self.deck = deck
+        self.initial_bet = bet
+        self.dealer: List[Card] = []
+        self.hands: List[BlackjackHand] = []
+        self.current_hand_index = 0
+        self.facedown = True
+        self.dealer_turn_started = False
+        self.total_bet = bet
+        if isinstance(deck, Shoe):
+            deck.rounds.add(self)  # so its cards aren't shuffled back in while it's played
+
+        # deal initial cards, straight into the hands so the shoe knows they're taken
+        self.hands.append(BlackjackHand([], bet))
+        for _ in range(2):
+            self.hands[0].cards.append(self.deck.pop())
+        self.dealer.append(self.deck.pop())
+        self.dealer.append(self.deck.pop())
+        self.advance()
+
+    @property
+    def current_hand(self) -> BlackjackHand:
+        return self.hands[self.current_hand_index]
+
+    def advance(self) -> None:
+        """Completes the current hand if there's nothing left to do with it, moving on as needed."""
+        current_hand = self.current_hand
+
+        # natural 21
+        if current_hand.get_value() == TWENTYONE and len(current_hand.cards) == 2:
+            current_hand.is_complete = True
+            self.move_to_next_hand()
+        elif current_hand.is_doubled or current_hand.get_value() >= TWENTYONE:
+            current_hand.is_complete = True
+            self.move_to_next_hand()
+
+    def move_to_next_hand(self) -> None:
+        self.current_hand_index += 1
+        if self.current_hand_index < len(self.hands):
+            self.advance()
+        else:
+            self.facedown = False
+            self.dealer_turn_started = True
+
+    def can_act(self) -> bool:
+        return not self.dealer_turn_started
+
+    def can_double(self) -> bool:
+        return self.can_act() and self.current_hand.can_double()
+
+    def can_split(self) -> bool:
+        return self.can_act() and self.current_hand.can_split() and len(self.hands) < MAX_HANDS
+
+    def hit(self) -> None:
+        current_hand = self.current_hand
+        current_hand.cards.append(self.deck.pop())
+        if current_hand.get_value() >= TWENTYONE:
+            current_hand.is_complete = True
+            self.move_to_next_hand()
+
+    def stand(self) -> None:
+        self.current_hand.is_complete = True
+        self.move_to_next_hand()
+
+    def double_down(self) -> None:
+        current_hand = self.current_hand
+        self.total_bet += current_hand.bet
+        current_hand.bet *= 2
+        current_hand.is_doubled = True
+
+        # deal one card and automatic stand
+        current_hand.cards.append(self.deck.pop())
+        current_hand.is_complete = True
+        self.move_to_next_hand()
+
+    def split(self) -> None:
+        current_hand = self.current_hand
+        self.total_bet += current_hand.bet
+        card1 = current_hand.cards[0]
+        card2 = current_hand.cards[1]
+
+        new_hand = BlackjackHand([card2], current_hand.bet, is_split=True)
+        current_hand.cards = [card1]
+        current_hand.is_split = True
+        self.hands.insert(self.current_hand_index + 1, new_hand)
+
+        current_hand.cards.append(self.deck.pop())
+        new_hand.cards.append(self.deck.pop())
+        self.advance()
+
+    def start_dealer_turn(self) -> None:
+        self.facedown = False
+        self.dealer_turn_started = True
+
+    def dealer_draw(self) -> None:
+        self.dealer.append(self.deck.pop())
+
+    def play_dealer(self) -> None:
+        self.start_dealer_turn()
+        while not self.is_over():
+            self.dealer_draw()
+
+    def is_over(self) -> bool:
+        if not self.dealer_turn_started:
+            return False
+        if all(hand.get_value() > TWENTYONE for hand in self.hands):
+            return True
+        if len(self.hands) == 1 and self.hands[0].get_value() == TWENTYONE and len(self.hands[0].cards) == 2:  # natural 21
+            return True
+        dealer_total = get_hand_value(self.dealer)
+        return dealer_total >= DEALER_STAND
+
+    def cards_in_play(self) -> List[Card]:
+        """The cards on the table, until the round is over and they go to the discards."""
+        if self.is_over():
+            return []
+        return self.dealer + [card for hand in self.hands for card in hand.cards]
+
+    def is_natural(self) -> bool:
+        return len(self.hands) == 1 and len(self.hands[0].cards) == 2 and self.hands[0].get_value() == TWENTYONE
+
+    def is_tie(self, hand: BlackjackHand) -> bool:
+        player_total = hand.get_value()
+        dealer_total = get_hand_value(self.dealer)
+        return player_total <= TWENTYONE and dealer_total <= TWENTYONE and player_total == dealer_total
+
+    def is_win(self, hand: BlackjackHand) -> bool:
+        player_total = hand.get_value()
+        dealer_total = get_hand_value(self.dealer)
+        if player_total > TWENTYONE:
+            return False
+        if dealer_total > TWENTYONE:
+            return True
+        return player_total > dealer_total
+
+    def payout_amount(self, hand: BlackjackHand) -> int:
+        if self.is_tie(hand):
+            return hand.bet
+        if not self.is_win(hand):
+            return 0
+
+        player_total = hand.get_value()
+        dealer_total = get_hand_value(self.dealer)
+        is_player_natural = len(hand.cards) == 2 and player_total == TWENTYONE and not hand.is_split
+        is_dealer_natural = len(self.dealer) == 2 and dealer_total == TWENTYONE
+
+        if is_player_natural and not is_dealer_natural:
+            return hand.bet * 5 // 2
+        else:
+            return 2 * hand.bet
+
+    def total_payout(self) -> int:
+        return sum(self.payout_amount(hand) for hand in self.hands)
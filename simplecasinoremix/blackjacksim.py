@@ -0,0 +1,168 @@
+import time
+import random
+import argparse
+from functools import lru_cache
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from simplecasino.blackjackcore import DEALER_STAND, TWENTYONE, BlackjackRound, get_hand_value
+from simplecasino.card import Shoe
+from simplecasino.strategy import INFINITE, Action, card_rank, infinite_analyzer, load_strategy
+
+SIM_BET = 2  # the smallest bet that a 3:2 natural pays exactly
+SIM_WORKERS = 4
+SIM_CHUNK = 50_000  # hands per task sent to a worker
+
+Strategy = Callable[[BlackjackRound, random.Random], Action]
+
+
+def available_actions(game: BlackjackRound) -> List[Action]:
+    actions = [Action.STAND, Action.HIT]
+    if game.can_double():
+        actions.append(Action.DOUBLE)
+    if game.can_split():
+        actions.append(Action.SPLIT)
+    return actions
+
+
+def basic_strategy(game: BlackjackRound, _: random.Random) -> Action:
+    """The best play for an infinite shoe."""
+    ranks = tuple(card_rank(card) for card in game.current_hand.cards)
+    return best_action(ranks, card_rank(game.dealer[0]), game.can_double(), game.can_split())
+
+
+@lru_cache(maxsize=None)
+def best_action(ranks: Tuple[int, ...], upcard: int, can_double: bool, can_split: bool) -> Action:
+    values = infinite_analyzer().actions(ranks, upcard, INFINITE, can_double, can_split)
+    return max(values, key=values.__getitem__)
+
+
+def dealer_strategy(game: BlackjackRound, _: random.Random) -> Action:
+    """Plays like the dealer, never doubling or splitting."""
+    return Action.HIT if game.current_hand.get_value() < DEALER_STAND else Action.STAND
+
+
+def random_strategy(game: BlackjackRound, rng: random.Random) -> Action:
+    return rng.choice(available_actions(game))
+
+
+STRATEGIES: Dict[str, Strategy] = {
+    "basic": basic_strategy,
+    "dealer": dealer_strategy,
+    "random": random_strategy,
+}
+
+
+@dataclass
+class BlackjackSimResult:
+    strategy: str
+    decks: int
+    hands: int
+    net: int = 0  # in units of SIM_BET
+    net_squared: int = 0
+    doubles: int = 0
+    splits: int = 0
+    naturals: int = 0
+    dealer_naturals: int = 0
+    seconds: float = 0.0
+
+    def merge(self, other: "BlackjackSimResult") -> None:
+        self.hands += other.hands
+        self.net += other.net
+        self.net_squared += other.net_squared
+        self.doubles += other.doubles
+        self.splits += other.splits
+        self.naturals += other.naturals
+        self.dealer_naturals += other.dealer_naturals
+
+    @property
+    def house_edge(self) -> float:
+        """Average loss per initial bet."""
+        return -self.net / self.hands / SIM_BET
+
+    @property
+    def variance(self) -> float:
+        mean = self.net / self.hands / SIM_BET
+        return self.net_squared / self.hands / SIM_BET ** 2 - mean ** 2
+
+    def summary(self) -> str:
+        error = (self.variance / self.hands) ** 0.5
+        return f"{self.strategy} strategy, {self.decks} decks: {self.hands:,} hands in {self.seconds:.2f}s, " \
+               f"house edge {self.house_edge:.3%} ± {2 * error:.3%}, variance {self.variance:.3f}, " \
+               f"doubles {self.doubles / self.hands:.2%}, splits {self.splits / self.hands:.2%}, " \
+               f"naturals {self.naturals / self.hands:.2%}, dealer naturals {self.dealer_naturals / self.hands:.2%}"
+
+
+def play_hands(strategy: str, hands: int, decks: int, penetration: float, seed: Optional[int] = None) -> BlackjackSimResult:
+    """Plays hands through the real game rules, dealing from a shoe like in a channel."""
+    load_strategy()
+    choose = STRATEGIES[strategy]
+    rng = random.Random(seed)
+    result = BlackjackSimResult(strategy, decks, hands)
+    shoe = Shoe(decks, penetration)
+    shoe.rng = rng  # also when it runs out in the middle of a round
+    shoe.size = 0  # shuffled with our own rng before the first hand
+    for _ in range(hands):
+        if shoe.needs_shuffle:
+            shoe.shuffle(rng)
+        game = BlackjackRound(shoe, SIM_BET)
+        while not game.dealer_turn_started:
+            action = choose(game, rng)
+            if action is Action.STAND:
+                game.stand()
+            elif action is Action.HIT:
+                game.hit()
+            elif action is Action.DOUBLE:
+                game.double_down()
+                result.doubles += 1
+            else:
+                game.split()
+                result.splits += 1
+        game.play_dealer()
+        net = game.total_payout() - game.total_bet
+        result.net += net
+        result.net_squared += net * net
+        result.naturals += game.is_natural()
+        result.dealer_naturals += len(game.dealer) == 2 and get_hand_value(game.dealer) == TWENTYONE
+    return result
+
+
+def simulate_blackjack(strategy: str,
+                       hands: int,
+                       decks: int = 6,
+                       penetration: float = 0.75,
+                       workers: int = SIM_WORKERS,
+                       seed: Optional[int] = None,
+                       ) -> BlackjackSimResult:
+    """Splits the hands between a pool of processes and adds up their results."""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy}, must be one of {', '.join(STRATEGIES)}")
+    start = time.perf_counter()
+    chunks = [min(SIM_CHUNK, hands - i) for i in range(0, hands, SIM_CHUNK)]
+    seeds = [None if seed is None else seed + i for i in range(len(chunks))]
+    total = BlackjackSimResult(strategy, decks, 0)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(play_hands, [strategy] * len(chunks), chunks, [decks] * len(chunks), [penetration] * len(chunks), seeds):
+            total.merge(result)
+    total.seconds = time.perf_counter() - start
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate blackjack with different strategies and report the house edge.")
+    parser.add_argument("hands", type=int, nargs="?", default=1_000_000)
+    parser.add_argument("--strategy", choices=list(STRATEGIES), action="append")
+    parser.add_argument("--decks", type=int, default=6)
+    parser.add_argument("--penetration", type=float, default=0.75)
+    parser.add_argument("--workers", type=int, default=SIM_WORKERS)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    for strategy in args.strategy or list(STRATEGIES):
+        result = simulate_blackjack(strategy, args.hands, args.decks, args.penetration, args.workers, args.seed)
+        print(result.summary())
+        print(f"{result.hands / result.seconds * 60:,.0f} hands per minute")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
+import random
+import struct
 from enum import Enum
-from itertools import product
-from dataclasses import dataclass, field
-from dataclasses_json import DataClassJsonMixin, config
+from array import array
+from weakref import WeakSet
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 
 class CardValue(Enum):
@@ -27,6 +30,9 @@ class CardSuit(Enum):
     DIAMONDS = "d"
 
 
+SUIT_ORDER = (CardSuit.SPADES, CardSuit.HEARTS, CardSuit.CLUBS, CardSuit.DIAMONDS)
+SUIT_INDEX = {suit: i for i, suit in enumerate(SUIT_ORDER)}
+
 CARD_EMOJI = {
     CardValue.ACE: "🇦",
     CardValue.TWO: "2️⃣",
@@ -60,14 +66,39 @@ CARD_VALUE_STR = {
 }
 
 
-@dataclass(frozen=True)
-class Card(DataClassJsonMixin):
-    value: CardValue = field(metadata=config(encoder=lambda x: x.value, decoder=CardValue))
-    suit: CardSuit = field(metadata=config(encoder=lambda x: x.value, decoder=CardSuit))
+class Card:
+    """
+    A playing card. There is exactly one instance of each card, identified by an id from 0 to 51:
+    (poker_value - 2) * 4 + suit index. Constructing a card returns the existing instance.
+    """
+    __slots__ = ("id", "value", "suit", "poker_value", "blackjack_value")
+    id: int
+    value: CardValue
+    suit: CardSuit
+    poker_value: int
+    blackjack_value: int
 
-    @property
-    def poker_value(self):
-        return 14 if self.value == CardValue.ACE else self.value.value
+    def __new__(cls, value: CardValue, suit: CardSuit) -> "Card":
+        return CARDS[card_id(value, suit)]
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError("Cards are immutable")
+
+    def __reduce__(self):
+        return card_from_id, (self.id,)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, _):
+        return self
+
+    def to_dict(self, encode_json: bool = False) -> Dict[str, Any]:
+        return {"value": self.value.value, "suit": self.suit.value}
+
+    @classmethod
+    def from_dict(cls, kvs: Dict[str, Any], *, infer_missing: bool = False) -> "Card":
+        return cls(CardValue(kvs["value"]), CardSuit(kvs["suit"]))
 
     def __str__(self):
         return f"{CARD_VALUE_STR[self.value]}{self.suit.value}"
@@ -76,5 +107,126 @@ class Card(DataClassJsonMixin):
         return self.__str__()
 
 
-def make_deck():
-    return [Card(value, color) for value, color in product(CardValue, CardSuit)]
+def card_id(value: CardValue, suit: CardSuit) -> int:
+    poker_value = 14 if value == CardValue.ACE else value.value
+    return (poker_value - 2) * 4 + SUIT_INDEX[suit]
+
+
+def card_from_id(cid: int) -> Card:
+    return CARDS[cid]
+
+
+def _create_card(cid: int) -> Card:
+    card = object.__new__(Card)
+    poker_value = cid // 4 + 2
+    value = CardValue.ACE if poker_value == 14 else CardValue(poker_value)
+    object.__setattr__(card, "id", cid)
+    object.__setattr__(card, "value", value)
+    object.__setattr__(card, "suit", SUIT_ORDER[cid % 4])
+    object.__setattr__(card, "poker_value", poker_value)
+    object.__setattr__(card, "blackjack_value", 11 if value == CardValue.ACE else min(10, value.value))
+    return card
+
+
+CARDS: Tuple[Card, ...] = tuple(_create_card(cid) for cid in range(52))
+
+
+def encode_cards(cards: Iterable[Card]) -> List[Dict[str, Any]]:
+    return [c.to_dict() for c in cards]
+
+
+def decode_cards(data: Iterable[Dict[str, Any]]) -> List[Card]:
+    return [Card.from_dict(c) for c in data]
+
+
+class Deck:
+    """
+    A shuffled order of card ids, one byte each, and how many of them are left to draw.
+    Cards are drawn from the end, so the whole order is kept around after dealing.
+    """
+    __slots__ = ("ids", "size")
+
+    def __init__(self, ids: Iterable[int] = range(52), size: Optional[int] = None):
+        self.ids = array("B", ids)
+        self.size = len(self.ids) if size is None else size
+
+    def shuffle(self, rng: Optional[random.Random] = None) -> None:
+        (rng or random).shuffle(self.ids)
+        self.size = len(self.ids)
+
+    def pop(self) -> Card:
+        if self.size <= 0:
+            raise IndexError("pop from empty deck")
+        self.size -= 1
+        return CARDS[self.ids[self.size]]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[Card]:
+        return (CARDS[self.ids[i]] for i in range(self.size))
+
+
+def make_deck() -> Deck:
+    return Deck()
+
+
+_SHOE_HEADER = struct.Struct("<HH")  # cards left, cut card position
+
+
+class Shoe(Deck):
+    """
+    Several decks shuffled together, like in a casino. Once the dealer reaches the cut card,
+    the shoe is reshuffled before the next round. Saved as a short header followed by the card order.
+    Several rounds can be dealt from it at once, and their cards stay out of the shoe when it's reshuffled.
+    """
+    __slots__ = ("cut", "rng", "rounds")
+
+    def __init__(self, decks: int, penetration: float, ids: Optional[Iterable[int]] = None, size: Optional[int] = None):
+        super().__init__(list(range(52)) * decks if ids is None else ids, size)
+        self.cut = 0
+        self.rng: Optional[random.Random] = None  # shuffles it, not saved
+        self.rounds: "WeakSet[Any]" = WeakSet()  # being dealt from it, each with a cards_in_play method
+        self.set_penetration(penetration)
+
+    @property
+    def decks(self) -> int:
+        return len(self.ids) // 52
+
+    def set_penetration(self, penetration: float) -> None:
+        """Places the cut card after the given fraction of the shoe."""
+        self.cut = int(len(self.ids) * penetration)
+
+    @property
+    def needs_shuffle(self) -> bool:
+        return len(self.ids) - self.size >= self.cut
+
+    def shuffle(self, rng: Optional[random.Random] = None) -> None:
+        """Shuffles every card back in, except the ones still in play, which are left as dealt."""
+        held = Counter(card.id for game in self.rounds for card in game.cards_in_play())
+        if not held:
+            return super().shuffle(rng)
+        available = list((Counter(self.ids) - held).elements())
+        (rng or random).shuffle(available)
+        self.ids = array("B", available + list(held.elements()))
+        self.size = len(available)
+
+    def pop(self) -> Card:
+        if self.size <= 0:  # ran out mid-round, which a deep enough cut card could allow
+            self.shuffle(self.rng)
+        return super().pop()
+
+    def to_bytes(self) -> bytes:
+        return _SHOE_HEADER.pack(self.size, self.cut) + self.ids.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Shoe":
+        if len(data) < _SHOE_HEADER.size or (len(data) - _SHOE_HEADER.size) % 52:
+            raise ValueError("Invalid shoe data")
+        size, cut = _SHOE_HEADER.unpack_from(data)
+        ids = data[_SHOE_HEADER.size:]
+        if size > len(ids) or any(cid >= 52 for cid in ids):
+            raise ValueError("Invalid shoe data")
+        shoe = cls(len(ids) // 52, 0, ids, size)
+        shoe.cut = cut
+        return shoe
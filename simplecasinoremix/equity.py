@@ -0,0 +1,119 @@
+import time
+import random
+import asyncio
+import logging
+from math import comb
+from itertools import combinations
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+
+from simplecasino.card import Card
+from simplecasino.evaluator import evaluate_ids, load_tables
+
+log = logging.getLogger("red.crab-cogs.simplecasino.equity")
+
+EQUITY_WORKERS = 2
+EQUITY_TIME_BUDGET = 1.5  # seconds, discord wants interactions acknowledged within 3
+EQUITY_GRACE = 0.5  # extra wait for a worker to hand back its results
+EXACT_LIMIT = 20000  # enumerate every runout when there are at most this many
+MAX_SAMPLES = 500000
+
+
+@dataclass
+class Equity:
+    win: float  # chance of winning the whole pot
+    tie: float  # chance of splitting the pot
+    share: float  # expected fraction of the pot
+
+
+def simulate(hands: List[List[int]],
+             table: List[int],
+             opponents: int,
+             deadline: float,
+             seed: Optional[int] = None,
+             ) -> Tuple[List[Tuple[int, int, float]], int]:
+    """
+    Counts wins, ties and pot shares for each hand over the possible runouts of the table.
+    Opponents are extra players with unknown random hands. Runs in a worker process, cards are integers.
+    Sampling stops at the deadline, a wall clock time, since the task may have waited in the queue for a while.
+    """
+    dead = set(table)
+    for hand in hands:
+        dead.update(hand)
+    stub = [c for c in range(52) if c not in dead]
+    missing = 5 - len(table)
+    stats = [[0, 0, 0.0] for _ in hands]
+
+    def score(board: List[int], all_hands: List[List[int]]):
+        ranks = [evaluate_ids(hand + board) for hand in all_hands]
+        best = max(ranks)
+        count = ranks.count(best)
+        for i in range(len(hands)):
+            if ranks[i] != best:
+                continue
+            stats[i][0 if count == 1 else 1] += 1
+            stats[i][2] += 1 / count
+
+    total = 0
+    if opponents == 0 and comb(len(stub), missing) <= EXACT_LIMIT:
+        for runout in combinations(stub, missing):
+            score(table + list(runout), hands)
+            total += 1
+    else:
+        rng = random.Random(seed)
+        needed = missing + 2 * opponents
+        while total < MAX_SAMPLES:
+            if total % 256 == 0 and time.time() > deadline:
+                break
+            drawn = rng.sample(stub, needed)
+            extra = [drawn[i:i+2] for i in range(missing, needed, 2)]
+            score(table + drawn[:missing], hands + extra)
+            total += 1
+    return [(wins, ties, share) for wins, ties, share in stats], total
+
+
+class EquityCalculator:
+    """Estimates poker equity on a process pool, so that the event loop never waits on it."""
+
+    def __init__(self, workers: int = EQUITY_WORKERS):
+        self.workers = workers
+        self.pool: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> ProcessPoolExecutor:
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=load_tables)
+        return self.pool
+
+    async def warm_up(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(self.start(), load_tables)
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    async def calculate(self,
+                        hands: List[List[Card]],
+                        table: List[Card],
+                        opponents: int = 0,
+                        time_budget: float = EQUITY_TIME_BUDGET,
+                        ) -> Optional[List[Equity]]:
+        """Returns the equity of each hand, or None if it couldn't be calculated in time. The time budget starts now."""
+        deadline = time.time() + time_budget
+        hand_ids = [[c.id for c in hand] for hand in hands]
+        table_ids = [c.id for c in table]
+        future = asyncio.get_running_loop().run_in_executor(self.start(), simulate, hand_ids, table_ids, opponents, deadline)
+        try:
+            stats, total = await asyncio.wait_for(future, timeout=time_budget + EQUITY_GRACE)
+        except asyncio.TimeoutError:
+            log.warning("Equity calculation took too long and was cancelled")
+            return None
+        except BrokenProcessPool:
+            log.error("Equity process pool broke, it will be restarted", exc_info=True)
+            self.close()
+            return None
+        if total == 0:
+            return None
+        return [Equity(wins / total, ties / total, share / total) for wins, ties, share in stats]
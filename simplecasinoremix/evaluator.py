@@ -0,0 +1,173 @@
+import threading
+from itertools import combinations_with_replacement
+from typing import Dict, Iterable, List
+
+from simplecasino.card import Card, CardSuit
+from simplecasino.utils import HandType
+
+# Cards are evaluated by their id: (poker_value - 2) * 4 + suit index.
+# A hand rank is a single integer: hand type in the top bits followed by five 4-bit poker values,
+# so comparing two ranks compares the hands. An ace-low straight stores its ace as a 1.
+
+RANK_KEYS = [5 ** r for r in range(13)]  # rank multisets with up to 4 of each rank map to unique sums
+TYPE_SHIFT = 20
+
+# how many cards of each listed poker value make up the best five, per hand type
+RANK_PATTERNS = {
+    HandType.HighCard: (1, 1, 1, 1, 1),
+    HandType.Pair: (2, 1, 1, 1),
+    HandType.DoublePair: (2, 2, 1),
+    HandType.Triple: (3, 1, 1),
+    HandType.Straight: (1, 1, 1, 1, 1),
+    HandType.Flush: (1, 1, 1, 1, 1),
+    HandType.FullHouse: (3, 2),
+    HandType.Quadruple: (4, 1),
+    HandType.StraightFlush: (1, 1, 1, 1, 1),
+    HandType.RoyalFlush: (1, 1, 1, 1, 1),
+}
+
+_lock = threading.Lock()
+_popcount: List[int] = []
+_straight_high: List[int] = []  # highest poker value of the best straight in a 13-bit rank mask, or 0
+_flush_ranks: List[int] = []  # flush or straight flush rank for a 13-bit mask with 5+ bits
+_multiset_ranks: Dict[int, int] = {}  # sum of RANK_KEYS -> best non-flush rank
+
+
+def make_rank(htype: HandType, values: Iterable[int]) -> int:
+    rank = int(htype)
+    count = 0
+    for value in values:
+        rank = (rank << 4) | value
+        count += 1
+    return rank << (4 * (5 - count))
+
+
+def _mask_values(mask: int) -> List[int]:
+    return [r + 2 for r in range(12, -1, -1) if mask & (1 << r)]
+
+
+def _find_straight(mask: int) -> int:
+    for high in range(12, 3, -1):
+        window = 0b11111 << (high - 4)
+        if mask & window == window:
+            return high + 2
+    if mask & 0b1000000001111 == 0b1000000001111:  # A-2-3-4-5
+        return 5
+    return 0
+
+
+def _straight_values(high: int) -> List[int]:
+    return [5, 4, 3, 2, 1] if high == 5 else list(range(high, high - 5, -1))
+
+
+def _multiset_rank(counts: List[int]) -> int:
+    by_count: Dict[int, List[int]] = {1: [], 2: [], 3: [], 4: []}
+    mask = 0
+    for r in range(12, -1, -1):
+        if counts[r]:
+            by_count[counts[r]].append(r + 2)
+            mask |= 1 << r
+    quads, trips, pairs = by_count[4], by_count[3], by_count[2]
+
+    if quads:
+        kicker = max(r + 2 for r in range(13) if counts[r] and r + 2 != quads[0])
+        return make_rank(HandType.Quadruple, (quads[0], kicker))
+    if trips and (len(trips) > 1 or pairs):
+        return make_rank(HandType.FullHouse, (trips[0], max(trips[1:] + pairs)))
+    straight = _straight_high[mask]
+    if straight:
+        return make_rank(HandType.Straight, _straight_values(straight))
+    values = _mask_values(mask)
+    if trips:
+        return make_rank(HandType.Triple, [trips[0]] + [v for v in values if v != trips[0]][:2])
+    if len(pairs) > 1:
+        kicker = next(v for v in values if v not in pairs[:2])
+        return make_rank(HandType.DoublePair, (pairs[0], pairs[1], kicker))
+    if pairs:
+        return make_rank(HandType.Pair, [pairs[0]] + [v for v in values if v != pairs[0]][:3])
+    return make_rank(HandType.HighCard, values[:5])
+
+
+def load_tables() -> None:
+    """Builds the lookup tables used by the evaluator. Only does work the first time it's called."""
+    global _popcount, _straight_high, _flush_ranks, _multiset_ranks
+    with _lock:
+        if _multiset_ranks:
+            return
+        popcount = [bin(mask).count("1") for mask in range(1 << 13)]
+        straight_high = [_find_straight(mask) for mask in range(1 << 13)]
+        flush_ranks = [0] * (1 << 13)
+        for mask in range(1 << 13):
+            if popcount[mask] < 5:
+                continue
+            high = straight_high[mask]
+            if high == 14:
+                flush_ranks[mask] = make_rank(HandType.RoyalFlush, _straight_values(high))
+            elif high:
+                flush_ranks[mask] = make_rank(HandType.StraightFlush, _straight_values(high))
+            else:
+                flush_ranks[mask] = make_rank(HandType.Flush, _mask_values(mask)[:5])
+        _popcount, _straight_high, _flush_ranks = popcount, straight_high, flush_ranks
+
+        multiset_ranks: Dict[int, int] = {}
+        for size in (5, 6, 7):
+            for ranks in combinations_with_replacement(range(13), size):
+                counts = [0] * 13
+                for r in ranks:
+                    counts[r] += 1
+                if max(counts) > 4:
+                    continue
+                multiset_ranks[sum(RANK_KEYS[r] for r in ranks)] = _multiset_rank(counts)
+        _multiset_ranks = multiset_ranks
+
+
+def evaluate_ids(card_ids: Iterable[int]) -> int:
+    """Returns the rank of the best poker hand among 5 to 7 cards encoded as integers."""
+    if not _multiset_ranks:
+        load_tables()
+    key = 0
+    suit_masks = [0, 0, 0, 0]
+    for card_id in card_ids:
+        r = card_id >> 2
+        key += RANK_KEYS[r]
+        suit_masks[card_id & 3] |= 1 << r
+    for mask in suit_masks:
+        if _popcount[mask] >= 5:  # with 7 cards a flush beats anything but a straight flush
+            return _flush_ranks[mask]
+    return _multiset_ranks[key]
+
+
+def evaluate(cards: Iterable[Card]) -> int:
+    return evaluate_ids(c.id for c in cards)
+
+
+def straight_high(mask: int) -> int:
+    """Returns the poker value of the highest card in the best straight of a 13-bit rank mask, or 0."""
+    if not _multiset_ranks:
+        load_tables()
+    return _straight_high[mask]
+
+
+def hand_type(rank: int) -> HandType:
+    return HandType(rank >> TYPE_SHIFT)
+
+
+def rank_values(rank: int) -> List[int]:
+    return [(rank >> shift) & 0xF for shift in (16, 12, 8, 4, 0)]
+
+
+def best_five(cards: List[Card], rank: int) -> List[Card]:
+    """Picks the cards that make up the given rank, in the same order as the rank's values."""
+    htype = hand_type(rank)
+    pool = cards
+    if htype in (HandType.Flush, HandType.StraightFlush, HandType.RoyalFlush):
+        suit_counts: Dict[CardSuit, int] = {}
+        for c in cards:
+            suit_counts[c.suit] = suit_counts.get(c.suit, 0) + 1
+        flush_suit = max(suit_counts, key=lambda s: suit_counts[s])
+        pool = [c for c in cards if c.suit == flush_suit]
+    result: List[Card] = []
+    for value, amount in zip(rank_values(rank), RANK_PATTERNS[htype]):
+        value = 14 if value == 1 else value
+        result += [c for c in pool if c.poker_value == value][:amount]
+    return result
@@ -0,0 +1,243 @@
+import time
+import asyncio
+import sqlite3
+import logging
+from pathlib import Path
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from simplecasino.card import Card, Deck
+from simplecasino.pokercore import Deposit, Move, Moves, PlayerActed, PokerEngine, PokerEvent, StageChanged, Withdraw, get_hand_result
+from simplecasino.snapshot import SnapshotReader, SnapshotWriter
+from simplecasino.utils import PlayerState, PokerState, humanize_camel_case, POKER_STAGE_NAMES
+
+log = logging.getLogger("red.crab-cogs.simplecasino.history")
+
+HISTORY_VERSION = 1
+RECENT_HANDS = 50
+DELETED_USER_IDS = range(1000, 1256)  # stand in for players whose data was deleted, by seat, and are neither bots nor Discord ids
+
+# Hands are only ever inserted, and only changed to forget a player whose data was deleted. A hand is stored
+# as the deck it was dealt from, the starting balances and the moves of its players, which is enough to play it
+# again through the rules. The players of each hand are also kept in their own table, so that looking up
+# someone's last hands doesn't need to decode any of them.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hands (
+    id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    played_at INTEGER NOT NULL,
+    pot INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hand_players (
+    hand_id INTEGER NOT NULL REFERENCES hands (id),
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    played_at INTEGER NOT NULL,
+    betted INTEGER NOT NULL,
+    winnings INTEGER NOT NULL,
+    PRIMARY KEY (hand_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS hands_by_date ON hands (guild_id, played_at);
+CREATE INDEX IF NOT EXISTS hands_by_pot ON hands (guild_id, pot);
+CREATE INDEX IF NOT EXISTS hand_players_by_date ON hand_players (guild_id, user_id, played_at);
+"""
+
+
+@dataclass
+class HandRecord:
+    players_ids: List[int]
+    minimum_bet: int
+    deck: Deck
+    balances: Dict[int, int]
+    moves: Moves
+
+    @staticmethod
+    def from_game(game: PokerEngine) -> "HandRecord":
+        return HandRecord(list(game.players_ids), game.minimum_bet, Deck(game.deck.ids), dict(game.start_balances), list(game.moves))
+
+    def pack(self) -> bytes:
+        writer = SnapshotWriter()
+        writer.u8(HISTORY_VERSION)
+        writer.u8(len(self.players_ids))
+        for user_id in self.players_ids:
+            writer.u64(user_id)
+        writer.i64(self.minimum_bet)
+        writer.deck(self.deck)
+        writer.balances(self.balances)
+        writer.moves(self.moves)
+        return writer.getvalue()
+
+    @staticmethod
+    def unpack(data: bytes) -> "HandRecord":
+        reader = SnapshotReader(data)
+        version = reader.u8()
+        if version != HISTORY_VERSION:
+            raise ValueError(f"Unknown poker history version {version}")
+        players_ids = [reader.u64() for _ in range(reader.u8())]
+        minimum_bet = reader.i64()
+        deck = reader.deck()
+        balances = reader.balances()
+        moves = [(seat, Move(move), bet, balance) for seat, move, bet, balance in reader.moves()]
+        reader.end()
+        return HandRecord(players_ids, minimum_bet, deck, balances, moves)
+
+    def without_user(self, user_id: int) -> "HandRecord":
+        """The same hand, with the player's id replaced by one for their seat."""
+        if user_id not in self.players_ids:
+            return self
+        placeholder = DELETED_USER_IDS[self.players_ids.index(user_id)]
+        players_ids = [placeholder if uid == user_id else uid for uid in self.players_ids]
+        balances = {placeholder if uid == user_id else uid: balance for uid, balance in self.balances.items()}
+        return HandRecord(players_ids, self.minimum_bet, self.deck, balances, self.moves)
+
+    def replay(self) -> Tuple[PokerEngine, List[PokerEvent]]:
+        """Plays the hand again, returning how it ended and every event along the way."""
+        game = PokerEngine(list(self.players_ids), self.minimum_bet)
+        game.deck = Deck(self.deck.ids)
+        events = game.apply_start_hand(self.balances)
+        for seat, move, bet, balance in self.moves:
+            user_id = game.players[seat].id
+            if move is Move.Fold:
+                events += game.apply_fold(user_id)
+            elif move is Move.Check:
+                events += game.apply_check(user_id)
+            else:
+                events += game.apply_bet(user_id, bet, balance)
+        return game, events
+
+    def describe(self, name: Callable[[int], str], card_str: Callable[[Card], str], currency_name: str) -> List[str]:
+        """A line for everything that happened in the hand."""
+        game, events = self.replay()
+        lines: List[str] = []
+        started = False
+        for event in events:
+            if isinstance(event, Withdraw) and not started:
+                lines.append(f"{name(event.user_id)} posts a blind of {event.amount:,} {currency_name}")
+            elif isinstance(event, StageChanged):
+                started = True
+                table = " ".join(card_str(c) for c in event.table)
+                lines.append(f"**{POKER_STAGE_NAMES[event.state]}** {table}".rstrip())
+                if event.state == PokerState.Showdown:
+                    for player in game.players:
+                        if player.state != PlayerState.Folded and len(event.table) == 5:
+                            result = get_hand_result(list(event.table), player.hand)
+                            hand = " ".join(card_str(c) for c in player.hand)
+                            lines.append(f"{name(player.id)} shows {hand}, {humanize_camel_case(result.type.name).lower()}")
+            elif isinstance(event, PlayerActed):
+                if event.state == PlayerState.Folded:
+                    lines.append(f"{name(event.user_id)} folds")
+                elif event.state == PlayerState.Checked:
+                    lines.append(f"{name(event.user_id)} checks")
+                elif event.state == PlayerState.AllIn:
+                    lines.append(f"{name(event.user_id)} goes all in with {event.current_bet:,} {currency_name}")
+                else:
+                    lines.append(f"{name(event.user_id)} bets {event.current_bet:,} {currency_name}")
+            elif isinstance(event, Deposit):
+                lines.append(f"{name(event.user_id)} wins {event.amount:,} {currency_name}")
+        return lines
+
+
+@dataclass
+class HandSummary:
+    id: int
+    channel_id: int
+    played_at: int  # unix timestamp
+    pot: int
+    net: Optional[int] = None  # for the player that was looked up
+
+
+class HandHistory:
+    """
+    Every finished poker hand, appended to a SQLite database. The database is only used
+    from one background thread, which owns the connection, so that queries never block the bot.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="poker-history")
+        self.db: Optional[sqlite3.Connection] = None
+        self.recorded = 0  # hands recorded this session
+
+    async def run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def connect(self) -> sqlite3.Connection:
+        if self.db is None:
+            self.db = sqlite3.connect(self.path)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.executescript(SCHEMA)
+        return self.db
+
+    async def record(self, guild_id: int, channel_id: int, game: PokerEngine) -> Optional[int]:
+        """Appends a finished hand and returns its id, if it was played with its moves tracked."""
+        if not game.start_balances:
+            return None
+        data = HandRecord.from_game(game).pack()
+        players = [(p.id, p.total_betted, p.winnings) for p in game.players]
+        hand_id = await self.run(self._insert, guild_id, channel_id, int(time.time()), game.pot, data, players)
+        self.recorded += 1
+        return hand_id
+
+    def _insert(self, guild_id: int, channel_id: int, played_at: int, pot: int, data: bytes, players: List[Tuple[int, int, int]]) -> int:
+        db = self.connect()
+        with db:
+            cursor = db.execute("INSERT INTO hands (guild_id, channel_id, played_at, pot, data) VALUES (?, ?, ?, ?, ?)",
+                                (guild_id, channel_id, played_at, pot, data))
+            hand_id = cursor.lastrowid
+            db.executemany("INSERT INTO hand_players (hand_id, guild_id, user_id, played_at, betted, winnings) VALUES (?, ?, ?, ?, ?, ?)",
+                           [(hand_id, guild_id, user_id, played_at, betted, winnings) for user_id, betted, winnings in players])
+        assert hand_id is not None
+        return hand_id
+
+    async def recent(self, guild_id: int, user_id: int, limit: int = RECENT_HANDS) -> List[HandSummary]:
+        return await self.run(self._select,
+                              "SELECT h.id, h.channel_id, h.played_at, h.pot, p.winnings - p.betted FROM hand_players p "
+                              "JOIN hands h ON h.id = p.hand_id WHERE p.guild_id = ? AND p.user_id = ? "
+                              "ORDER BY p.played_at DESC, p.hand_id DESC LIMIT ?",
+                              (guild_id, user_id, limit))
+
+    async def biggest(self, guild_id: int, limit: int = RECENT_HANDS) -> List[HandSummary]:
+        return await self.run(self._select,
+                              "SELECT id, channel_id, played_at, pot, NULL FROM hands WHERE guild_id = ? ORDER BY pot DESC, id DESC LIMIT ?",
+                              (guild_id, limit))
+
+    def _select(self, query: str, params: tuple) -> List[HandSummary]:
+        return [HandSummary(*row) for row in self.connect().execute(query, params)]
+
+    async def get(self, guild_id: int, hand_id: int) -> Optional[Tuple[HandSummary, HandRecord]]:
+        row = await self.run(self._get, guild_id, hand_id)
+        if row is None:
+            return None
+        return HandSummary(*row[:4]), HandRecord.unpack(row[4])
+
+    def _get(self, guild_id: int, hand_id: int) -> Optional[tuple]:
+        return self.connect().execute("SELECT id, channel_id, played_at, pot, data FROM hands WHERE guild_id = ? AND id = ?",
+                                      (guild_id, hand_id)).fetchone()
+
+    async def delete_user(self, user_id: int) -> int:
+        """Forgets a user's results, and their id in the hands they played, returning how many hands they were in."""
+        return await self.run(self._delete_user, user_id)
+
+    def _delete_user(self, user_id: int) -> int:
+        db = self.connect()
+        with db:
+            hand_ids = [row[0] for row in db.execute("SELECT hand_id FROM hand_players WHERE user_id = ?", (user_id,))]
+            for hand_id in hand_ids:
+                row = db.execute("SELECT data FROM hands WHERE id = ?", (hand_id,)).fetchone()
+                if row is not None:
+                    data = HandRecord.unpack(row[0]).without_user(user_id).pack()
+                    db.execute("UPDATE hands SET data = ? WHERE id = ?", (data, hand_id))
+            db.execute("DELETE FROM hand_players WHERE user_id = ?", (user_id,))
+        return len(hand_ids)
+
+    def _close(self) -> None:
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    async def close(self) -> None:
+        await self.run(self._close)
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,86 @@
+from typing import Dict, List, Optional, Tuple
+
+LEADERBOARD_SIZE = 100  # entries kept per stat and scope
+
+# stats that have a leaderboard, with their display names
+LEADERBOARD_STATS = {
+    "slotprofit": "Slot machine payouts",
+    "slotcount": "Slot machine spins",
+    "slotjackpotcount": "Slot machine jackpots",
+    "bjprofit": "Blackjack payouts",
+    "bjcount": "Blackjack games",
+    "bjwincount": "Blackjack wins",
+    "bjnatural21count": "Blackjacks gotten",
+}
+
+
+class TopEntries:
+    """The highest values of one stat. Stats only ever go up, so a user that drops out never needs to come back in until their value changes."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values: Dict[int, int] = {}  # by user id
+        self.ranking: Optional[List[Tuple[int, int]]] = None  # sorted (user id, value), rebuilt when needed
+        self.lowest: Optional[int] = None  # user id with the lowest value, when full
+
+    def update(self, user_id: int, value: int) -> None:
+        if user_id in self.values:
+            if self.values[user_id] == value:
+                return
+            self.values[user_id] = value
+            if user_id == self.lowest:
+                self.lowest = None
+        elif len(self.values) < self.size:
+            self.values[user_id] = value
+        else:
+            if self.lowest is None:
+                self.lowest = min(self.values, key=self.values.__getitem__)
+            if value <= self.values[self.lowest]:
+                return
+            del self.values[self.lowest]
+            self.values[user_id] = value
+            self.lowest = None
+        self.ranking = None
+
+    def add(self, user_id: int, amount: int) -> None:
+        """Adds to the value of a user that's already on the leaderboard."""
+        if user_id in self.values:
+            self.update(user_id, self.values[user_id] + amount)
+
+    def top(self) -> List[Tuple[int, int]]:
+        if self.ranking is None:
+            self.ranking = sorted(self.values.items(), key=lambda entry: entry[1], reverse=True)
+        return self.ranking
+
+
+class Leaderboard:
+    """
+    Keeps the top users for each stat in each scope, so leaderboards don't need to go through every member.
+    It's built once from config, then kept up to date as stats change.
+    """
+
+    def __init__(self, size: int = LEADERBOARD_SIZE):
+        self.size = size
+        self.entries: Dict[Tuple[int, str], TopEntries] = {}  # by scope and stat
+
+    def get(self, scope: int, stat: str) -> TopEntries:
+        key = (scope, stat)
+        if key not in self.entries:
+            self.entries[key] = TopEntries(self.size)
+        return self.entries[key]
+
+    def update(self, scope: int, user_id: int, stats: Dict[str, int]) -> None:
+        """Records a user's total stats."""
+        for stat in LEADERBOARD_STATS:
+            if stats.get(stat):
+                self.get(scope, stat).update(user_id, stats[stat])
+
+    def add(self, scope: int, user_id: int, increments: Dict[str, int]) -> None:
+        """Records new increments for users that are already on a leaderboard, the rest are recorded once saved."""
+        for stat in LEADERBOARD_STATS:
+            if increments.get(stat) and (scope, stat) in self.entries:
+                self.entries[scope, stat].add(user_id, increments[stat])
+
+    def top(self, scope: int, stat: str) -> List[Tuple[int, int]]:
+        entries = self.entries.get((scope, stat))
+        return entries.top() if entries else []
@@ -0,0 +1,154 @@
+import time
+import asyncio
+import logging
+import aiofiles
+from pathlib import Path
+from bisect import bisect_left
+from functools import wraps
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+log = logging.getLogger("red.crab-cogs.simplecasino.metrics")
+
+METRICS_WRITE_INTERVAL = 60  # seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+TOTAL = "total"
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+_interaction: ContextVar[Optional[str]] = ContextVar("casino_interaction", default=None)
+
+
+class Histogram:
+    """Counts of observations at or below each bucket, like a Prometheus histogram."""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)  # the last one is everything slower than the last bucket
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Estimated by interpolating inside the bucket the quantile falls in."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = LATENCY_BUCKETS[i - 1] if i > 0 else 0.0
+                upper = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / count)
+            seen += count
+        return self.max
+
+
+class LatencyMetrics:
+    """
+    How long casino interactions take, and which phases of them: config reads, bank operations,
+    rendering embeds and Discord requests. An interaction is timed as a whole by decorating its callback
+    with timed(), and anything inside it can time a phase with phase(), which costs nothing outside of one.
+    """
+
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}  # by interaction and phase
+        self.path: Optional[Path] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def observe(self, interaction: str, phase: str, seconds: float) -> None:
+        key = (interaction, phase)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    def timed(self, interaction: str) -> Callable[[F], F]:
+        def decorator(func: F) -> F:
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                token = _interaction.set(interaction)
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.observe(interaction, TOTAL, time.perf_counter() - start)
+                    _interaction.reset(token)
+            return wrapper  # type: ignore
+        return decorator
+
+    @contextmanager
+    def phase(self, phase: str) -> Iterator[None]:
+        interaction = _interaction.get()
+        if interaction is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(interaction, phase, time.perf_counter() - start)
+
+    def summary(self) -> List[Tuple[str, str, int, float, float, float]]:
+        """Interaction, phase, count, p50, p99 and max of everything observed, slowest interactions first."""
+        totals = {interaction: h.quantile(0.99) for (interaction, phase), h in self.histograms.items() if phase == TOTAL}
+        keys = sorted(self.histograms, key=lambda key: (-totals.get(key[0], 0.0), key[0], key[1] != TOTAL, key[1]))
+        rows = []
+        for interaction, phase in keys:
+            histogram = self.histograms[(interaction, phase)]
+            rows.append((interaction, phase, histogram.count, histogram.quantile(0.5), histogram.quantile(0.99), histogram.max))
+        return rows
+
+    def render(self) -> str:
+        """Everything observed in the Prometheus text format."""
+        lines = ["# HELP casino_interaction_seconds Time spent handling casino interactions, by phase.",
+                 "# TYPE casino_interaction_seconds histogram"]
+        for (interaction, phase), histogram in sorted(self.histograms.items()):
+            labels = f'interaction="{interaction}",phase="{phase}"'
+            cumulative = 0
+            for bucket, count in zip(LATENCY_BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(f'casino_interaction_seconds_bucket{{{labels},le="{bucket}"}} {cumulative}')
+            lines.append(f'casino_interaction_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"casino_interaction_seconds_sum{{{labels}}} {histogram.sum:.6f}")
+            lines.append(f"casino_interaction_seconds_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def start(self, path: Path) -> None:
+        """Writes the metrics to a file periodically, for a Prometheus node exporter or anyone to read."""
+        self.path = path
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(METRICS_WRITE_INTERVAL)
+            try:
+                await self.write()
+            except Exception:
+                log.error("Failed to write casino metrics", exc_info=True)
+
+    async def write(self) -> None:
+        if self.path is None:
+            return
+        temp_path = self.path.with_suffix(".tmp")
+        async with aiofiles.open(temp_path, "w", encoding="utf-8") as fp:
+            await fp.write(self.render())
+        temp_path.replace(self.path)  # so a reader never sees half a file
+
+    async def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await self.write()
+
+
+latency = LatencyMetrics()
+timed = latency.timed
+phase = latency.phase
@@ -1,475 +1,345 @@
 import json
+import time
+import base64
+import asyncio
 import logging
 import discord
-from typing import List, Optional, Tuple, Dict, Union
+from typing import Callable, Dict, List, Optional, Union
 from datetime import datetime
-from dataclasses import dataclass, field
-from dataclasses_json import DataClassJsonMixin, config
-from redbot.core import bank, errors
+from redbot.core import bank
 from redbot.core.utils.chat_formatting import humanize_number
 
 from simplecasino.base import BaseCasinoCog, BasePokerGame
-from simplecasino.card import CARD_VALUE_STR, Card, CardSuit, CardValue
-from simplecasino.utils import (HandType, PlayerState, PlayerType, PokerState, InsufficientFundsError, humanize_camel_case,
-                                DISCORD_RED, EMPTY_ELEMENT, POKER_MAX_PLAYERS, POKER_STAGE_NAMES)
+from simplecasino.card import CARD_VALUE_STR, Card, CardSuit, Deck
+from simplecasino.metrics import phase
+from simplecasino.pokerbot import BOT_THINK_TIME, bot_balance, decide
+from simplecasino.pokercore import AllInRunout, Deposit, HandEnded, Move, PokerEvent, PokerPlayer, Withdraw, is_bot
+from simplecasino.snapshot import SNAPSHOT_VERSION, SnapshotReader, SnapshotWriter
+from simplecasino.utils import (PlayerState, PlayerType, PokerState, InsufficientFundsError, humanize_camel_case,
+                                DISCORD_RED, EMPTY_ELEMENT, POKER_STAGE_NAMES)
 from simplecasino.views.poker_rematch_view import PokerRematchView
 from simplecasino.views.poker_view import PokerView
 from simplecasino.views.poker_waiting_view import PokerWaitingView
 
 log = logging.getLogger("red.crab-cogs.simplecasino")
 
-
-@dataclass
-class HandResult(DataClassJsonMixin):
-    type: HandType = field(metadata=config(encoder=lambda x: x.value, decoder=HandType))
-    cards: List[Card]
-
-    def __post_init__(self):
-        if len(self.cards) != 5:
-            raise RuntimeError("HandResult must contain exactly 5 cards")
-
-    def _compare_key(self):
-        # comparison key: (handtype, pokervalues...)
-        return (int(self.type),) + tuple(c.poker_value for c in self.cards)
-
-    def __lt__(self, other: "HandResult") -> bool:
-        return self._compare_key() < other._compare_key()
-
-    def __eq__(self, other: object) -> bool:
-        if not isinstance(other, HandResult):
-            return False
-        return self._compare_key() == other._compare_key()
-
-
-@dataclass
-class PokerPlayer(DataClassJsonMixin):
-    id: int
-    index: int
-    type: PlayerType = field(init=False, metadata=config(encoder=lambda x: x.value, decoder=PlayerType))
-    hand: List[Card] = field(default_factory=list)
-    state: PlayerState = field(default=PlayerState.Pending, metadata=config(encoder=lambda x: x.value, decoder=PlayerState))
-    total_betted: int = 0
-    current_bet: int = 0
-    hand_result: Optional[HandResult] = None
-    winnings: int = 0
-
-    def __post_init__(self):
-        # type is min(index, Normal)
-        self.type = PlayerType(min(self.index, PlayerType.Normal.value))
-
-    def member(self, game: BasePokerGame) -> discord.Member:
-        member = game.channel.guild.get_member(self.id)
-        if not member:
-            raise RuntimeError(f"Where did poker player with id {self.id} go?")
-        return member
-
-    async def bet(self, game: BasePokerGame, bet_amount: int) -> int:
-        if bet_amount < self.current_bet:
-            raise ValueError("New bet must be higher than previous")
-
-        additional = bet_amount - self.current_bet
-        if additional == 0:
-            return 0
-
-        member = self.member(game)
-
-        bal = await bank.get_balance(member)
-        if bal <= 0:
-            raise InsufficientFundsError
-
-        # all in
-        if bal < additional:
-            await bank.withdraw_credits(member, bal)
-            self.total_betted += bal
-            self.current_bet += bal
-            self.state = PlayerState.AllIn
-            return bal
-
-        # normal bet
-        await bank.withdraw_credits(member, additional)
-        self.total_betted += additional
-        self.current_bet = bet_amount
-        return additional
+SAVE_DELAY = 2  # seconds, changes made within this time of each other are saved together
+BALANCE_CACHE_TIME = 15  # seconds a player's balance is shown without asking the bank again
 
 
 class PokerGame(BasePokerGame):
-    def __init__(self, cog: BaseCasinoCog, players: List[discord.Member], channel: Union[discord.TextChannel, discord.Thread], minimum_bet: int):
-        super().__init__(cog, players, channel, minimum_bet)
-        self.players: List[PokerPlayer] = [PokerPlayer(id=p, index=i) for i, p in enumerate(self.players_ids)]
-
     async def save_state(self) -> None:
+        if self.is_finished:
+            await self.flush_state()
+        elif self.save_task is None:
+            self.save_task = asyncio.create_task(self.delayed_flush())
+        else:
+            self.cog.saves_avoided += 1
+
+    async def delayed_flush(self) -> None:
+        await asyncio.sleep(SAVE_DELAY)
+        await self.flush_state()
+
+    async def flush_state(self) -> None:
+        if self.save_task is not None:
+            if self.save_task is not asyncio.current_task():
+                self.save_task.cancel()
+            self.save_task = None
+        elif self.is_finished and self.finished_saved:
+            self.cog.saves_avoided += 1
+            return
         channel_conf = self.cog.config.channel(self.channel)
         if self.is_finished:
+            self.finished_saved = True
             await channel_conf.game.set({})
         else:
-            await channel_conf.game.set({
-                "players": json.dumps([p.to_dict(encode_json=True) for p in self.players]),
-                "table": json.dumps([c.to_dict(encode_json=True) for c in self.table]),
-                "deck": json.dumps([c.to_dict(encode_json=True) for c in self.deck]),
-                "state": int(self.state),
-                "minimum_bet": self.minimum_bet,
-                "current_bet": self.current_bet,
-                "pot": self.pot,
-                "turn": self.turn,
-                "finished": self.all_hands_finished,
-                "message": self.message.id if self.message else None
-            })
-
-    @staticmethod
-    async def from_config(cog: BaseCasinoCog, channel: Union[discord.TextChannel, discord.Thread], config: dict) -> "PokerGame":
-        game = PokerGame(cog, [], channel, config["minimum_bet"])
-        game.players = [PokerPlayer.from_dict(p) for p in json.loads(config["players"])]
-        game.players_ids = [p.id for p in game.players]
-        game.table = [Card.from_dict(c) for c in json.loads(config["table"])]
-        game.deck = [Card.from_dict(c) for c in json.loads(config["deck"])]
-        game.state = PokerState(config["state"])
-        game.current_bet = config["current_bet"]
-        game.pot = config["pot"]
-        game.turn = config["turn"]
-        game.all_hands_finished = config["finished"]
-        if config["message"]:
-            try:
-                game.message = await channel.fetch_message(config["message"])
-            except discord.NotFound:
-                pass
+            await channel_conf.game.set(self.config_data())
+
+    def config_data(self) -> dict:
+        return {"snapshot": base64.b64encode(self.pack_state()).decode()}
+
+    def pack_state(self) -> bytes:
+        writer = SnapshotWriter()
+        writer.u8(SNAPSHOT_VERSION)
+        writer.u8(self.state.value)
+        writer.u8(self.all_hands_finished)
+        writer.i64(self.minimum_bet)
+        writer.i64(self.current_bet)
+        writer.i64(self.pot)
+        writer.optional_u8(self.turn)
+        writer.optional_u64(self.message.id if self.message else None)
+        writer.cards(self.table)
+        writer.deck(self.deck)
+        writer.u8(len(self.players))
+        for player in self.players:
+            player.pack(writer)
+        writer.balances(self.start_balances)
+        writer.moves(self.moves)
+        writer.u64(self.session_hand)
+        writer.balances(self.session_nets)
+        return writer.getvalue()
+
+    def unpack_state(self, data: bytes) -> Optional[int]:
+        """Restores the game from a snapshot and returns the id of its message, if any."""
+        reader = SnapshotReader(data)
+        version = reader.u8()
+        if not 1 <= version <= SNAPSHOT_VERSION:
+            raise ValueError(f"Unknown poker snapshot version {version}")
+        self.state = PokerState(reader.u8())
+        self.all_hands_finished = reader.flag()
+        self.minimum_bet = reader.i64()
+        self.current_bet = reader.i64()
+        self.pot = reader.i64()
+        self.turn = reader.optional_u8()
+        message_id = reader.optional_u64()
+        self.table = reader.cards()
+        self.deck = reader.deck()
+        self.players = [PokerPlayer.unpack(reader) for _ in range(reader.u8())]
+        self.players_ids = [p.id for p in self.players]
+        if version >= 2:  # older hands can't be recorded in the history
+            self.start_balances = reader.balances()
+            self.moves = [(seat, Move(move), bet, balance) for seat, move, bet, balance in reader.moves()]
+        if version >= 3:
+            self.session_hand = reader.u64()
+            self.session_nets = reader.balances()
+        reader.end()
+        return message_id
+
+    def unpack_legacy_state(self, config: dict) -> Optional[int]:
+        """Restores the game from the JSON layout used before snapshots, and returns the id of its message."""
+        self.minimum_bet = config["minimum_bet"]
+        self.players = [PokerPlayer.from_dict(p) for p in json.loads(config["players"])]
+        self.players_ids = [p.id for p in self.players]
+        self.table = [Card.from_dict(c) for c in json.loads(config["table"])]
+        self.deck = Deck(Card.from_dict(c).id for c in json.loads(config["deck"]))
+        self.state = PokerState(config["state"])
+        self.current_bet = config["current_bet"]
+        self.pot = config["pot"]
+        self.turn = config["turn"]
+        self.all_hands_finished = config["finished"]
+        return config.get("message")
+
+    @classmethod
+    async def from_config(cls, cog: BaseCasinoCog, channel: Union[discord.TextChannel, discord.Thread], config: dict) -> "PokerGame":
+        game = cls(cog, [], channel, 0)
+        if "snapshot" in config:
+            message_id = game.unpack_state(base64.b64decode(config["snapshot"]))
+        else:
+            message_id = game.unpack_legacy_state(config)
+        if message_id:
+            game.message = channel.get_partial_message(message_id)  # fetched later only if needed
+        await game.play_bots()  # in case it was a bot's turn when the bot stopped
         game.view = await game.get_view()
         return game
 
-    @property
-    def is_finished(self) -> bool:
-        return self.all_hands_finished or self.is_cancelled
-
-    def current_player(self) -> Optional[PokerPlayer]:
-        return self.players[self.turn] if self.turn is not None and 0 <= self.turn < len(self.players) else None
-
-    def find_player(self, ptype: PlayerType) -> Optional[PokerPlayer]:
-        return next((p for p in self.players if p.type == ptype), None)
-
-    def find_player_by_id(self, user_id: int) -> Optional[PokerPlayer]:
-        return next((p for p in self.players if p.id == user_id), None)
-
-    def get_previous_player(self) -> Optional[PokerPlayer]:
-        if not (self.turn is not None and 0 <= self.turn < len(self.players)):
-            return None
-        assert self.turn is not None
-        t = self.turn
-        for _ in range(len(self.players)):
-            t = t - 1 if t > 0 else len(self.players) - 1
-            if self.players[t].state != PlayerState.Folded:
-                return self.players[t]
-        return None
-
-    def get_next_player(self) -> Optional[PokerPlayer]:
-        if not (self.turn is not None and 0 <= self.turn < len(self.players)):
-            return None
-        t = self.turn
-        for _ in range(len(self.players)):
-            t = t + 1 if t < len(self.players) - 1 else 0
-            if self.players[t].state != PlayerState.Folded:
-                return self.players[t]
-        return None
-
-    @property
-    def can_check(self) -> bool:
-        current = self.current_player()
-        previous = self.get_previous_player()
-        if previous is None or current is None:
-            return False
-        if previous.state in (PlayerState.Pending, PlayerState.Checked):
-            return True
-        if self.state == PokerState.PreFlop and current and current.type == PlayerType.BigBlind:
-            return all(p.current_bet <= current.current_bet for p in self.players)
-        return False
-
-    def try_add_player(self, user_id: int) -> Tuple[bool, str]:
-        if self.state != PokerState.WaitingForPlayers:
-            return False, "The game already started."
-        if len(self.players) >= POKER_MAX_PLAYERS:
-            return False, "This game is full."
-        if any(p.id == user_id for p in self.players):
-            return False, "You're already playing."
-        self.players.append(PokerPlayer(id=user_id, index=len(self.players)))
-        self.players_ids = [p.id for p in self.players]
-        return True, ""
-    
-    def try_remove_player(self, user_id: int) -> Tuple[bool, str]:
-        if len(self.players) == 1:
-            return False, "You can't leave. Try cancelling the game instead."
-        if self.state != PokerState.WaitingForPlayers:
-            return False, "The game already started."
-        pl = self.find_player_by_id(user_id)
-        if pl is None:
-            return False, "You're not even playing, why are you trying to leave?"
-        self.players.remove(pl)
-        # re-index players
-        for i, p in enumerate(self.players):
-            p.index = i
-            p.type = PlayerType(min(i, PlayerType.Normal.value))
-        return True, ""
-    
+    def member(self, user_id: int) -> discord.Member:
+        member = self.channel.guild.me if is_bot(user_id) else self.channel.guild.get_member(user_id)
+        if not member:
+            raise RuntimeError(f"Where did poker player with id {user_id} go?")
+        return member
+
+    def display_name(self, user_id: int) -> str:
+        return f"🤖 Bot {user_id}" if is_bot(user_id) else self.member(user_id).display_name
+
+    def mention(self, user_id: int) -> str:
+        return f"**{self.display_name(user_id)}**" if is_bot(user_id) else self.member(user_id).mention
+
+    async def apply(self, action: Callable[..., List[PokerEvent]], *args) -> None:
+        """
+        Runs an action of the rules and carries out its events together: one bank write per player, then a single save,
+        written right away if money moved and otherwise delayed to be coalesced with the next ones.
+        If the bank refuses to move the money, the action is undone and the bank's error is raised.
+        """
+        self.last_interacted = datetime.now()
+        snapshot, cancelled = self.pack_state(), self.is_cancelled
+        try:
+            events = action(*args)
+            transfers = self.transfers(events)
+            with phase("bank"):
+                await self.settle(transfers)
+        except Exception:
+            self.unpack_state(snapshot)
+            self.is_cancelled = cancelled
+            raise
+        if transfers:  # money moved, so a crash must not restore the game from before it
+            await self.flush_state()
+        runouts = [event for event in events if isinstance(event, AllInRunout)]
+        for runout in runouts:
+            with phase("equity"):
+                await self.calculate_allin_equity(runout)
+        if any(isinstance(event, HandEnded) for event in events):
+            try:
+                with phase("history"):
+                    self.hand_id = await self.cog.history.record(self.channel.guild.id, self.channel.id, self)
+            except Exception:
+                log.error(f"Recording poker hand in {self.channel.id}", exc_info=True)
+            self.on_hand_end()
+        if not transfers or runouts:
+            await self.save_state()
+
+    def transfers(self, events: List[PokerEvent]) -> Dict[int, int]:
+        """The net amount each player's balance changes by. Bot seats play with the house's money, the bot's own account."""
+        house = self.channel.guild.me.id
+        transfers: Dict[int, int] = {}
+        for event in events:
+            if isinstance(event, (Withdraw, Deposit)):
+                user_id = house if is_bot(event.user_id) else event.user_id
+                amount = event.amount if isinstance(event, Deposit) else -event.amount
+                transfers[user_id] = transfers.get(user_id, 0) + amount
+        return {user_id: amount for user_id, amount in transfers.items() if amount}
+
+    def on_hand_end(self) -> None:
+        pass
+
+    async def settle(self, transfers: Dict[int, int]) -> None:
+        if not transfers:
+            return
+        await self.cog.settlements.settle(self.channel.guild, transfers)
+        for user_id, amount in transfers.items():
+            if amount < 0 and user_id in self.balance_cache:  # withdrawals are exact, deposits may hit the maximum balance
+                balance, fetched_at = self.balance_cache[user_id]
+                self.balance_cache[user_id] = (balance + amount, fetched_at)
+            else:
+                self.balance_cache.pop(user_id, None)
+
     async def cancel(self) -> None:
         if self.is_cancelled:
             return
-        self.is_cancelled = True
-        await self.save_state()
+        await self.apply(self.apply_cancel)
         if self.message:
             try:
                 await self.message.delete()
             except discord.NotFound:
                 pass
-        for player in self.players:
-            if player.total_betted > 0:
-                member = player.member(self)
-                try:
-                    await bank.deposit_credits(member, player.total_betted)
-                except errors.BalanceTooHigh as err:
-                    await bank.set_balance(member, err.max_balance)
 
-    async def start_hand(self) -> None:
-        if self.state != PokerState.WaitingForPlayers:
-            raise ValueError("Game already started")
-        if len(self.players) < 2:
-            raise ValueError("Not enough players")
-        elif len(self.players) == 2:
-            self.players[0].type = PlayerType.SmallBlind
-            self.players[1].type = PlayerType.BigBlind
-
-        for _ in range(2):
-            for p in self.players:
-                p.hand.append(self.deck.pop())
-
-        sb = self.find_player(PlayerType.SmallBlind)
-        bb = self.find_player(PlayerType.BigBlind)
-        assert sb is not None and bb is not None
-        self.pot += await sb.bet(self, self.minimum_bet // 2)
-        sb.state = PlayerState.Betted
-        self.pot += await bb.bet(self, self.minimum_bet)
-        bb.state = PlayerState.Betted
-
-        start_player = (bb.index if bb else (sb.index if sb else 0))
-        self.turn = self.get_next(start_player)
-        self.state = PokerState.PreFlop
-        await self.save_state()
+    async def get_currency_name(self) -> str:
+        return await self.cog.get_currency_name(self.channel.guild)
+
+    async def balance(self, player: PokerPlayer, fresh: bool = False) -> int:
+        """
+        What a player has to bet. Cached for a few seconds to show it and to offer raises,
+        but asked from the bank when it's about to be bet, in case they spent it elsewhere.
+        """
+        balance = await self.bank_balance(self.member(player.id), fresh)
+        if is_bot(player.id):  # the house's money, as far as the bot's stack goes
+            return min(balance, bot_balance(self, player))
+        return balance
+
+    async def bank_balance(self, member: discord.Member, fresh: bool) -> int:
+        cached = self.balance_cache.get(member.id)
+        if not fresh and cached is not None and time.monotonic() - cached[1] < BALANCE_CACHE_TIME:
+            return cached[0]
+        with phase("bank"):
+            balance = await bank.get_balance(member)
+        self.balance_cache[member.id] = (balance, time.monotonic())
+        return balance
 
-    def get_next(self, start_index: int) -> int:
-        i = start_index
-        for _ in range(len(self.players)):
-            i = i + 1 if i < len(self.players) - 1 else 0
-            if self.players[i].state != PlayerState.Folded:
-                return i
-        return start_index
+    async def start_hand(self) -> None:
+        balances = await asyncio.gather(*(self.balance(p, fresh=True) for p in self.players))
+        await self.apply(self.apply_start_hand, dict(zip(self.players_ids, balances)))
+        await self.play_bots()
+
+    async def next_hand(self) -> bool:
+        """
+        Deals the next hand of the session at this table, without the players who left or can no longer pay the big blind.
+        Returns whether there are still enough players: bots fill seats, but the session ends when fewer than two humans remain.
+        """
+        self.balance_cache.clear()
+        leaving = set(self.leaving)
+        for player in self.players:
+            if is_bot(player.id):  # its winnings are already in the house's account, and join its stack when the next hand starts
+                balance = min(await self.bank_balance(self.channel.guild.me, fresh=True), bot_balance(self, player) + player.winnings)
+            elif self.channel.guild.get_member(player.id):
+                balance = await self.balance(player, fresh=True)
+            else:
+                balance = 0
+            if balance < self.minimum_bet:
+                leaving.add(player.id)
+        if sum(not is_bot(p.id) and p.id not in leaving for p in self.players) < 2:
+            return False
+        await self.apply(self.apply_next_hand, leaving, self.rng)
+        self.leaving.clear()
+        self.finished_saved = False
+        self.hand_id = None
+        self.bot_equities.clear()
+        try:
+            await self.start_hand()
+        except (InsufficientFundsError, ValueError):  # someone spent their money in the meantime
+            self.is_cancelled = True
+            await self.save_state()
+            return False
+        return True
 
     async def fold(self, user_id: int) -> None:
-        current = self.current_player()
-        if current is None or current.id != user_id:
-            raise ValueError("Not your turn")
-        
-        current.state = PlayerState.Folded
-        current.current_bet = 0
-
-        # check elimination
-        not_folded = [p for p in self.players if p.state != PlayerState.Folded]
-        if len(not_folded) == 1:
-            await self.end_hand(force_winner=not_folded[0])
-            return
-        
-        # special case: nobody bet the first round
-        if len(not_folded) == 2 and self.state == PokerState.PreFlop \
-                and all(p.type in (PlayerType.SmallBlind, PlayerType.BigBlind) for p in not_folded):
-            sb = self.find_player(PlayerType.SmallBlind)
-            assert sb is not None
-            sb.state = PlayerState.Pending
-
-        await self.advance_turn()
+        await self.apply(self.apply_fold, user_id)
+        await self.play_bots()
 
     async def check(self, user_id: int) -> None:
-        current = self.current_player()
-        if current is None or current.id != user_id:
-            raise ValueError("Not your turn")
-        if not self.can_check:
-            raise ValueError("Cannot check")
-        
-        current.state = PlayerState.Checked
-        await self.advance_turn()
+        await self.apply(self.apply_check, user_id)
+        await self.play_bots()
 
     async def bet(self, user_id: int, bet: int) -> None:
-        current = self.current_player()
-        if current is None or current.id != user_id:
-            raise ValueError("Not your turn")
-        if bet < self.current_bet:
-            raise ValueError("Bet must be higher than the previous")
-
-        additional = await current.bet(self, bet)
-        if additional == 0:
-            await self.advance_turn()
+        player = self.find_player_by_id(user_id)
+        if player is None:
+            raise ValueError("Not a player")
+        await self.apply(self.apply_bet, user_id, bet, await self.balance(player, fresh=True))
+        await self.play_bots()
+
+    async def play_bots(self) -> None:
+        """Plays the turns of bot seats until it's someone's turn or the hand is over."""
+        while not self.is_finished:
+            player = self.current_player()
+            if player is None or not is_bot(player.id):
+                return
+            balance = await self.balance(player, fresh=True)
+            move, bet = decide(self, player, await self.bot_equity(player), balance, self.rng)
+            try:
+                if move is Move.Fold:
+                    await self.apply(self.apply_fold, player.id)
+                elif move is Move.Check:
+                    await self.apply(self.apply_check, player.id)
+                else:
+                    await self.apply(self.apply_bet, player.id, bet, balance)
+            except (InsufficientFundsError, ValueError):  # the house ran out in the meantime
+                await self.apply(self.apply_check if self.can_check else self.apply_fold, player.id)
+
+    async def bot_equity(self, player: PokerPlayer) -> float:
+        """The bot's share of the pot against random hands, calculated once per stage."""
+        key = (player.id, len(self.table))
+        if key not in self.bot_equities:
+            opponents = sum(1 for p in self.players if p.state != PlayerState.Folded and p is not player)
+            results = await self.cog.equity.calculate([player.hand], self.table, opponents, BOT_THINK_TIME)
+            self.bot_equities[key] = results[0].share if results is not None else 1 / (opponents + 1)
+        return self.bot_equities[key]
+
+    async def calculate_allin_equity(self, runout: AllInRunout) -> None:
+        players = [self.players[i] for i in runout.players]
+        results = await self.cog.equity.calculate([p.hand for p in players], list(runout.table))
+        if results is None:
             return
+        for player, result in zip(players, results):
+            player.allin_equity = result.share
 
-        self.pot += additional
-        if current.state != PlayerState.AllIn:
-            current.state = PlayerState.Betted
-        self.current_bet = max(self.current_bet, current.current_bet)
-
-        for p in self.players:
-            if p.state not in (PlayerState.Folded, PlayerState.AllIn) and p.current_bet < self.current_bet:
-                p.state = PlayerState.Pending
-
-        # live blind
-        if self.state == PokerState.PreFlop and self.current_bet == self.minimum_bet and current.type != PlayerType.BigBlind:
-            bb = self.find_player(PlayerType.BigBlind)
-            if bb is not None and bb.state != PlayerState.Folded:
-                bb.state = PlayerState.Pending
-
-        await self.advance_turn()
-
-    async def advance_turn(self) -> None:
-        self.last_interacted = datetime.now()
-
-        # keep advancing rounds while there are no non-all-in pending players
-        while True:
-            active_non_folded = [p for p in self.players if p.state != PlayerState.Folded]
-            non_allin_active = [p for p in active_non_folded if p.state != PlayerState.AllIn]
-            pending_non_allin = [p for p in non_allin_active if p.state == PlayerState.Pending]
-            if active_non_folded and not pending_non_allin:
-                self.state = PokerState(min(self.state.value + 1, PokerState.Showdown.value))
-                self.current_bet = 0
-                if len(non_allin_active) > 1:
-                    for p in self.players:
-                        if p.state not in (PlayerState.Folded, PlayerState.AllIn):
-                            p.state = PlayerState.Pending
-                            p.current_bet = 0
-                # deal cards
-                if self.state == PokerState.Flop:
-                    self.deck.pop()
-                    for _ in range(3):
-                        self.table.append(self.deck.pop())
-                elif self.state in (PokerState.Turn, PokerState.River):
-                    self.deck.pop()
-                    self.table.append(self.deck.pop())
-                elif self.state == PokerState.Showdown:
-                    await self.end_hand()
-                    return
-                continue  # keep going
-            break
-
-        found = False
-        if self.turn is None:
-            for i, p in enumerate(self.players):
-                if p.state == PlayerState.Pending:
-                    self.turn = i
-                    found = True
-                    break
-        else:
-            start = self.turn
-            n = len(self.players)
-            for i in range(1, n + 1):
-                idx = (start + i) % n
-                if self.players[idx].state == PlayerState.Pending:
-                    self.turn = idx
-                    found = True
-                    break
-
-        if not found:
-            self.turn = None
-
-        await self.save_state()
-
-    async def end_hand(self, force_winner: Optional[PokerPlayer] = None) -> None:
-        if force_winner:
-            force_winner.winnings += self.pot
-            self.state = PokerState.Showdown  # ui
-            member = force_winner.member(self)
-            if self.pot > 0:
-                try:
-                    await bank.deposit_credits(member, self.pot)
-                except errors.BalanceTooHigh as err:
-                    await bank.set_balance(member, err.max_balance)
-        else:
-            # evaluate hands
-            for player in self.players:
-                if player.state != PlayerState.Folded:
-                    player.hand_result = get_hand_result(self.table, player.hand)
-
-            pots = self.build_side_pots()
-
-            # For each pot, find the best hand among eligible players
-            for pot_amount, eligible_players in pots:
-                if not eligible_players or pot_amount == 0:
-                    continue  # shouldn't happen
-
-                contenders = [p for p in eligible_players if p.state != PlayerState.Folded]
-                if not contenders:
-                    continue  # shouldn't happen
-
-                # find best HandResult among contenders
-                best = max((p.hand_result for p in contenders), default=None)  # type: ignore
-                if best is None:
-                    continue  # shouldn't happen
-
-                winners = [p for p in contenders if p.hand_result == best]
-
-                # split pot among winners with deterministic remainder
-                per = pot_amount // len(winners)
-                remainder = pot_amount % len(winners)
-                winners_sorted = sorted(winners, key=lambda p: p.index)
-                for i, winner in enumerate(winners_sorted):
-                    member = winner.member(self)
-                    amount = per + (1 if i < remainder else 0)
-                    winner.winnings += amount
-                    try:
-                        await bank.deposit_credits(member, amount)
-                    except errors.BalanceTooHigh as err:
-                        await bank.set_balance(member, err.max_balance)
-        # cleanup
-        self.all_hands_finished = True
-        self.turn = None
-        await self.save_state()
-
-    def build_side_pots(self) -> List[Tuple[int, List[PokerPlayer]]]:
-        # consider all players who put chips into the pot (could include folded players)
-        contributors = [p for p in self.players if p.total_betted > 0]
-        if not contributors:
-            return []
-
-        remaining = sorted(contributors, key=lambda p: p.total_betted)
-        pots: List[Tuple[int, List[PokerPlayer]]] = []
-        last = 0
-
-        while remaining:
-            smallest = remaining[0].total_betted
-            contribution = smallest - last  # how much each remaining player contributes to this slice
-            pot_amount = contribution * len(remaining)
-
-            # eligible players for this pot are remaining players who did NOT fold
-            eligible = [p for p in remaining if p.state != PlayerState.Folded]
-            pots.append((pot_amount, eligible))
-
-            # move forward: remove players who only contributed up to smallest
-            last = smallest
-            remaining = [p for p in remaining if p.total_betted > smallest]
-
-        return pots
-    
-
-    async def get_suit_emojis(self):
+    def get_suit_emojis(self):
         return {
             CardSuit.HEARTS: "♥️",
             CardSuit.DIAMONDS: "♦️",
-            CardSuit.SPADES: await self.cog.config.emoji_spades(),
-            CardSuit.CLUBS: await self.cog.config.emoji_clubs(),
+            CardSuit.SPADES: self.cog.emoji("spades"),
+            CardSuit.CLUBS: self.cog.emoji("clubs"),
         }
     
-    async def get_player_type_emojis(self):
+    def get_player_type_emojis(self):
         return {
-            PlayerType.Dealer: await self.cog.config.emoji_dealer(),
-            PlayerType.SmallBlind: await self.cog.config.emoji_smallblind(),
-            PlayerType.BigBlind: await self.cog.config.emoji_bigblind(),
+            PlayerType.Dealer: self.cog.emoji("dealer"),
+            PlayerType.SmallBlind: self.cog.emoji("smallblind"),
+            PlayerType.BigBlind: self.cog.emoji("bigblind"),
             PlayerType.Normal: "",
         }
 
     async def get_embed(self) -> discord.Embed:
-        suit_emojis = await self.get_suit_emojis()
-        player_emojis = await self.get_player_type_emojis()
-        currency_name = await bank.get_currency_name(self.channel.guild)
+        suit_emojis = self.get_suit_emojis()
+        player_emojis = self.get_player_type_emojis()
+        currency_name = await self.get_currency_name()
 
         def card_str(card: Card):
             return f"{CARD_VALUE_STR[card.value]}{suit_emojis[card.suit]}"
@@ -483,7 +353,7 @@ class PokerGame(BasePokerGame):
         if len(winners) == 0:
             title_extra = POKER_STAGE_NAMES[self.state]
         elif len(winners) == 1:
-            title_extra = f"Winner: {winners[0].member(self).display_name}"
+            title_extra = f"Winner: {self.display_name(winners[0].id)}"
         else:
             title_extra = "Winners"
 
@@ -500,7 +370,7 @@ class PokerGame(BasePokerGame):
         if self.state == PokerState.WaitingForPlayers:
             desc_lines.append(f"**💵 Starting bet:** {humanize_number(self.minimum_bet)} {currency_name}\n")
             for player in self.players:
-                desc_lines.append(f"<@{player.id}> {player_emojis[player.type]}")
+                desc_lines.append(f"{self.mention(player.id)} {player_emojis[player.type]}")
             embed.description = "\n".join(desc_lines)
             embed.color = await self.cog.bot.get_embed_color(self.channel)
             return embed
@@ -527,6 +397,8 @@ class PokerGame(BasePokerGame):
                     if player.hand_result is not None:
                         content_lines.append(f"`🃏` {' '.join(card_str(c) for c in player.hand_result.cards)}")
                         content_lines.append(f"`📜` {humanize_camel_case(player.hand_result.type.name).title()}")
+                    if player.allin_equity is not None:
+                        content_lines.append(f"`📊` {player.allin_equity:.1%} all-in equity")
 
                 if player in winners:
                     content_lines.append(f"`💵` +{humanize_number(player.winnings - player.total_betted)} {currency_name}")
@@ -534,7 +406,7 @@ class PokerGame(BasePokerGame):
                     content_lines.append(f"`💵` -{humanize_number(player.total_betted - player.winnings)} {currency_name}")
 
                 inline = i % 3 != 2  # move every 3rd field to its own row to give enough space for the hands to display in full width
-                embed.add_field(name=f"{decorator}{player.member(self).display_name}", value="\n".join(content_lines) or "\u200b", inline=inline)
+                embed.add_field(name=f"{decorator}{self.display_name(player.id)}", value="\n".join(content_lines) or "\u200b", inline=inline)
         # player summary
         else:
             for player in self.players:
@@ -546,7 +418,7 @@ class PokerGame(BasePokerGame):
                 if player in winners:
                     line += f"👑 "
 
-                line += player.member(self).mention
+                line += self.mention(player.id)
 
                 if not hand_finished:
                     line += player_emojis[player.type]
@@ -568,12 +440,12 @@ class PokerGame(BasePokerGame):
         # thumbnail
         thumbnail_url = None
         if len(winners) == 1:
-            winner_member = winners[0].member(self)
+            winner_member = self.member(winners[0].id)
             thumbnail_url = winner_member.display_avatar.url
             embed.color = winner_member.color
         elif self.turn is not None:
             turn_player = self.players[self.turn]
-            member = turn_player.member(self)
+            member = self.member(turn_player.id)
             if member:
                 thumbnail_url = member.display_avatar.url
 
@@ -581,155 +453,67 @@ class PokerGame(BasePokerGame):
         embed.description = "\n".join(desc_lines) if desc_lines else EMPTY_ELEMENT
         if thumbnail_url:
             embed.set_thumbnail(url=thumbnail_url)
+        footer = [f"Hand #{self.hand_id}"] if self.hand_id is not None else []
+        if self.session_hand > 1:
+            footer.append(f"{self.session_hand} hands at this table")
+        if footer:
+            embed.set_footer(text=" - ".join(footer))
         return embed
-    
 
     async def get_view(self) -> Optional[discord.ui.View]:
         if self.state == PokerState.WaitingForPlayers:
-            return PokerWaitingView(self)
+            with phase("config"):
+                allow_bots = await self.cog.config.pokerbots() if await bank.is_global() else await self.cog.config.guild(self.channel.guild).pokerbots()
+            return PokerWaitingView(self, allow_bots)
         elif self.is_finished:
             return PokerRematchView(self)
         else:
             if self.turn is None or not 0 <= self.turn < len(self.players):
                 raise RuntimeError("Invalid turn during game")
             cur_player = self.players[self.turn]
-            money = await bank.get_balance(cur_player.member(self))
-            currency_name = await bank.get_currency_name(self.channel.guild)
+            money = await self.balance(cur_player)
+            currency_name = await self.get_currency_name()
             return PokerView(self, money, cur_player.current_bet, currency_name)
-    
 
     async def update_message(self, interaction: Optional[discord.Interaction] = None):
         content = None
         if self.state != PokerState.WaitingForPlayers and not self.is_finished and self.turn is not None and 0 <= len(self.players):
-            content = self.players[self.turn].member(self).mention
+            content = self.mention(self.players[self.turn].id)
         
         self.view = await self.get_view()
-        embed = await self.get_embed()
+        with phase("render"):
+            embed = await self.get_embed()
+
+        with phase("discord"):
+            if interaction and interaction.response.is_done():  # deferred while the hand was played
+                await interaction.edit_original_response(content=content, embed=embed, view=self.view)
+            elif interaction:
+                await interaction.response.edit_message(content=content, embed=embed, view=self.view)
+            else:
+                old_message = self.message
+                self.message = await self.channel.send(content=content, embed=embed, view=self.view or discord.ui.View(timeout=0))
+                if old_message:
+                    try:
+                        await old_message.delete()
+                    except discord.NotFound:
+                        pass
 
-        if interaction:
-            await interaction.response.edit_message(content=content, embed=embed, view=self.view)
-        else:
-            old_message = self.message
-            self.message = await self.channel.send(content=content, embed=embed, view=self.view or discord.ui.View(timeout=0))
-            if old_message:
-                try:
-                    await old_message.delete()
-                except discord.NotFound:
-                    pass
-
-        async with self.cog.config.channel(self.channel).game() as game:
-            game["message"] = self.message.id if self.message else None
-    
+        await self.save_state()
 
     async def send_cards(self, interaction: discord.Interaction) -> None:
         player = self.find_player_by_id(interaction.user.id)
         if player is None:
             raise ValueError("Not a player")
-        SUIT_EMOJIS = await self.get_suit_emojis()
+        await interaction.response.defer(ephemeral=True, thinking=True)  # the equity can take most of discord's 3 seconds
+        SUIT_EMOJIS = self.get_suit_emojis()
         embed = discord.Embed(color=0x000000)
         embed.description = " ".join(f"{CARD_VALUE_STR[card.value]}{SUIT_EMOJIS[card.suit]}" for card in player.hand)
         embed.set_author(name="Here are your cards", icon_url=interaction.user.display_avatar.url)
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-
-
-
-def is_straight(original_cards: List[Card]) -> Tuple[bool, Optional[Card]]:
-    if len(original_cards) < 5:
-        return False, None
-
-    # unique by rank, keep any representative (we later look up by rank)
-    rank_map = {}
-    for c in original_cards:
-        rank_map[c.value.value] = c
-    ranks = sorted(rank_map.keys())  # ascending list of ints
-
-    # ace is special
-    if set([10, 11, 12, 13, 1]).issubset(set(ranks)):
-        return True, rank_map[1]
-
-    # sliding window
-    for i in range(0, len(ranks) - 4):
-        window = ranks[i:i+5]
-        if window[4] - window[0] == 4 and all(window[j+1] - window[j] == 1 for j in range(4)):
-            return True, rank_map[window[-1]]
-    return False, None
-
-
-def get_hand_result(table: List[Card], hand: List[Card]) -> HandResult:
-    if len(table) != 5 or len(hand) != 2:
-        raise ValueError("Invalid number of cards for evaluation")
-    cards = table + hand
-
-    # check flush
-    suits_group: Dict[CardSuit, List[Card]] = {}
-    for c in cards:
-        suits_group.setdefault(c.suit, []).append(c)
-    flush = None
-    for suit_cards in suits_group.values():
-        if len(suit_cards) >= 5:
-            flush = sorted(suit_cards, key=lambda x: x.poker_value, reverse=True)
-            break
-    if flush:
-        is_straight_flush, highest = is_straight(flush)
-        if is_straight_flush and highest is not None:
-            index_highest = flush.index(highest)
-            straightflush = flush[index_highest:index_highest+5]
-            if len(straightflush) == 4:  # janky edge case: ace-5-4-3-2
-                straightflush.append(flush[0])
-            htype = HandType.RoyalFlush if highest.value == CardValue.ACE else HandType.StraightFlush
-            return HandResult(htype, straightflush)
-        return HandResult(HandType.Flush, flush[:5])
-
-    # group by value
-    by_value: Dict[CardValue, List[Card]] = {}
-    for c in cards:
-        by_value.setdefault(c.value, []).append(c)
-    groups = list(by_value.values())
-
-    # quadruple
-    quad = next((g for g in groups if len(g) == 4), None)
-    if quad:
-        extra = sorted((c for c in cards if c not in quad), key=lambda x: x.poker_value, reverse=True)[:1]
-        return HandResult(HandType.Quadruple, quad + extra)
-
-    # triple
-    triple = next((g for g in groups if len(g) == 3), None)
-    if triple:
-        remaining = [g for g in groups if g is not triple]
-        pair = next((g for g in remaining if len(g) >= 2), None)
-        if pair:
-            return HandResult(HandType.FullHouse, triple + pair[:2])
-        extra = sorted((c for c in cards if c not in triple), key=lambda x: x.poker_value, reverse=True)[:2]
-        return HandResult(HandType.Triple, triple + extra)
-
-    # straight
-    distinct: List[Card] = []
-    seen_vals = set()
-    for c in sorted(cards, key=lambda x: x.poker_value, reverse=True):
-        if c.value not in seen_vals:
-            distinct.append(c)
-            seen_vals.add(c.value)
-    is_str, highest = is_straight(list(reversed(distinct)))  # function expects ascending order
-    if is_str and highest is not None:
-        index_highest = distinct.index(highest)
-        straight_cards = distinct[index_highest:index_highest+5]
-        if len(straight_cards) == 4:  # janky edge case: ace-5-4-3-2
-            straight_cards.append(distinct[0])
-        return HandResult(HandType.Straight, straight_cards)
-
-    # pairs
-    ordered = sorted(cards, key=lambda x: x.poker_value, reverse=True)
-    pair = next((g for g in groups if len(g) == 2), None)
-    if pair:
-        remaining_groups = [g for g in groups if g is not pair]
-        second_pair = next((g for g in remaining_groups if len(g) == 2), None)
-        if second_pair:
-            # sort pairs by value
-            pair_vals = sorted([pair, second_pair], key=lambda g: g[0].poker_value, reverse=True)
-            doublepair = pair_vals[0] + pair_vals[1]
-            extra = sorted((c for c in cards if c not in doublepair), key=lambda x: x.poker_value, reverse=True)[:1]
-            return HandResult(HandType.DoublePair, doublepair + extra)
-        extra = [c for c in ordered if c not in pair][:3]
-        return HandResult(HandType.Pair, pair + extra)
-
-    return HandResult(HandType.HighCard, ordered[:5])
+        if self.state != PokerState.WaitingForPlayers and not self.is_finished and player.state != PlayerState.Folded:
+            opponents = len([p for p in self.players if p.state != PlayerState.Folded and p is not player])
+            with phase("equity"):
+                results = await self.cog.equity.calculate([player.hand], self.table, opponents)
+            if results is not None:
+                plural = "s" if opponents > 1 else ""
+                embed.set_footer(text=f"Equity: {results[0].share:.1%} against {opponents} random hand{plural}")
+        await interaction.followup.send(embed=embed, ephemeral=True)
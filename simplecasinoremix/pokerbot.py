@@ -0,0 +1,45 @@
+import random
+from typing import Tuple
+
+from simplecasino.pokercore import Move, PokerEngine, PokerPlayer
+from simplecasino.utils import PlayerState
+
+BOT_STACK_BETS = 100  # a bot sits down with this many starting bets
+BOT_THINK_TIME = 0.04  # seconds of equity sampling per decision
+RAISE_STRENGTH = 1.6  # how much better than an average hand to raise with
+POSITION_WEIGHT = 0.15  # acting last is worth this much extra strength
+RAISE_POT_FRACTION = 0.5
+BLUFF_CHANCE = 0.05
+
+
+def bot_balance(game: PokerEngine, player: PokerPlayer) -> int:
+    """What the bot has left of its stack, which carries over between the hands of a session."""
+    return game.minimum_bet * BOT_STACK_BETS + game.session_nets.get(player.id, 0) - player.total_betted
+
+
+def decide(game: PokerEngine, player: PokerPlayer, equity: float, balance: int, rng: random.Random) -> Tuple[Move, int]:
+    """
+    Picks a move for a bot from its equity against the players still in the hand, the pot odds and its position,
+    given what it can bet. Returns the move and, for bets, the amount to bet up to. Always a legal move for the current turn.
+    """
+    opponents = sum(1 for p in game.players if p.state != PlayerState.Folded and p is not player)
+    to_call = max(0, game.current_bet - player.current_bet)
+    pot_odds = to_call / (game.pot + to_call) if to_call else 0.0
+    # the small blind acts first after the flop and the dealer acts last, knowing the most
+    position = (player.index - 1) % len(game.players) / max(1, len(game.players) - 1)
+    # 1 is an average hand against this many opponents
+    strength = equity * (opponents + 1) * (1 + POSITION_WEIGHT * position)
+
+    if balance <= 0:
+        return (Move.Check, 0) if game.can_check else (Move.Fold, 0)
+
+    if (strength >= RAISE_STRENGTH or rng.random() < BLUFF_CHANCE) and balance > to_call:
+        raise_to = max(game.current_bet + game.minimum_bet, player.current_bet + int(game.pot * RAISE_POT_FRACTION))
+        return Move.Bet, min(raise_to, player.current_bet + balance)
+
+    if to_call == 0:
+        return (Move.Check, 0) if game.can_check else (Move.Bet, game.current_bet)
+
+    if equity >= pot_odds:
+        return Move.Bet, game.current_bet  # calls, or goes all in if that's all it has
+    return Move.Fold, 0
@@ -0,0 +1,598 @@
+import random
+from enum import IntEnum
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from dataclasses_json import DataClassJsonMixin, config
+
+from simplecasino.card import Card, Deck, encode_cards, decode_cards, make_deck
+from simplecasino.evaluator import best_five, evaluate, hand_type, straight_high
+from simplecasino.snapshot import SnapshotReader, SnapshotWriter
+from simplecasino.utils import HandType, PlayerState, PlayerType, PokerState, InsufficientFundsError, POKER_MAX_PLAYERS
+
+
+@dataclass
+class HandResult(DataClassJsonMixin):
+    type: HandType = field(metadata=config(encoder=lambda x: x.value, decoder=HandType))
+    cards: List[Card] = field(metadata=config(encoder=encode_cards, decoder=decode_cards))
+    rank: int = 0
+
+    def __post_init__(self):
+        if len(self.cards) != 5:
+            raise RuntimeError("HandResult must contain exactly 5 cards")
+        if not self.rank:  # saved before ranks existed
+            self.rank = evaluate(self.cards)
+
+    def _compare_key(self):
+        return self.rank
+
+    def pack(self, writer: SnapshotWriter) -> None:
+        writer.u8(self.type.value)
+        writer.cards(self.cards)
+        writer.u64(self.rank)
+
+    @staticmethod
+    def unpack(reader: SnapshotReader) -> "HandResult":
+        hand_type, cards, rank = HandType(reader.u8()), reader.cards(), reader.u64()
+        if len(cards) != 5:
+            raise ValueError("Snapshot has a hand result without 5 cards")
+        return HandResult(hand_type, cards, rank)
+
+    def __lt__(self, other: "HandResult") -> bool:
+        return self._compare_key() < other._compare_key()
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, HandResult):
+            return False
+        return self._compare_key() == other._compare_key()
+
+
+@dataclass
+class PokerPlayer(DataClassJsonMixin):
+    id: int
+    index: int
+    type: PlayerType = field(init=False, metadata=config(encoder=lambda x: x.value, decoder=PlayerType))
+    hand: List[Card] = field(default_factory=list, metadata=config(encoder=encode_cards, decoder=decode_cards))
+    state: PlayerState = field(default=PlayerState.Pending, metadata=config(encoder=lambda x: x.value, decoder=PlayerState))
+    total_betted: int = 0
+    current_bet: int = 0
+    hand_result: Optional[HandResult] = None
+    winnings: int = 0
+    allin_equity: Optional[float] = None
+
+    def __post_init__(self):
+        # type is min(index, Normal)
+        self.type = PlayerType(min(self.index, PlayerType.Normal.value))
+
+    def pack(self, writer: SnapshotWriter) -> None:
+        writer.u64(self.id)
+        writer.u8(self.index)
+        writer.u8(self.type.value)
+        writer.cards(self.hand)
+        writer.u8(self.state.value)
+        writer.i64(self.total_betted)
+        writer.i64(self.current_bet)
+        writer.u8(self.hand_result is not None)
+        if self.hand_result is not None:
+            self.hand_result.pack(writer)
+        writer.i64(self.winnings)
+        writer.optional_f64(self.allin_equity)
+
+    @staticmethod
+    def unpack(reader: SnapshotReader) -> "PokerPlayer":
+        player = PokerPlayer(id=reader.u64(), index=reader.u8())
+        player.type = PlayerType(reader.u8())
+        player.hand = reader.cards()
+        player.state = PlayerState(reader.u8())
+        player.total_betted = reader.i64()
+        player.current_bet = reader.i64()
+        player.hand_result = HandResult.unpack(reader) if reader.flag() else None
+        player.winnings = reader.i64()
+        player.allin_equity = reader.optional_f64()
+        return player
+
+
+BOT_IDS = range(1, POKER_MAX_PLAYERS + 1)  # seats played by the bot, no Discord id is this small
+
+
+def is_bot(user_id: int) -> bool:
+    return user_id in BOT_IDS
+
+
+class Move(IntEnum):
+    Fold = 0
+    Check = 1
+    Bet = 2
+
+
+Moves = List[Tuple[int, Move, int, int]]  # seat, move, bet and the player's balance at the time
+
+
+# Events emitted by the rules, for the caller to carry out. Money is only tracked here,
+# actually moving it between bank accounts is up to whoever applies the events.
+
+
+@dataclass(frozen=True)
+class Withdraw:
+    user_id: int
+    amount: int
+
+
+@dataclass(frozen=True)
+class Deposit:
+    user_id: int
+    amount: int
+
+
+@dataclass(frozen=True)
+class PlayerActed:
+    user_id: int
+    state: PlayerState
+    current_bet: int
+
+
+@dataclass(frozen=True)
+class StageChanged:
+    state: PokerState
+    table: Tuple[Card, ...]
+
+
+@dataclass(frozen=True)
+class AllInRunout:
+    """Nobody can bet anymore and the rest of the table will be dealt, a good moment to show each player's equity."""
+    players: Tuple[int, ...]  # indices of the players still in the hand
+    table: Tuple[Card, ...]
+
+
+@dataclass(frozen=True)
+class TurnChanged:
+    turn: Optional[int]
+
+
+@dataclass(frozen=True)
+class HandEnded:
+    winnings: Tuple[Tuple[int, int], ...]  # user id and amount won
+
+
+PokerEvent = Union[Withdraw, Deposit, PlayerActed, StageChanged, AllInRunout, TurnChanged, HandEnded]
+
+
+def is_straight(original_cards: List[Card]) -> Tuple[bool, Optional[Card]]:
+    if len(original_cards) < 5:
+        return False, None
+    mask = 0
+    for c in original_cards:
+        mask |= 1 << (c.poker_value - 2)
+    high = straight_high(mask)
+    if not high:
+        return False, None
+    return True, next(c for c in original_cards if c.poker_value == high)
+
+
+def get_hand_result(table: List[Card], hand: List[Card]) -> HandResult:
+    if len(table) != 5 or len(hand) != 2:
+        raise ValueError("Invalid number of cards for evaluation")
+    cards = table + hand
+    rank = evaluate(cards)
+    return HandResult(hand_type(rank), best_five(cards, rank), rank)
+
+
+class PokerEngine:
+    """
+    A hand of Texas Hold'em following the rules of the game, without any Discord or bank interaction.
+    Every action is synchronous and returns the events it caused, which the caller applies together.
+    Given a seeded random number generator, the same actions always play out the same way.
+    """
+
+    def __init__(self, players_ids: List[int], minimum_bet: int = 0, rng: Optional[random.Random] = None):
+        self.players_ids = players_ids[:POKER_MAX_PLAYERS]
+        self.players: List[PokerPlayer] = [PokerPlayer(id=p, index=i) for i, p in enumerate(self.players_ids)]
+        self.deck: Deck = make_deck()
+        self.deck.shuffle(rng)
+        self.table: List[Card] = []
+        self.state: PokerState = PokerState.WaitingForPlayers
+        self.minimum_bet = minimum_bet
+        self.current_bet = minimum_bet
+        self.pot = 0
+        self.turn: Optional[int] = None  # index of current player
+        self.all_hands_finished: bool = False
+        self.is_cancelled = False
+        self.events: List[PokerEvent] = []
+        # everything needed to play the hand again from the same deck
+        self.start_balances: Dict[int, int] = {}
+        self.moves: Moves = []
+        # the hands played at this table in a row, with the button moving each time
+        self.session_hand = 1
+        self.session_nets: Dict[int, int] = {}  # by user id, of every finished hand of the session
+
+    def take_events(self) -> List[PokerEvent]:
+        events, self.events = self.events, []
+        return events
+
+    @property
+    def is_finished(self) -> bool:
+        return self.all_hands_finished or self.is_cancelled
+
+    def current_player(self) -> Optional[PokerPlayer]:
+        return self.players[self.turn] if self.turn is not None and 0 <= self.turn < len(self.players) else None
+
+    @property
+    def host(self) -> Optional[int]:
+        """The first person at the table after the button, who starts or cancels the hand while it waits for players."""
+        return next((uid for uid in self.players_ids if not is_bot(uid)), None)
+
+    def find_player(self, ptype: PlayerType) -> Optional[PokerPlayer]:
+        return next((p for p in self.players if p.type == ptype), None)
+
+    def find_player_by_id(self, user_id: int) -> Optional[PokerPlayer]:
+        return next((p for p in self.players if p.id == user_id), None)
+
+    def get_previous_player(self) -> Optional[PokerPlayer]:
+        if not (self.turn is not None and 0 <= self.turn < len(self.players)):
+            return None
+        assert self.turn is not None
+        t = self.turn
+        for _ in range(len(self.players)):
+            t = t - 1 if t > 0 else len(self.players) - 1
+            if self.players[t].state != PlayerState.Folded:
+                return self.players[t]
+        return None
+
+    def get_next_player(self) -> Optional[PokerPlayer]:
+        if not (self.turn is not None and 0 <= self.turn < len(self.players)):
+            return None
+        t = self.turn
+        for _ in range(len(self.players)):
+            t = t + 1 if t < len(self.players) - 1 else 0
+            if self.players[t].state != PlayerState.Folded:
+                return self.players[t]
+        return None
+
+    @property
+    def can_check(self) -> bool:
+        current = self.current_player()
+        previous = self.get_previous_player()
+        if previous is None or current is None:
+            return False
+        if previous.state in (PlayerState.Pending, PlayerState.Checked):
+            return True
+        if self.state == PokerState.PreFlop and current and current.type == PlayerType.BigBlind:
+            return all(p.current_bet <= current.current_bet for p in self.players)
+        return False
+
+    def try_add_player(self, user_id: int) -> Tuple[bool, str]:
+        if self.state != PokerState.WaitingForPlayers:
+            return False, "The game already started."
+        if len(self.players) >= POKER_MAX_PLAYERS:
+            return False, "This game is full."
+        if any(p.id == user_id for p in self.players):
+            return False, "You're already playing."
+        self.players.append(PokerPlayer(id=user_id, index=len(self.players)))
+        self.players_ids = [p.id for p in self.players]
+        return True, ""
+    
+    def try_add_bot(self) -> Tuple[bool, str]:
+        bot_id = next((i for i in BOT_IDS if i not in self.players_ids), BOT_IDS[0])
+        success, message = self.try_add_player(bot_id)
+        return success, message.replace("You're", "The bot is")
+
+    def try_remove_player(self, user_id: int) -> Tuple[bool, str]:
+        if len(self.players) == 1 or all(is_bot(p.id) for p in self.players if p.id != user_id):
+            return False, "You can't leave. Try cancelling the game instead."
+        if self.state != PokerState.WaitingForPlayers:
+            return False, "The game already started."
+        pl = self.find_player_by_id(user_id)
+        if pl is None:
+            return False, "You're not even playing, why are you trying to leave?"
+        self.players.remove(pl)
+        self.players.sort(key=lambda p: is_bot(p.id))  # a bot can't be the dealer who starts the game
+        # re-index players
+        for i, p in enumerate(self.players):
+            p.index = i
+            p.type = PlayerType(min(i, PlayerType.Normal.value))
+        self.players_ids = [p.id for p in self.players]
+        return True, ""
+
+    def apply_next_hand(self, leaving: Iterable[int] = (), rng: Optional[random.Random] = None) -> List[PokerEvent]:
+        """
+        Sets up the next hand of the session after the last one finished, keeping the players in their seats
+        and moving the button to the next of them, bots included, with the blinds after it. Players who leave the table are left out.
+        """
+        if not self.all_hands_finished or self.is_cancelled:
+            raise ValueError("The hand isn't over")
+        for player in self.players:
+            self.session_nets[player.id] = self.session_nets.get(player.id, 0) + player.winnings - player.total_betted
+        leaving = set(leaving)
+        self.players_ids = [uid for uid in self.players_ids[1:] + self.players_ids[:1] if uid not in leaving]
+        self.players = [PokerPlayer(id=p, index=i) for i, p in enumerate(self.players_ids)]
+        self.deck = make_deck()
+        self.deck.shuffle(rng)
+        self.table = []
+        self.state = PokerState.WaitingForPlayers
+        self.current_bet = self.minimum_bet
+        self.pot = 0
+        self.turn = None
+        self.all_hands_finished = False
+        self.events = []
+        self.start_balances = {}
+        self.moves = []
+        self.session_hand += 1
+        return self.take_events()
+
+    def apply_cancel(self) -> List[PokerEvent]:
+        """Cancels the game, giving everyone back what they betted."""
+        if self.is_cancelled:
+            return []
+        self.is_cancelled = True
+        for player in self.players:
+            if player.total_betted > 0:
+                self.events.append(Deposit(player.id, player.total_betted))
+        return self.take_events()
+
+    def apply_start_hand(self, balances: Dict[int, int]) -> List[PokerEvent]:
+        """Deals the cards and posts the blinds, given the current balance of each player."""
+        if self.state != PokerState.WaitingForPlayers:
+            raise ValueError("Game already started")
+        if len(self.players) < 2:
+            raise ValueError("Not enough players")
+        elif len(self.players) == 2:
+            self.players[0].type = PlayerType.SmallBlind
+            self.players[1].type = PlayerType.BigBlind
+
+        sb = self.find_player(PlayerType.SmallBlind)
+        bb = self.find_player(PlayerType.BigBlind)
+        assert sb is not None and bb is not None
+        if any(blind > 0 and balances[p.id] <= 0 for p, blind in ((sb, self.minimum_bet // 2), (bb, self.minimum_bet))):
+            raise InsufficientFundsError
+
+        self.start_balances = {p.id: balances[p.id] for p in self.players}
+        for _ in range(2):
+            for p in self.players:
+                p.hand.append(self.deck.pop())
+
+        self.pot += self.place_bet(sb, self.minimum_bet // 2, balances[sb.id])
+        sb.state = PlayerState.Betted
+        self.pot += self.place_bet(bb, self.minimum_bet, balances[bb.id])
+        bb.state = PlayerState.Betted
+
+        self.state = PokerState.PreFlop
+        self.events.append(StageChanged(self.state, ()))
+        self.turn = self.get_next(bb.index)
+        self.events.append(TurnChanged(self.turn))
+        return self.take_events()
+
+    def get_next(self, start_index: int) -> int:
+        i = start_index
+        for _ in range(len(self.players)):
+            i = i + 1 if i < len(self.players) - 1 else 0
+            if self.players[i].state != PlayerState.Folded:
+                return i
+        return start_index
+
+    def place_bet(self, player: PokerPlayer, bet_amount: int, balance: int) -> int:
+        """Raises a player's bet to the given amount, or as far as their balance goes, and returns how much was added."""
+        if bet_amount < player.current_bet:
+            raise ValueError("New bet must be higher than previous")
+
+        additional = bet_amount - player.current_bet
+        if additional == 0:
+            return 0
+
+        if balance <= 0:
+            raise InsufficientFundsError
+
+        # all in
+        if balance < additional:
+            self.events.append(Withdraw(player.id, balance))
+            player.total_betted += balance
+            player.current_bet += balance
+            player.state = PlayerState.AllIn
+            return balance
+
+        # normal bet
+        self.events.append(Withdraw(player.id, additional))
+        player.total_betted += additional
+        player.current_bet = bet_amount
+        return additional
+
+    def apply_fold(self, user_id: int) -> List[PokerEvent]:
+        current = self.current_player()
+        if current is None or current.id != user_id:
+            raise ValueError("Not your turn")
+        
+        self.moves.append((current.index, Move.Fold, 0, 0))
+        current.state = PlayerState.Folded
+        current.current_bet = 0
+        self.events.append(PlayerActed(user_id, current.state, current.current_bet))
+
+        # check elimination
+        not_folded = [p for p in self.players if p.state != PlayerState.Folded]
+        if len(not_folded) == 1:
+            self.end_hand(force_winner=not_folded[0])
+            return self.take_events()
+        
+        # special case: nobody bet the first round
+        if len(not_folded) == 2 and self.state == PokerState.PreFlop \
+                and all(p.type in (PlayerType.SmallBlind, PlayerType.BigBlind) for p in not_folded):
+            sb = self.find_player(PlayerType.SmallBlind)
+            assert sb is not None
+            sb.state = PlayerState.Pending
+
+        self.advance_turn()
+        return self.take_events()
+
+    def apply_check(self, user_id: int) -> List[PokerEvent]:
+        current = self.current_player()
+        if current is None or current.id != user_id:
+            raise ValueError("Not your turn")
+        if not self.can_check:
+            raise ValueError("Cannot check")
+        
+        self.moves.append((current.index, Move.Check, 0, 0))
+        current.state = PlayerState.Checked
+        self.events.append(PlayerActed(user_id, current.state, current.current_bet))
+        self.advance_turn()
+        return self.take_events()
+
+    def apply_bet(self, user_id: int, bet: int, balance: int) -> List[PokerEvent]:
+        """Calls or raises to the given bet, given the player's current balance."""
+        current = self.current_player()
+        if current is None or current.id != user_id:
+            raise ValueError("Not your turn")
+        if bet < self.current_bet:
+            raise ValueError("Bet must be higher than the previous")
+
+        additional = self.place_bet(current, bet, balance)
+        self.moves.append((current.index, Move.Bet, bet, balance))
+        if additional == 0:
+            self.advance_turn()
+            return self.take_events()
+
+        self.pot += additional
+        if current.state != PlayerState.AllIn:
+            current.state = PlayerState.Betted
+        self.current_bet = max(self.current_bet, current.current_bet)
+        self.events.append(PlayerActed(user_id, current.state, current.current_bet))
+
+        for p in self.players:
+            if p.state not in (PlayerState.Folded, PlayerState.AllIn) and p.current_bet < self.current_bet:
+                p.state = PlayerState.Pending
+
+        # live blind
+        if self.state == PokerState.PreFlop and self.current_bet == self.minimum_bet and current.type != PlayerType.BigBlind:
+            bb = self.find_player(PlayerType.BigBlind)
+            if bb is not None and bb.state != PlayerState.Folded:
+                bb.state = PlayerState.Pending
+
+        self.advance_turn()
+        return self.take_events()
+
+    def advance_turn(self) -> None:
+        # keep advancing rounds while there are no non-all-in pending players
+        runout_checked = False
+        while True:
+            active_non_folded = [p for p in self.players if p.state != PlayerState.Folded]
+            non_allin_active = [p for p in active_non_folded if p.state != PlayerState.AllIn]
+            pending_non_allin = [p for p in non_allin_active if p.state == PlayerState.Pending]
+            if active_non_folded and not pending_non_allin:
+                # nobody can bet anymore, the rest of the table will be dealt
+                if not runout_checked and len(non_allin_active) <= 1 and len(active_non_folded) > 1 and len(self.table) < 5:
+                    runout_checked = True
+                    self.events.append(AllInRunout(tuple(p.index for p in active_non_folded), tuple(self.table)))
+                self.state = PokerState(min(self.state.value + 1, PokerState.Showdown.value))
+                self.current_bet = 0
+                if len(non_allin_active) > 1:
+                    for p in self.players:
+                        if p.state not in (PlayerState.Folded, PlayerState.AllIn):
+                            p.state = PlayerState.Pending
+                            p.current_bet = 0
+                # deal cards
+                if self.state == PokerState.Flop:
+                    self.deck.pop()
+                    for _ in range(3):
+                        self.table.append(self.deck.pop())
+                elif self.state in (PokerState.Turn, PokerState.River):
+                    self.deck.pop()
+                    self.table.append(self.deck.pop())
+                elif self.state == PokerState.Showdown:
+                    self.end_hand()
+                    return
+                self.events.append(StageChanged(self.state, tuple(self.table)))
+                continue  # keep going
+            break
+
+        found = False
+        if self.turn is None:
+            for i, p in enumerate(self.players):
+                if p.state == PlayerState.Pending:
+                    self.turn = i
+                    found = True
+                    break
+        else:
+            start = self.turn
+            n = len(self.players)
+            for i in range(1, n + 1):
+                idx = (start + i) % n
+                if self.players[idx].state == PlayerState.Pending:
+                    self.turn = idx
+                    found = True
+                    break
+
+        if not found:
+            self.turn = None
+        self.events.append(TurnChanged(self.turn))
+
+    def end_hand(self, force_winner: Optional[PokerPlayer] = None) -> None:
+        if force_winner:
+            force_winner.winnings += self.pot
+            self.state = PokerState.Showdown  # ui
+            if self.pot > 0:
+                self.events.append(Deposit(force_winner.id, self.pot))
+        else:
+            self.events.append(StageChanged(self.state, tuple(self.table)))
+            # evaluate hands
+            for player in self.players:
+                if player.state != PlayerState.Folded:
+                    player.hand_result = get_hand_result(self.table, player.hand)
+
+            pots = self.build_side_pots()
+
+            # For each pot, find the best hand among eligible players
+            for pot_amount, eligible_players in pots:
+                if not eligible_players or pot_amount == 0:
+                    continue  # shouldn't happen
+
+                contenders = [p for p in eligible_players if p.state != PlayerState.Folded]
+                if not contenders:
+                    continue  # shouldn't happen
+
+                # find best HandResult among contenders
+                best = max((p.hand_result for p in contenders), default=None)  # type: ignore
+                if best is None:
+                    continue  # shouldn't happen
+
+                winners = [p for p in contenders if p.hand_result == best]
+
+                # split pot among winners with deterministic remainder
+                per = pot_amount // len(winners)
+                remainder = pot_amount % len(winners)
+                winners_sorted = sorted(winners, key=lambda p: p.index)
+                for i, winner in enumerate(winners_sorted):
+                    amount = per + (1 if i < remainder else 0)
+                    winner.winnings += amount
+                    self.events.append(Deposit(winner.id, amount))
+        # cleanup
+        self.all_hands_finished = True
+        self.turn = None
+        self.events.append(HandEnded(tuple((p.id, p.winnings) for p in self.players if p.winnings > 0)))
+
+    def build_side_pots(self) -> List[Tuple[int, List[PokerPlayer]]]:
+        # consider all players who put chips into the pot (could include folded players)
+        contributors = [p for p in self.players if p.total_betted > 0]
+        if not contributors:
+            return []
+
+        remaining = sorted(contributors, key=lambda p: p.total_betted)
+        pots: List[Tuple[int, List[PokerPlayer]]] = []
+        last = 0
+        dead = 0  # slices nobody is eligible for, bets of folded players above everyone still in
+
+        while remaining:
+            smallest = remaining[0].total_betted
+            contribution = smallest - last  # how much each remaining player contributes to this slice
+            pot_amount = contribution * len(remaining)
+
+            # eligible players for this pot are remaining players who did NOT fold
+            eligible = [p for p in remaining if p.state != PlayerState.Folded]
+            if eligible:
+                pots.append((pot_amount + dead, eligible))
+                dead = 0
+            elif pots:  # goes to the last pot that someone can still win
+                pots[-1] = (pots[-1][0] + pot_amount, pots[-1][1])
+            else:
+                dead += pot_amount
+
+            # move forward: remove players who only contributed up to smallest
+            last = smallest
+            remaining = [p for p in remaining if p.total_betted > smallest]
+
+        return pots
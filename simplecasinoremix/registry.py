@@ -0,0 +1,79 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Optional
+
+if TYPE_CHECKING:
+    from simplecasino.base import BasePokerGame
+
+log = logging.getLogger("red.crab-cogs.simplecasino.registry")
+
+SWEEP_INTERVAL = 60  # seconds
+FINISHED_TTL = 10 * 60  # seconds a finished game is kept, so that its buttons keep working for a while
+IDLE_TTL = 24 * 60 * 60  # seconds before an abandoned game is cancelled and its bets refunded
+
+
+class GameRegistry(Dict[int, "BasePokerGame"]):
+    """
+    The poker game of each channel. A sweeper drops finished games once nobody can use them anymore
+    and cancels games abandoned halfway, so that a bot that runs for months doesn't keep every game it ever hosted.
+    Only the event loop touches it, so it needs no locks.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.task: Optional[asyncio.Task] = None
+        self.evicted = 0  # finished games dropped this session
+        self.abandoned = 0  # unfinished games cancelled this session
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self.run())
+
+    def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            await self.sweep()
+
+    async def sweep(self) -> None:
+        now = datetime.now()
+        for channel_id, game in list(self.items()):
+            idle = (now - game.last_interacted).total_seconds()
+            try:
+                if game.is_finished and idle >= FINISHED_TTL:
+                    await self.evict(channel_id, game)
+                    self.evicted += 1
+                elif not game.is_finished and idle >= IDLE_TTL:
+                    await game.cancel()  # refunds the bets and deletes the message
+                    await self.evict(channel_id, game)
+                    self.abandoned += 1
+            except Exception:
+                log.error(f"Failed to clean up poker game in {channel_id}", exc_info=True)
+
+    async def evict(self, channel_id: int, game: "BasePokerGame") -> None:
+        if self.get(channel_id) is not game:
+            return  # replaced in the meantime
+        if game.view:
+            game.view.stop()
+        if game.save_task is not None:
+            await game.flush_state()
+        del self[channel_id]
+
+    def metrics(self) -> Dict[str, int]:
+        now = datetime.now()
+        active = [game for game in self.values() if not game.is_finished]
+        return {
+            "games": len(self),
+            "active": len(active),
+            "finished": len(self) - len(active),
+            "idle": sum((now - game.last_interacted).total_seconds() >= SWEEP_INTERVAL for game in active),
+            "players": sum(len(game.players) for game in active),
+            "views": sum(game.view is not None and not game.view.is_finished() for game in self.values()),
+            "guilds": len({game.channel.guild.id for game in self.values()}),
+            "evicted": self.evicted,
+            "abandoned": self.abandoned,
+        }
@@ -0,0 +1,90 @@
+import time
+import random
+import logging
+import secrets
+import argparse
+import numpy as np
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+log = logging.getLogger("red.crab-cogs.simplecasino.rng")
+
+SEED_BITS = 64
+RECENT_SEEDS = 200  # kept in memory for owners to look up
+
+SeedRecord = Tuple[float, str, int]  # when, what for, and the seed
+
+
+class GameRng(random.Random):
+    """A stream of random numbers for one game, which remembers the seed it started from."""
+
+    def __init__(self, seed: int, purpose: str):
+        super().__init__(seed)
+        self.initial_seed = seed
+        self.purpose = purpose
+
+
+class RngService:
+    """
+    Hands out the random number streams of the games. Each game draws from its own Mersenne Twister,
+    seeded from the system's cryptographically secure generator so that no player can predict it,
+    and the seed is recorded, so that the game can be dealt again exactly the same way from it.
+    Given a master seed of its own, every stream it hands out is reproducible, for tests and simulations.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self.master = random.Random(seed) if seed is not None else None
+        self.shared: Dict[str, GameRng] = {}
+        self.recent: Deque[SeedRecord] = deque(maxlen=RECENT_SEEDS)
+
+    def seed(self, purpose: str) -> int:
+        """A new seed, recorded."""
+        seed = self.master.getrandbits(SEED_BITS) if self.master else secrets.randbits(SEED_BITS)
+        self.recent.append((time.time(), purpose, seed))
+        log.debug(f"Seeded {purpose} with {seed:#x}")
+        return seed
+
+    def stream(self, purpose: str) -> GameRng:
+        """A new stream for a single game."""
+        return GameRng(self.seed(purpose), purpose)
+
+    def shared_stream(self, purpose: str) -> GameRng:
+        """A stream for quick games that don't last long enough to have their own, like slot spins."""
+        rng = self.shared.get(purpose)
+        if rng is None:
+            rng = self.shared[purpose] = self.stream(purpose)
+        return rng
+
+
+def benchmark(draws: int) -> List[Tuple[str, float]]:
+    """Draws per second of each source, for the kinds of draws the games make."""
+    rng = RngService().stream("benchmark")
+    generator = np.random.default_rng(secrets.randbits(SEED_BITS))
+    deck = list(range(52))
+    shuffles = max(1, draws // 52)
+
+    def timed(func: Callable[[], object], count: int) -> float:
+        start = time.perf_counter()
+        func()
+        return count / (time.perf_counter() - start)
+
+    return [
+        ("random.randrange", timed(lambda: [random.randrange(22) for _ in range(draws)], draws)),
+        ("GameRng.randrange", timed(lambda: [rng.randrange(22) for _ in range(draws)], draws)),
+        ("random.shuffle (cards)", timed(lambda: [random.shuffle(deck) for _ in range(shuffles)], shuffles * 52)),
+        ("GameRng.shuffle (cards)", timed(lambda: [rng.shuffle(deck) for _ in range(shuffles)], shuffles * 52)),
+        ("Generator.integers (bulk)", timed(lambda: generator.integers(0, 22, size=draws, dtype=np.int32), draws)),
+        ("Generator.permuted (cards)", timed(lambda: generator.permuted(np.tile(np.arange(52, dtype=np.int8), (shuffles, 1)), axis=1), shuffles * 52)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the draw throughput of the game streams against the random module.")
+    parser.add_argument("draws", type=int, nargs="?", default=1_000_000)
+    args = parser.parse_args()
+    for name, rate in benchmark(args.draws):
+        print(f"{name:<28}{rate:>16,.0f} draws per second")
+
+
+if __name__ == "__main__":
+    main()
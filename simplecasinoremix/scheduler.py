@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+log = logging.getLogger("red.crab-cogs.simplecasino.scheduler")
+
+EDITS_PER_WINDOW = 5  # discord allows about 5 message edits per 5 seconds in a channel
+EDIT_WINDOW = 5.0  # seconds
+MAX_EDITS_IN_FLIGHT = 10  # across every bucket, to stay clear of discord's global rate limit
+
+Edit = Callable[[], Awaitable[Any]]
+
+
+class EditQueue:
+    """Pending edits for one rate limit bucket, applied in order by a single worker."""
+
+    def __init__(self, scheduler: "EditScheduler", bucket: Hashable):
+        self.scheduler = scheduler
+        self.bucket = bucket
+        self.pending: "OrderedDict[Hashable, Tuple[Edit, asyncio.Future]]" = OrderedDict()
+        self.sent = scheduler.sent_times(bucket)  # outlives the queue, so the limit holds between bursts
+        self.worker: Optional[asyncio.Task] = None
+
+    def submit(self, message_key: Hashable, edit: Edit) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        if message_key in self.pending:  # newer frame replaces the older one, keeping its place in line
+            _, old_future = self.pending[message_key]
+            if not old_future.done():
+                old_future.set_result(False)
+            self.scheduler.dropped += 1
+        self.pending[message_key] = (edit, future)
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self.run())
+        return future
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while self.pending:
+                now = loop.time()
+                while self.sent and now - self.sent[0] >= self.scheduler.window:
+                    self.sent.popleft()
+                if len(self.sent) >= self.scheduler.rate:
+                    await asyncio.sleep(self.scheduler.window - (now - self.sent[0]))
+                    continue
+                async with self.scheduler.in_flight:
+                    if not self.pending:
+                        break
+                    _, (edit, future) = self.pending.popitem(last=False)  # only now, so a newer frame can still replace it
+                    self.sent.append(loop.time())
+                    try:
+                        await edit()
+                    except Exception:
+                        log.error(f"Failed to apply a scheduled edit in {self.bucket}", exc_info=True)
+                        if not future.done():
+                            future.set_result(False)
+                    else:
+                        if not future.done():
+                            future.set_result(True)
+        finally:
+            if self.scheduler.queues.get(self.bucket) is self and not self.pending:
+                del self.scheduler.queues[self.bucket]
+
+    def cancel(self) -> None:
+        if self.worker is not None:
+            self.worker.cancel()
+        for _, future in self.pending.values():
+            if not future.done():
+                future.set_result(False)
+        self.pending.clear()
+
+
+class EditScheduler:
+    """
+    Spaces out message edits so each rate limit bucket stays under its limit, and caps how many are sent at once.
+    If a newer frame for a message is queued while an older one is still waiting, the older one is dropped.
+    """
+
+    def __init__(self, rate: int = EDITS_PER_WINDOW, window: float = EDIT_WINDOW, in_flight: int = MAX_EDITS_IN_FLIGHT):
+        self.rate = rate
+        self.window = window
+        self.in_flight = asyncio.Semaphore(in_flight)
+        self.queues: Dict[Hashable, EditQueue] = {}
+        self.sent: Dict[Hashable, Deque[float]] = {}  # times of the most recent edits of each bucket, until they expire
+        self.dropped = 0  # frames replaced by a newer one before being sent
+
+    def sent_times(self, bucket: Hashable) -> Deque[float]:
+        if bucket not in self.sent:
+            self.forget_expired()
+            self.sent[bucket] = deque()
+        return self.sent[bucket]
+
+    def forget_expired(self) -> None:
+        """Drops the edit times of idle buckets once none of them count against the limit anymore."""
+        now = asyncio.get_running_loop().time()
+        for bucket, sent in list(self.sent.items()):
+            if bucket not in self.queues and (not sent or now - sent[-1] >= self.window):
+                del self.sent[bucket]
+
+    def submit(self, bucket: Hashable, message_key: Hashable, edit: Edit) -> asyncio.Future:
+        """
+        Queues an edit and returns a future that resolves to True once it's applied,
+        or False if it failed or was replaced by a newer edit for the same message.
+        """
+        if bucket not in self.queues:
+            self.queues[bucket] = EditQueue(self, bucket)
+        return self.queues[bucket].submit(message_key, edit)
+
+    async def edit(self, bucket: Hashable, message_key: Hashable, edit: Edit) -> bool:
+        return await self.submit(bucket, message_key, edit)
+
+    def depth(self, bucket: Hashable) -> int:
+        queue = self.queues.get(bucket)
+        return len(queue.pending) if queue else 0
+
+    def total_depth(self) -> int:
+        return sum(len(queue.pending) for queue in self.queues.values())
+
+    def close(self) -> None:
+        for queue in list(self.queues.values()):
+            queue.cancel()
+        self.queues.clear()
+        self.sent.clear()
@@ -0,0 +1,231 @@
+import json
+import uuid
+import asyncio
+import logging
+import aiofiles
+import discord
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from redbot.core import bank, errors
+from redbot.core.bot import Red
+
+log = logging.getLogger("red.crab-cogs.simplecasino.settlement")
+
+JOURNAL_COMPACT_LINES = 1000  # the journal is emptied once it has this many lines and nothing is being settled
+
+Transfers = List[Tuple[int, int]]  # user id and amount, withdrawals first
+
+
+async def transfer(member: discord.Member, amount: int) -> None:
+    """Moves currency into or out of a member's account, filling it up to the maximum balance at most."""
+    if amount < 0:
+        await bank.withdraw_credits(member, -amount)
+        return
+    try:
+        await bank.deposit_credits(member, amount)
+    except errors.BalanceTooHigh as err:
+        await bank.set_balance(member, err.max_balance)
+
+
+class SettlementJournal:
+    """
+    Moves the money of poker hands with one balance write per member, however many pots and side pots they won.
+    A settlement is written to a journal before any money moves, and each of its transfers is marked done as it completes.
+    Withdrawals go first: if one is refused, the ones already made are given back, so either all of them happen or none.
+    Once they all went through, any deposits the bot didn't get to make before stopping are made once it's ready again.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.recovering_path = path.with_suffix(".recovering")
+        self.journal = None
+        self.lock = asyncio.Lock()  # guards the journal
+        self.open: Set[str] = set()  # settlements begun and not yet done
+        self.lines = 0
+        self.settled = 0  # this session
+        self.recovered = 0
+        self.recovery: Optional[asyncio.Task] = None
+
+    async def start(self, bot: Red) -> None:
+        """
+        Sets aside the settlements left halfway by previous sessions, to be finished or undone once the bot
+        is connected and knows its servers. New settlements go to a fresh journal in the meantime.
+        """
+        if self.path.exists():
+            async with aiofiles.open(self.path, "r", encoding="utf-8") as fp:
+                lines = await fp.read()
+            async with aiofiles.open(self.recovering_path, "a", encoding="utf-8") as fp:
+                await fp.write(lines if lines.endswith("\n") or not lines else lines + "\n")
+            self.path.unlink()
+        if self.recovering_path.exists():
+            self.recovery = asyncio.create_task(self.recover(bot))
+
+    async def recover(self, bot: Red) -> None:
+        """Finishes the settlements set aside, or undoes them if their withdrawals didn't all go through. Keeps the ones it couldn't."""
+        await bot.wait_until_red_ready()
+        begun: Dict[str, Tuple[int, Transfers]] = {}
+        done: Dict[str, Set[int]] = {}
+        undone: Dict[str, Set[int]] = {}
+        async with aiofiles.open(self.recovering_path, "r", encoding="utf-8") as fp:
+            async for line in fp:
+                try:
+                    entry = json.loads(line)
+                except ValueError:  # the last line may have been cut off mid-write
+                    log.warning(f"Skipping a malformed line in {self.recovering_path.name}")
+                    continue
+                key = entry[1]
+                if entry[0] == "begin":
+                    begun[key] = (entry[2], [(user_id, amount) for user_id, amount, *_ in entry[3]])
+                    done[key], undone[key] = set(), set()
+                elif entry[0] == "done" and len(entry) > 2:
+                    done.setdefault(key, set()).update(entry[2])
+                elif entry[0] == "undone":
+                    undone.setdefault(key, set()).update(entry[2])
+                else:  # ended
+                    begun.pop(key, None)
+        finished = 0
+        async with aiofiles.open(self.recovering_path, "a", encoding="utf-8") as marks:
+            for key, (guild_id, transfers) in begun.items():
+                guild = bot.get_guild(guild_id)
+                if guild is None:
+                    log.error(f"Can't finish poker settlement {key}, server {guild_id} is gone, keeping it")
+                    continue
+                if all(user_id in done[key] for user_id, amount in transfers if amount < 0):
+                    pending = [(user_id, amount) for user_id, amount in transfers if amount > 0 and user_id not in done[key]]
+                    marker, marked = "done", done[key]
+                else:  # never went through, give back what was taken
+                    pending = [(user_id, -amount) for user_id, amount in transfers if amount < 0 and user_id in done[key] - undone[key]]
+                    marker, marked = "undone", undone[key]
+                complete = True
+                for user_id, amount in pending:
+                    member = guild.get_member(user_id)
+                    if member is None:
+                        log.error(f"Can't finish poker settlement {key} for {user_id}, they aren't in the server, keeping it")
+                        complete = False
+                        continue
+                    try:
+                        await transfer(member, amount)
+                    except Exception:
+                        log.error(f"Finishing poker settlement {key} for {user_id}, keeping it", exc_info=True)
+                        complete = False
+                        continue
+                    await marks.write(json.dumps([marker, key, [user_id]]) + "\n")  # in case this is interrupted too
+                    await marks.flush()
+                    marked.add(user_id)
+                    self.recovered += 1
+                if complete:
+                    await marks.write(json.dumps(["end", key]) + "\n")
+                    await marks.flush()
+                    finished += 1
+        if finished:
+            log.info(f"Finished {finished} poker settlements interrupted in a previous session")
+        kept = [(key, begun[key]) for key in begun if not self.is_ended(key, begun[key][1], done[key], undone[key])]
+        if not kept:
+            self.recovering_path.unlink()
+            return
+        temp_path = self.recovering_path.with_suffix(".tmp")
+        async with aiofiles.open(temp_path, "w", encoding="utf-8") as fp:
+            for key, (guild_id, transfers) in kept:
+                await fp.write(json.dumps(["begin", key, guild_id, transfers]) + "\n")
+                for marker, ids in (("done", done[key]), ("undone", undone[key])):
+                    if ids:
+                        await fp.write(json.dumps([marker, key, sorted(ids)]) + "\n")
+        temp_path.replace(self.recovering_path)
+        log.warning(f"Kept {len(kept)} poker settlements that couldn't be finished, they'll be tried again the next time the cog loads")
+
+    @staticmethod
+    def is_ended(key: str, transfers: Transfers, done: Set[int], undone: Set[int]) -> bool:
+        if all(user_id in done for user_id, amount in transfers if amount < 0):
+            return all(user_id in done for user_id, amount in transfers if amount > 0)
+        return done <= undone
+
+    async def write(self, entry: list) -> None:
+        async with self.lock:
+            if self.journal is None:
+                self.journal = await aiofiles.open(self.path, "a", encoding="utf-8")
+            await self.journal.write(json.dumps(entry) + "\n")
+            await self.journal.flush()
+            self.lines += 1
+
+    async def run(self, key: str, marker: str, members: Dict[int, discord.Member], transfers: Transfers) -> Tuple[List[int], List[BaseException]]:
+        """
+        Makes the transfers together, marking each in the journal as soon as it went through.
+        Returns who they went through for and what went wrong for the rest.
+        """
+        succeeded: List[int] = []
+
+        async def run_one(user_id: int, amount: int) -> None:
+            await transfer(members[user_id], amount)
+            succeeded.append(user_id)
+            await self.write([marker, key, [user_id]])
+
+        results = await asyncio.gather(*(run_one(user_id, amount) for user_id, amount in transfers), return_exceptions=True)
+        return succeeded, [result for result in results if isinstance(result, BaseException)]
+
+    async def settle(self, guild: discord.Guild, transfers: Dict[int, int]) -> None:
+        """
+        Applies the net amount of each member. If a withdrawal is refused, the others are given back
+        and its error is raised, having moved nothing. Winners who left the server stay in the journal,
+        to be paid the next time the cog loads if they're back.
+        """
+        members = {user_id: guild.get_member(user_id) for user_id, amount in transfers.items() if amount}
+        withdrawals = [(user_id, amount) for user_id, amount in transfers.items() if amount < 0]
+        deposits = [(user_id, amount) for user_id, amount in transfers.items() if amount > 0]
+        gone = [user_id for user_id, _ in withdrawals if members[user_id] is None]
+        if gone:
+            raise ValueError(f"Poker player {gone[0]} isn't in the server anymore")
+        if not deposits and len(withdrawals) <= 1:  # a single withdrawal either happens or doesn't
+            await asyncio.gather(*(transfer(members[user_id], amount) for user_id, amount in withdrawals))
+            return
+        key = uuid.uuid4().hex
+        self.open.add(key)
+        await self.write(["begin", key, guild.id, withdrawals + deposits])
+
+        withdrawn, failed = await self.run(key, "done", members, withdrawals)
+        if failed:
+            refund = [(user_id, -amount) for user_id, amount in withdrawals if user_id in withdrawn]
+            _, refund_failed = await self.run(key, "undone", members, refund)
+            if refund_failed:  # left open, to be given back on the next load
+                log.error(f"Giving back the withdrawals of poker settlement {key}", exc_info=refund_failed[0])
+            else:
+                await self.end(key)
+            raise failed[0]
+
+        absent = [user_id for user_id, _ in deposits if members[user_id] is None]
+        for user_id in absent:
+            log.error(f"Poker player {user_id} left the server before being paid, settlement {key} is kept for when they're back")
+        _, failed = await self.run(key, "done", members, [(user_id, amount) for user_id, amount in deposits if user_id not in absent])
+        if failed:  # left open, to be paid on the next load
+            log.error(f"Paying out poker settlement {key}", exc_info=failed[0])
+        if failed or absent:
+            return
+        await self.end(key)
+        self.settled += 1
+        await self.compact()
+
+    async def end(self, key: str) -> None:
+        await self.write(["end", key])
+        self.open.discard(key)
+
+    async def compact(self) -> None:
+        async with self.lock:
+            if self.open or self.lines < JOURNAL_COMPACT_LINES or self.journal is None:
+                return
+            await self.journal.close()
+            self.journal = None
+            self.path.unlink(missing_ok=True)
+            self.lines = 0
+
+    async def close_journal(self) -> None:
+        async with self.lock:
+            if self.journal is not None:
+                await self.journal.close()
+                self.journal = None
+
+    async def close(self) -> None:
+        if self.recovery is not None:  # whatever it didn't get to stays set aside for the next load
+            self.recovery.cancel()
+            self.recovery = None
+        await self.close_journal()
+        if not self.open:
+            self.path.unlink(missing_ok=True)
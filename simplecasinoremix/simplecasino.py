@@ -1,21 +1,34 @@
+import time
 import logging
 import asyncio
 import discord
 import calendar
 import aiofiles
-from typing import List, Optional, Union
+from typing import List, Literal, Optional, Union
 from datetime import datetime
 from redbot.core import commands, app_commands, bank
 from redbot.core.bot import Red
-from redbot.core.data_manager import bundled_data_path
+from redbot.core.data_manager import bundled_data_path, cog_data_path
 from redbot.cogs.economy.economy import Economy
-from redbot.core.utils.chat_formatting import humanize_number
+from redbot.core.utils.chat_formatting import box, humanize_number, pagify
 from redbot.core.utils.chat_formatting import humanize_timedelta
+from redbot.core.utils.menus import DEFAULT_CONTROLS, menu
 
 from simplecasino.base import BaseCasinoCog
-from simplecasino.slots import slots
+from simplecasino.card import CARD_VALUE_STR, Card, CardSuit
+from simplecasino.evaluator import load_tables
+from simplecasino.history import DELETED_USER_IDS, HandSummary
+from simplecasino.leaderboard import LEADERBOARD_STATS
+from simplecasino.metrics import latency
+from simplecasino.slots import exact_rtp, slots
+from simplecasino.strategy import house_edge, load_strategy, strategy_chart
+from simplecasino.slotsim import simulate_all, validate_payouts
 from simplecasino.poker import PokerGame
+from simplecasino.settlement import transfer
 from simplecasino.blackjack import Blackjack
+from simplecasino.blackjacksim import STRATEGIES, simulate_blackjack
+from simplecasino.tournament import (BLIND_LEVEL_TIME, TOURNAMENT_MAX_PLAYERS, TOURNAMENT_STACK,
+                                     Tournament, TournamentScheduler, TournamentState, TournamentTable)
 from simplecasino.utils import DISCORD_RED, POKER_MINIMUM_BET, POKER_RULES
 from simplecasino.views.again_view import AgainView
 from simplecasino.views.replace_view import ReplaceView
@@ -26,40 +39,76 @@ old_slot: Optional[commands.Command] = None
 old_payouts: Optional[commands.Command] = None
 old_blackjack: Optional[commands.Command] = None
 
-MAX_CONCURRENT_SLOTS = 3
+LEADERBOARD_PAGE_SIZE = 10
+HISTORY_PAGE_SIZE = 10
+HISTORY_REPLAY_PAGE_SIZE = 30
+TOURNAMENT_STANDINGS_SIZE = 15
 MAX_APP_EMOJIS = 2000
+MAX_PENETRATION = 90  # percent, deeper risks running out of cards mid-round
+MAX_SHOE_DECKS = 8
+MIN_PENETRATION = 50
+MIN_SHOE_DECKS = 1
+MAX_SIMULATED_HANDS = 10_000_000
+MAX_SIMULATED_SPINS = 1_000_000_000
 POKER_AFK_LIMIT = 10  # minutes
+RESTORE_CONCURRENCY = 16  # saved games loaded at the same time on startup
 STARTING = "Starting game..."
 
+RequestType = Literal["discord_deleted_user", "owner", "user", "user_strict"]
+
 
 class SimpleCasino(BaseCasinoCog):
     """Gamble virtual currency with Poker, Blackjack, and Slot Machines."""
 
     def __init__(self, bot: Red):
         super().__init__(bot)
-        self.concurrent_slots = 0
+        self.tournaments = TournamentScheduler(self)
 
     async def cog_load(self) -> None:
-        # Load existing games
+        start = time.perf_counter()
+        # Build poker hand lookup tables, here and in the equity workers
+        await asyncio.gather(asyncio.to_thread(load_tables), self.equity.warm_up())
+        log.info(f"Built poker tables in {time.perf_counter() - start:.2f}s")
+        await asyncio.to_thread(load_strategy)
+        # Load existing games and custom emojis at the same time
+        await self.load_emoji_cache()
+        await self.settlements.start(self.bot)  # recovers once the bot is ready
+        await self.tournaments.load()
+        await asyncio.gather(self.load_games(), self.load_emojis())
+        self.tournaments.start()
+        self.poker_games.start()
+        await self.stats.start()
+        latency.start(cog_data_path(self) / "metrics.prom")
+
+    async def load_games(self) -> None:
+        start = time.perf_counter()
         all_channels = await self.config.all_channels()
-        for cid, conf in all_channels.items():
-            try:
-                channel = self.bot.get_channel(cid)
-                assert isinstance(channel, (discord.TextChannel, discord.Thread))
-                if not channel:
-                    continue
-                game_config = conf.get("game", {})
-                if not game_config:
-                    continue
-                game = await PokerGame.from_config(self, channel, game_config)
-                if game.players and not game.is_finished:
-                    self.poker_games[cid] = game
-                    if game.view:
-                        self.bot.add_view(game.view)
-            except Exception:
-                log.error(f"Loading game in {cid}", exc_info=True)
-
-        # Load custom emojis into config, creating them if necessary
+        semaphore = asyncio.Semaphore(RESTORE_CONCURRENCY)
+
+        async def load_game(cid: int, conf: dict):
+            async with semaphore:
+                try:
+                    channel = self.bot.get_channel(cid)
+                    if not isinstance(channel, (discord.TextChannel, discord.Thread)):
+                        return
+                    game_config = conf.get("game", {})
+                    if not game_config:
+                        return
+                    game_class = TournamentTable if "tournament" in game_config else PokerGame
+                    game = await game_class.from_config(self, channel, game_config)
+                    if game.players and not game.is_finished:
+                        self.poker_games[cid] = game
+                        if game.view:
+                            self.bot.add_view(game.view)
+                except Exception:
+                    log.error(f"Loading game in {cid}", exc_info=True)
+
+        await asyncio.gather(*(load_game(cid, conf) for cid, conf in all_channels.items()))
+        log.info(f"Restored {len(self.poker_games)} poker games from {len(all_channels)} channels in {time.perf_counter() - start:.2f}s")
+
+    async def load_emojis(self) -> None:
+        """Load custom emojis into config, creating them if necessary"""
+        start = time.perf_counter()
         all_emojis = await self.bot.fetch_application_emojis()
         for emoji_name in ("dealer", "smallblind", "bigblind", "spades", "clubs"):
             emoji = next((emoji for emoji in all_emojis if emoji.name == emoji_name), None)
@@ -68,14 +117,30 @@ class SimpleCasino(BaseCasinoCog):
                     image = await fp.read()
                 emoji = await self.bot.create_application_emoji(name=emoji_name, image=image)
             if emoji:
-                await self.config.__getattr__("emoji_" + emoji_name).set(str(emoji))
+                await self.set_emoji(emoji_name, str(emoji))
+        log.info(f"Synced custom emojis in {time.perf_counter() - start:.2f}s")
 
-    def cog_unload(self):
+    async def cog_unload(self):
         global old_slot, old_payouts
         # clear views
+        self.poker_games.close()
         for game in self.poker_games.values():
             if game.view:
                 game.view.stop()
+        self.equity.close()
+        self.edits.close()
+        await self.tournaments.close()
+        # save pending changes
+        await asyncio.gather(*(game.flush_state() for game in self.poker_games.values() if game.save_task is not None))
+        await asyncio.gather(*(self.flush_shoe(cid) for cid in list(self.shoe_save_tasks)))
+        log.info(f"Coalesced {self.saves_avoided} poker state writes this session")
+        await self.stats.close()
+        log.info(f"Saved {self.stats.increments} stat updates in {self.stats.writes} writes this session")
+        await self.history.close()
+        log.info(f"Recorded {self.history.recorded} poker hands this session")
+        await self.settlements.close()
+        log.info(f"Settled {self.settlements.settled} poker payouts this session")
+        await latency.close()
         # restore old commands
         if old_slot:
             self.bot.remove_command(old_slot.name)
@@ -87,6 +152,11 @@ class SimpleCasino(BaseCasinoCog):
             self.bot.remove_command(old_blackjack.name)
             self.bot.add_command(old_blackjack)
 
+    async def red_delete_data_for_user(self, *, requester: RequestType, user_id: int) -> None:
+        await self.stats.delete_user(user_id)
+        hands = await self.history.delete_user(user_id)
+        log.info(f"Deleted the stats of user {user_id} and their id from {hands} poker hands")
+
     async def get_economy_cog(self, ctx: Union[discord.Interaction, commands.Context]) -> Optional[Economy]:
         cog: Optional[Economy] = self.bot.get_cog("Economy")  # type: ignore
         if cog:
@@ -109,7 +179,7 @@ class SimpleCasino(BaseCasinoCog):
 
         minimum_bid = await self.config.bjmin() if await bank.is_global() else await self.config.guild(ctx.guild).bjmin()
         maximum_bid = await self.config.bjmax() if await bank.is_global() else await self.config.guild(ctx.guild).bjmax()
-        currency_name = await bank.get_currency_name(ctx.guild)
+        currency_name = await self.get_currency_name(ctx.guild)
         if bet < 1 or bet < minimum_bid:
             return await reply(f"Your bet must be at least {humanize_number(minimum_bid)} {currency_name}", ephemeral=True)
         elif bet > maximum_bid:
@@ -119,9 +189,11 @@ class SimpleCasino(BaseCasinoCog):
         
         await bank.withdraw_credits(author, bet)
         include_author = isinstance(ctx, discord.Interaction) and ctx.type == discord.InteractionType.component
-        blackjack = Blackjack(self, author, ctx.channel, bet, await self.bot.get_embed_color(ctx.channel), include_author)
+        shoe = await self.get_shoe(ctx.channel)
+        hints = await self.config.bjhints() if await bank.is_global() else await self.config.guild(ctx.guild).bjhints()
+        blackjack = Blackjack(self, author, ctx.channel, bet, await self.bot.get_embed_color(ctx.channel), include_author, shoe, hints)
         await blackjack.check_payout()
-        view = AgainView(self.blackjack, bet, None, currency_name) if blackjack.is_over() else blackjack
+        view = AgainView(self.blackjack, bet, None, currency_name) if blackjack.round.is_over() else blackjack
         message = await reply(embed=await blackjack.get_embed(), view=view, allowed_mentions=discord.AllowedMentions.none())
         if isinstance(view, AgainView):
             view.message = message if isinstance(ctx, commands.Context) else await ctx.original_response()  # type: ignore
@@ -132,13 +204,7 @@ class SimpleCasino(BaseCasinoCog):
     @app_commands.describe(bet="How much currency to put in the slot machine.")
     async def slot_cmd(self, ctx: commands.Context, bet: int):
         """Play the slot machine."""
-        try:
-            if not ctx.interaction:
-                self.concurrent_slots += 1
-            await self.slot(ctx, bet)
-        finally:
-            if not ctx.interaction:
-                self.concurrent_slots -= 1
+        await self.slot(ctx, bet)
 
     async def slot(self, ctx: Union[discord.Interaction, commands.Context], bet: int):
         author = ctx.author if isinstance(ctx, commands.Context) else ctx.user
@@ -148,14 +214,6 @@ class SimpleCasino(BaseCasinoCog):
         if not (economy := await self.get_economy_cog(ctx)):
             return
 
-        if self.concurrent_slots > MAX_CONCURRENT_SLOTS and isinstance(ctx, commands.Context) and not ctx.interaction:
-            content = f"Too many people are using the slot machine right now. "
-            if self.bot.tree.get_command("slot") is None:
-                content += "The bot owner could enable the `/slot` slash command, which would allow more people to use it at the same time."
-            else:
-                content += "Consider using the `/slot` slash command instead, which allows more people to use it at the same time."
-            return await reply(content)
-        
         is_global = await bank.is_global()
         if await bank.is_global():
             min_bid = await economy.config.SLOT_MIN()
@@ -170,7 +228,7 @@ class SimpleCasino(BaseCasinoCog):
         
         created_at = ctx.created_at if isinstance(ctx, discord.Interaction) else ctx.message.created_at
         cur_time = calendar.timegm(created_at.utctimetuple())
-        currency_name = await bank.get_currency_name(ctx.guild)
+        currency_name = await self.get_currency_name(ctx.guild)
 
         if (cur_time - last_slot) < max(3, slot_time):
             await reply("You're on cooldown, try again in a few seconds.")
@@ -214,7 +272,7 @@ class SimpleCasino(BaseCasinoCog):
     async def poker_app_rules(self, interaction: discord.Interaction):
         """Show the rules for Poker in this bot."""
         embed = discord.Embed(color=DISCORD_RED)
-        bigblind_emoji = await self.config.emoji_bigblind()
+        bigblind_emoji = self.emoji("bigblind")
         embed.title = f"{bigblind_emoji} Texas Hold'em Poker - Rules summary"
         embed.description = POKER_RULES
         filename = "pokerhands.jpg"
@@ -222,15 +280,119 @@ class SimpleCasino(BaseCasinoCog):
         embed.set_image(url=f"attachment://{filename}")
         await interaction.response.send_message(embed=embed, file=file, ephemeral=True)
 
-    async def poker(self, ctx: Union[discord.Interaction, commands.Context], players: List[discord.Member], starting_bet: Optional[int]) -> bool:
+    @commands.group(name="pokerhistory", aliases=["pokerhist"], invoke_without_command=True)
+    @commands.guild_only()
+    async def pokerhistory(self, ctx: commands.Context, member: Optional[discord.Member]):
+        """View your own or someone else's last hands of Poker."""
+        assert ctx.guild and isinstance(ctx.author, discord.Member)
+        member = member or ctx.author
+        hands = await self.history.recent(ctx.guild.id, member.id)
+        await self.send_hand_list(ctx, f"🃏 Last Poker hands of {member.display_name}", hands)
+
+    @pokerhistory.command(name="biggest")
+    async def pokerhistory_biggest(self, ctx: commands.Context):
+        """View the hands of Poker with the biggest pots."""
+        assert ctx.guild
+        hands = await self.history.biggest(ctx.guild.id)
+        await self.send_hand_list(ctx, "🃏 Biggest Poker pots", hands)
+
+    @pokerhistory.command(name="hand")
+    async def pokerhistory_hand(self, ctx: commands.Context, hand_id: int):
+        """Replay a hand of Poker, step by step."""
+        assert ctx.guild
+        found = await self.history.get(ctx.guild.id, hand_id)
+        if found is None:
+            return await ctx.send(f"There is no hand #{hand_id} in this server.")
+        summary, record = found
+        currency_name = await self.get_currency_name(ctx.guild)
+        suit_emojis = {
+            CardSuit.HEARTS: "♥️",
+            CardSuit.DIAMONDS: "♦️",
+            CardSuit.SPADES: self.emoji("spades"),
+            CardSuit.CLUBS: self.emoji("clubs"),
+        }
+
+        def name(user_id: int) -> str:
+            if user_id in DELETED_USER_IDS:
+                return "Deleted user"
+            member = ctx.guild.get_member(user_id)
+            return member.display_name if member else f"<@{user_id}>"
+
+        def card_str(card: Card) -> str:
+            return f"{CARD_VALUE_STR[card.value]}{suit_emojis[card.suit]}"
+
+        lines = record.describe(name, card_str, currency_name)
+        header = f"<t:{summary.played_at}:f> in <#{summary.channel_id}>, pot of {humanize_number(summary.pot)} {currency_name}\n"
+        color = await self.bot.get_embed_color(ctx.channel)
+        page_count = (len(lines) - 1) // HISTORY_REPLAY_PAGE_SIZE + 1
+        pages = []
+        for page in range(page_count):
+            chunk = lines[page * HISTORY_REPLAY_PAGE_SIZE:(page + 1) * HISTORY_REPLAY_PAGE_SIZE]
+            embed = discord.Embed(title=f"🃏 Poker hand #{summary.id}", description=header + "\n".join(chunk), color=color)
+            if page_count > 1:
+                embed.set_footer(text=f"Page {page + 1}/{page_count}")
+            pages.append(embed)
+        if len(pages) == 1:
+            await ctx.send(embed=pages[0])
+        else:
+            await menu(ctx, pages, DEFAULT_CONTROLS)
+
+    async def send_hand_list(self, ctx: commands.Context, title: str, hands: List[HandSummary]):
+        assert ctx.guild
+        color = await self.bot.get_embed_color(ctx.channel)
+        if not hands:
+            return await ctx.send(embed=discord.Embed(title=title, description="No hands have been played yet.", color=color))
+        currency_name = await self.get_currency_name(ctx.guild)
+        pages = []
+        page_count = (len(hands) - 1) // HISTORY_PAGE_SIZE + 1
+        for page in range(page_count):
+            lines = []
+            for hand in hands[page * HISTORY_PAGE_SIZE:(page + 1) * HISTORY_PAGE_SIZE]:
+                line = f"**#{hand.id}** <t:{hand.played_at}:R> - pot of {humanize_number(hand.pot)} {currency_name}"
+                if hand.net is not None:
+                    line += f" ({'+' if hand.net > 0 else ''}{humanize_number(hand.net)})"
+                lines.append(line)
+            embed = discord.Embed(title=title, description="\n".join(lines), color=color)
+            embed.set_footer(text=f"Page {page + 1}/{page_count} - replay a hand with {ctx.clean_prefix}pokerhistory hand <number>")
+            pages.append(embed)
+        if len(pages) == 1:
+            await ctx.send(embed=pages[0])
+        else:
+            await menu(ctx, pages, DEFAULT_CONTROLS)
+
+    @poker_app.command(name="history")
+    @app_commands.describe(member="The user to view hands for. Views your own hands by default.")
+    async def pokerhistory_app(self, interaction: discord.Interaction, member: Optional[discord.Member]):
+        """View your own or someone else's last hands of Poker."""
+        ctx = await commands.Context.from_interaction(interaction)
+        await self.pokerhistory(ctx, member)
+
+    @poker_app.command(name="biggest")
+    async def pokerhistory_biggest_app(self, interaction: discord.Interaction):
+        """View the hands of Poker with the biggest pots."""
+        ctx = await commands.Context.from_interaction(interaction)
+        await self.pokerhistory_biggest(ctx)
+
+    @poker_app.command(name="hand")
+    @app_commands.describe(hand_id="The number of the hand, shown under each finished game.")
+    async def pokerhistory_hand_app(self, interaction: discord.Interaction, hand_id: int):
+        """Replay a hand of Poker, step by step."""
+        ctx = await commands.Context.from_interaction(interaction)
+        await self.pokerhistory_hand(ctx, hand_id)
+
+    async def poker(self, ctx: Union[discord.Interaction, commands.Context], players: List[discord.Member], starting_bet: Optional[int], bots: int = 0) -> bool:
         author = ctx.author if isinstance(ctx, commands.Context) else ctx.user
         assert ctx.guild and isinstance(author, discord.Member) and isinstance(ctx.channel, discord.TextChannel)
         
         reply = ctx.reply if isinstance(ctx, commands.Context) else ctx.response.send_message
 
+        if self.tournaments.is_table(ctx.channel.id):
+            await reply("This channel is a table of the poker tournament.", ephemeral=True)
+            return False
+
         minimum_starting_bet: int = await self.config.pokermin() if await bank.is_global() else await self.config.guild(ctx.guild).pokermin()
         maximum_starting_bet: int = await self.config.pokermax() if await bank.is_global() else await self.config.guild(ctx.guild).pokermax()
-        currency_name = await bank.get_currency_name(ctx.guild)
+        currency_name = await self.get_currency_name(ctx.guild)
         if starting_bet is None:
             starting_bet = minimum_starting_bet
         elif starting_bet < minimum_starting_bet:
@@ -245,7 +407,7 @@ class SimpleCasino(BaseCasinoCog):
 
         # Game already exists
         if ctx.channel.id in self.poker_games and not self.poker_games[ctx.channel.id].is_finished:
-            if len(players) > 1:  # rematch
+            if len(players) + bots > 1:  # rematch
                 await reply("Another game of Poker has already begun in this channel.", ephemeral=True)
                 return False
             
@@ -254,6 +416,8 @@ class SimpleCasino(BaseCasinoCog):
                 old_message = await ctx.channel.fetch_message(old_game.message.id) if old_game.message else None # re-fetch
             except discord.NotFound:
                 old_message = None
+            if old_message:
+                old_game.message = old_message
 
             if not old_message:
                 await old_game.update_message()
@@ -297,19 +461,142 @@ class SimpleCasino(BaseCasinoCog):
 
         # New game
         game = PokerGame(self, players, ctx.channel, starting_bet)
+        for _ in range(bots):
+            game.try_add_bot()
         self.poker_games[ctx.channel.id] = game
         await game.update_message()
         return True
 
 
+    @commands.group(name="pokertournament", aliases=["pokertour"], invoke_without_command=True)
+    @commands.guild_only()
+    async def pokertournament(self, ctx: commands.Context):
+        """Shows the poker tournament of this server, if any."""
+        assert ctx.guild
+        tournament = self.tournaments.tournaments.get(ctx.guild.id)
+        if tournament is None:
+            return await ctx.send(f"There is no poker tournament right now. Create one with `{ctx.clean_prefix}pokertournament create <buy_in>`")
+        currency_name = await self.get_currency_name(ctx.guild)
+        embed = discord.Embed(title="🏆 Poker tournament", color=await self.bot.get_embed_color(ctx.channel))
+        embed.add_field(name="Buy-in", value=f"{humanize_number(tournament.buy_in)} {currency_name}")
+        if tournament.state == TournamentState.Registering:
+            embed.description = f"Join with `{ctx.clean_prefix}pokertournament join`. Everyone starts with {humanize_number(TOURNAMENT_STACK)} chips."
+            embed.add_field(name="Players", value=humanize_number(len(tournament.stacks)))
+            embed.add_field(name="Host", value=f"<@{tournament.host_id}>")
+            return await ctx.send(embed=embed)
+        prizes = " / ".join(humanize_number(prize) for prize in tournament.prizes())
+        embed.add_field(name="Prizes", value=f"{prizes} {currency_name}")
+        embed.add_field(name="Blinds", value=f"{humanize_number(tournament.big_blind // 2)}/{humanize_number(tournament.big_blind)}")
+        lines = []
+        for place, user_id in enumerate(tournament.standings()[:TOURNAMENT_STANDINGS_SIZE], 1):
+            if user_id in tournament.stacks:
+                lines.append(f"**{place}.** <@{user_id}> - {humanize_number(tournament.stacks[user_id])} chips at <#{tournament.seats[user_id]}>")
+            else:
+                lines.append(f"**{place}.** <@{user_id}> - out")
+        embed.description = f"{len(tournament.stacks)} of {tournament.entrants} players left at {len(tournament.tables)} tables\n\n" + "\n".join(lines)
+        await ctx.send(embed=embed, allowed_mentions=discord.AllowedMentions.none())
+
+    @pokertournament.command(name="create")
+    async def pokertournament_create(self, ctx: commands.Context, buy_in: int):
+        """Opens registration for a poker tournament in this channel. Each player pays the buy-in, and the best players win them all."""
+        assert ctx.guild and isinstance(ctx.author, discord.Member)
+        if ctx.guild.id in self.tournaments.tournaments:
+            return await ctx.send("There is already a poker tournament in this server.")
+        if not isinstance(ctx.channel, discord.TextChannel):
+            return await ctx.send("The tables of a tournament are threads, so it must be created in a text channel.")
+        if buy_in < 0:
+            return await ctx.send("The buy-in can't be negative.")
+        tournament = Tournament(ctx.guild.id, ctx.channel.id, ctx.author.id, buy_in)
+        self.tournaments.tournaments[ctx.guild.id] = tournament
+        await self.tournaments.save(tournament)
+        currency_name = await self.get_currency_name(ctx.guild)
+        await ctx.send(f"🏆 A poker tournament with a buy-in of {humanize_number(buy_in)} {currency_name} is open! "
+                       f"Join with `{ctx.clean_prefix}pokertournament join`, and the host will start it with `{ctx.clean_prefix}pokertournament start`.\n"
+                       f"Everyone starts with {humanize_number(TOURNAMENT_STACK)} chips, and the blinds go up every {BLIND_LEVEL_TIME // 60} minutes.")
+
+    @pokertournament.command(name="join")
+    async def pokertournament_join(self, ctx: commands.Context):
+        """Pays the buy-in and joins the poker tournament."""
+        assert ctx.guild and isinstance(ctx.author, discord.Member)
+        tournament = self.tournaments.tournaments.get(ctx.guild.id)
+        if tournament is None or tournament.state != TournamentState.Registering:
+            return await ctx.send("There is no poker tournament open for registration.")
+        if ctx.author.id in tournament.stacks:
+            return await ctx.send("You're already in the tournament.")
+        if len(tournament.stacks) >= TOURNAMENT_MAX_PLAYERS:
+            return await ctx.send("The tournament is full.")
+        if not await bank.can_spend(ctx.author, tournament.buy_in):
+            currency_name = await self.get_currency_name(ctx.guild)
+            return await ctx.send(f"You don't have enough {currency_name} for the buy-in.")
+        await bank.withdraw_credits(ctx.author, tournament.buy_in)
+        tournament.register(ctx.author.id)
+        await self.tournaments.save(tournament)
+        await ctx.send(f"You're in! {len(tournament.stacks)} players have joined.")
+
+    @pokertournament.command(name="leave")
+    async def pokertournament_leave(self, ctx: commands.Context):
+        """Leaves the poker tournament before it starts, getting the buy-in back."""
+        assert ctx.guild and isinstance(ctx.author, discord.Member)
+        tournament = self.tournaments.tournaments.get(ctx.guild.id)
+        if tournament is None or ctx.author.id not in tournament.stacks:
+            return await ctx.send("You're not in a poker tournament.")
+        if tournament.state != TournamentState.Registering:
+            return await ctx.send("The tournament has already started.")
+        tournament.unregister(ctx.author.id)
+        await self.tournaments.save(tournament)
+        await transfer(ctx.author, tournament.buy_in)
+        await ctx.send("You left the tournament and got your buy-in back.")
+
+    async def can_manage_tournament(self, ctx: commands.Context, tournament: Tournament) -> bool:
+        assert isinstance(ctx.author, discord.Member)
+        return ctx.author.id == tournament.host_id or ctx.author.guild_permissions.manage_guild or await self.bot.is_admin(ctx.author)
+
+    @pokertournament.command(name="start")
+    @commands.bot_has_permissions(create_public_threads=True)
+    async def pokertournament_start(self, ctx: commands.Context):
+        """Seats the players at their tables and deals the first hands. Only the host or an admin can start it."""
+        assert ctx.guild
+        tournament = self.tournaments.tournaments.get(ctx.guild.id)
+        if tournament is None or tournament.state != TournamentState.Registering:
+            return await ctx.send("There is no poker tournament waiting to start.")
+        if not await self.can_manage_tournament(ctx, tournament):
+            return await ctx.send("Only the host of the tournament can start it.")
+        if len(tournament.stacks) < 2:
+            return await ctx.send("At least 2 players are needed to start the tournament.")
+        channel = ctx.guild.get_channel(tournament.channel_id)
+        if not isinstance(channel, discord.TextChannel):
+            return await ctx.send("The channel of the tournament is gone.")
+        async with ctx.typing():
+            tables = [await channel.create_thread(name=f"Poker tournament - Table {i + 1}", type=discord.ChannelType.public_thread)
+                      for i in range(tournament.tables_needed(len(tournament.stacks)))]
+            tournament.start([table.id for table in tables], self.rng.stream(f"tournament {ctx.guild.id}"))
+            await self.tournaments.save(tournament)
+        self.tournaments.schedule_idle_tables(tournament, 0)
+        lines = [f"🏆 The tournament has begun with {tournament.entrants} players!"]
+        lines += [f"{table.mention}: {', '.join(f'<@{user_id}>' for user_id in tournament.players_at(table.id))}" for table in tables]
+        await ctx.send("\n".join(lines), allowed_mentions=discord.AllowedMentions(users=True))
+
+    @pokertournament.command(name="cancel")
+    async def pokertournament_cancel(self, ctx: commands.Context):
+        """Cancels the poker tournament and gives everyone their buy-in back. Only the host or an admin can cancel it."""
+        assert ctx.guild
+        tournament = self.tournaments.tournaments.get(ctx.guild.id)
+        if tournament is None:
+            return await ctx.send("There is no poker tournament right now.")
+        if not await self.can_manage_tournament(ctx, tournament):
+            return await ctx.send("Only the host of the tournament can cancel it.")
+        await self.tournaments.cancel(tournament)
+        await ctx.send("The tournament was cancelled and everyone got their buy-in back.")
+
+
     @commands.command(name="blackjackstats", aliases=["bjstats"])
     @commands.guild_only()
     async def blackjackstats(self, ctx: commands.Context, member: Optional[discord.Member]):
         """View your own or someone else's stats in Blackjack."""
-        assert isinstance(ctx.author, discord.Member)
+        assert ctx.guild and isinstance(ctx.author, discord.Member)
         member = member or ctx.author
-        stats = await self.config.user(member).all() if await bank.is_global() else await self.config.member(member).all()
-        currency_name = await bank.get_currency_name(ctx.guild)
+        stats = await self.stats.get(await self.stats_scope(ctx.guild), member.id)
+        currency_name = await self.get_currency_name(ctx.guild)
         embed = discord.Embed(title="2️⃣1️⃣ Blackjack Stats", color=await self.bot.get_embed_color(ctx.channel))
         embed.set_author(name=member.display_name, icon_url=member.display_avatar.url)
         embed.add_field(name="Times played", value=humanize_number(stats["bjcount"]))
@@ -329,8 +616,8 @@ class SimpleCasino(BaseCasinoCog):
         assert ctx.guild and isinstance(ctx.author, discord.Member)
         member = member or ctx.author
         is_global = await bank.is_global()
-        stats = await self.config.user(member).all() if is_global else await self.config.member(member).all()
-        currency_name = await bank.get_currency_name(ctx.guild)
+        stats = await self.stats.get(await self.stats_scope(ctx.guild), member.id)
+        currency_name = await self.get_currency_name(ctx.guild)
         embed = discord.Embed(title="7️⃣ Slot Machine Stats", color=await self.bot.get_embed_color(ctx.channel))
         embed.set_author(name=member.display_name, icon_url=member.display_avatar.url)
         embed.add_field(name="Times played", value=humanize_number(stats["slotcount"]))
@@ -345,6 +632,37 @@ class SimpleCasino(BaseCasinoCog):
         embed.add_field(name="Jackpot near-misses", value=humanize_number(stats["slotjackpotwhiffcount"]))
         await ctx.send(embed=embed)
 
+    @commands.command(name="casinoleaderboard", aliases=["casinolb"])
+    @commands.guild_only()
+    async def casinoleaderboard(self, ctx: commands.Context, stat: str = "slotprofit"):
+        """View the top players for a casino stat."""
+        assert ctx.guild
+        if stat not in LEADERBOARD_STATS:
+            return await ctx.send(f"Stat must be one of: {', '.join(f'`{key}`' for key in LEADERBOARD_STATS)}")
+        is_global = await bank.is_global()
+        top = self.stats.leaderboard.top(await self.stats_scope(ctx.guild), stat)
+        currency_name = await self.get_currency_name(ctx.guild)
+        color = await self.bot.get_embed_color(ctx.channel)
+        title = f"🏆 {LEADERBOARD_STATS[stat]}" + (" (global)" if is_global else "")
+        if not top:
+            return await ctx.send(embed=discord.Embed(title=title, description="Nobody has played yet.", color=color))
+        pages = []
+        page_count = (len(top) - 1) // LEADERBOARD_PAGE_SIZE + 1
+        for page in range(page_count):
+            lines = []
+            for position, (user_id, value) in enumerate(top[page * LEADERBOARD_PAGE_SIZE:(page + 1) * LEADERBOARD_PAGE_SIZE], page * LEADERBOARD_PAGE_SIZE + 1):
+                user = ctx.guild.get_member(user_id) or self.bot.get_user(user_id)
+                name = user.display_name if user else f"<@{user_id}>"
+                amount = f"{humanize_number(value)} {currency_name}" if stat.endswith("profit") else humanize_number(value)
+                lines.append(f"**{position}.** {name} - {amount}")
+            embed = discord.Embed(title=title, description="\n".join(lines), color=color)
+            embed.set_footer(text=f"Page {page + 1}/{page_count}")
+            pages.append(embed)
+        if len(pages) == 1:
+            await ctx.send(embed=pages[0])
+        else:
+            await menu(ctx, pages, DEFAULT_CONTROLS)
+
 
     casinostats_app = app_commands.Group(name="casinostats", description="View your stats in Blackjack and Slots.", guild_only=True)
 
@@ -362,6 +680,14 @@ class SimpleCasino(BaseCasinoCog):
         ctx = await commands.Context.from_interaction(interaction)
         await self.slotstats(ctx, member)
 
+    @casinostats_app.command(name="leaderboard")
+    @app_commands.describe(stat="The stat to rank players by.")
+    @app_commands.choices(stat=[app_commands.Choice(name=name, value=key) for key, name in LEADERBOARD_STATS.items()])
+    async def casinoleaderboard_app(self, interaction: discord.Interaction, stat: str = "slotprofit"):
+        """View the top players for a casino stat."""
+        ctx = await commands.Context.from_interaction(interaction)
+        await self.casinoleaderboard(ctx, stat)
+
 
     @commands.group(name="simplecasinoset", aliases=["setcasino"])  # type: ignore
     @commands.admin_or_permissions(manage_guild=True)
@@ -370,6 +696,83 @@ class SimpleCasino(BaseCasinoCog):
         """Settings for the SimpleCasino cog."""
         pass
 
+    @simplecasinoset.command(name="editqueue")
+    @commands.is_owner()
+    async def casinoset_editqueue(self, ctx: commands.Context):
+        """Shows how many animation frames are waiting on Discord's rate limits."""
+        await ctx.send(f"Pending edits: {self.edits.total_depth()} across {len(self.edits.queues)} queues.\n"
+                       f"Frames dropped in favor of newer ones: {self.edits.dropped}")
+
+    @simplecasinoset.command(name="games")
+    @commands.is_owner()
+    async def casinoset_games(self, ctx: commands.Context):
+        """Shows how many poker games are kept in memory, and how many were cleaned up."""
+        metrics = self.poker_games.metrics()
+        await ctx.send(f"Poker games in memory: {metrics['games']} in {metrics['guilds']} servers, {metrics['active']} in progress "
+                       f"({metrics['idle']} idle, {metrics['players']} players) and {metrics['finished']} finished.\n"
+                       f"Live views: {metrics['views']}\n"
+                       f"Cleaned up this session: {metrics['evicted']} finished games and {metrics['abandoned']} abandoned games, refunded.")
+
+    @simplecasinoset.command(name="latency")
+    @commands.is_owner()
+    async def casinoset_latency(self, ctx: commands.Context):
+        """Shows how long casino interactions take to handle, and which parts of them."""
+        rows = latency.summary()
+        if not rows:
+            return await ctx.send("No interactions timed yet this session.")
+        lines = [f"{'interaction':<22}{'phase':<10}{'count':>8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}"]
+        for interaction, phase, count, p50, p99, maximum in rows:
+            lines.append(f"{interaction:<22}{phase:<10}{count:>8}{p50 * 1000:>9.1f}{p99 * 1000:>9.1f}{maximum * 1000:>9.1f}")
+        for page in pagify("\n".join(lines), page_length=1900):
+            await ctx.send(box(page))
+
+    @simplecasinoset.command(name="seeds")
+    @commands.is_owner()
+    async def casinoset_seeds(self, ctx: commands.Context, search: Optional[str] = None):
+        """Shows the seeds of the latest games, to deal one again the same way. Search by channel ID or game."""
+        records = [record for record in reversed(self.rng.recent) if search is None or search in record[1]]
+        if not records:
+            return await ctx.send("No seeds recorded yet this session." if search is None else "No seeds found.")
+        lines = [f"<t:{int(seeded_at)}:T> {purpose}: `{seed}`" for seeded_at, purpose, seed in records]
+        pages = list(pagify("\n".join(lines), page_length=1000))
+        embeds = [discord.Embed(title="Latest seeds", description=page, color=await ctx.embed_color()) for page in pages]
+        if len(embeds) == 1:
+            return await ctx.send(embed=embeds[0])
+        for i, embed in enumerate(embeds):
+            embed.set_footer(text=f"Page {i + 1}/{len(embeds)}")
+        await menu(ctx, embeds, DEFAULT_CONTROLS)
+
+    @simplecasinoset.command(name="slotsim")
+    @commands.is_owner()
+    async def casinoset_slotsim(self, ctx: commands.Context, spins: int = 10_000_000):
+        """Simulates the slot machine with every combination of settings and reports the return to player."""
+        if not 0 < spins <= MAX_SIMULATED_SPINS:
+            return await ctx.send(f"Spins must be between 1 and {humanize_number(MAX_SIMULATED_SPINS)}.")
+        seed = self.rng.seed("slotsim")
+        async with ctx.typing():
+            results = await asyncio.to_thread(simulate_all, spins, seed)
+        lines = [f"⚠️ {problem}" for problem in validate_payouts()]
+        lines += [f"- {result.summary()}" for result in results]
+        lines.append(f"Seed: `{seed}`")
+        await ctx.send("\n".join(lines))
+
+    @simplecasinoset.command(name="bjsim")
+    @commands.is_owner()
+    async def casinoset_bjsim(self, ctx: commands.Context, hands: int = 1_000_000, strategy: str = "basic"):
+        """Plays blackjack against itself with the current shoe settings and reports the house edge."""
+        assert ctx.guild
+        if not 0 < hands <= MAX_SIMULATED_HANDS:
+            return await ctx.send(f"Hands must be between 1 and {humanize_number(MAX_SIMULATED_HANDS)}.")
+        if strategy not in STRATEGIES:
+            return await ctx.send(f"Strategy must be one of: {', '.join(f'`{name}`' for name in STRATEGIES)}")
+        settings = self.config if await bank.is_global() else self.config.guild(ctx.guild)
+        decks = await settings.bjdecks()
+        penetration = await settings.bjpenetration() / 100
+        seed = self.rng.seed("bjsim")
+        async with ctx.typing():
+            result = await asyncio.to_thread(simulate_blackjack, strategy, hands, decks, penetration, seed=seed)
+        await ctx.send(f"{result.summary()}\nSeed: `{seed}`")
+
     @simplecasinoset.command(name="bjmin", aliases=["blackjackmin"])
     async def casinoset_bjmin(self, ctx: commands.Context, bid: Optional[int]):
         """The minimum bid for blackjack."""
@@ -400,6 +803,70 @@ class SimpleCasino(BaseCasinoCog):
         await config_bjmax.set(bid)
         await ctx.send(f"New maximum bid for Blackjack is {bid} {currency}.")
 
+    @simplecasinoset.command(name="bjdecks", aliases=["blackjackdecks"])
+    async def casinoset_bjdecks(self, ctx: commands.Context, decks: Optional[int]):
+        """How many decks are shuffled together in each channel's blackjack shoe."""
+        assert ctx.guild
+        is_global = await bank.is_global()
+        config_bjdecks = self.config.bjdecks if is_global else self.config.guild(ctx.guild).bjdecks
+        if decks is None:
+            decks = await config_bjdecks()
+            return await ctx.send(f"Blackjack is currently dealt from a shoe of {decks} decks.")
+        if not MIN_SHOE_DECKS <= decks <= MAX_SHOE_DECKS:
+            return await ctx.send(f"Decks must be between {MIN_SHOE_DECKS} and {MAX_SHOE_DECKS}.")
+        await config_bjdecks.set(decks)
+        await ctx.send(f"Blackjack will now be dealt from a shoe of {decks} decks.")
+
+    @simplecasinoset.command(name="bjpenetration", aliases=["blackjackpenetration"])
+    async def casinoset_bjpenetration(self, ctx: commands.Context, percent: Optional[int]):
+        """How much of the blackjack shoe is dealt before it's reshuffled, as a percentage."""
+        assert ctx.guild
+        is_global = await bank.is_global()
+        config_bjpenetration = self.config.bjpenetration if is_global else self.config.guild(ctx.guild).bjpenetration
+        if percent is None:
+            percent = await config_bjpenetration()
+            return await ctx.send(f"The blackjack shoe is currently reshuffled after {percent}% of it is dealt.")
+        if not MIN_PENETRATION <= percent <= MAX_PENETRATION:
+            return await ctx.send(f"Penetration must be between {MIN_PENETRATION}% and {MAX_PENETRATION}%.")
+        await config_bjpenetration.set(percent)
+        await ctx.send(f"The blackjack shoe will now be reshuffled after {percent}% of it is dealt.")
+
+    @simplecasinoset.command(name="bjhints", aliases=["blackjackhints"])
+    async def casinoset_bjhints(self, ctx: commands.Context):
+        """Toggles the hint button in Blackjack, which shows the best play and the average result of each play."""
+        assert ctx.guild
+        is_global = await bank.is_global()
+        config_value = self.config.bjhints if is_global else self.config.guild(ctx.guild).bjhints
+        value = await config_value()
+        await config_value.set(not value)
+        if not value:
+            await ctx.send("Blackjack will show a hint button.")
+        else:
+            await ctx.send("Blackjack won't show a hint button.")
+
+    @simplecasinoset.command(name="bjedge", aliases=["blackjackedge"])
+    async def casinoset_bjedge(self, ctx: commands.Context):
+        """Shows the house edge of Blackjack against perfect play, and the basic strategy."""
+        edge = house_edge()
+        await ctx.send(f"Against perfect play from an infinite shoe, the house keeps {edge:.2%} of blackjack bets on average. "
+                       f"Rows are your hand and columns are the dealer's card. S = Stand, H = Hit, D = Double, P = Split.\n"
+                       f"```\n{strategy_chart()}\n```")
+
+    @simplecasinoset.command(name="pokerbots")
+    async def casinoset_pokerbots(self, ctx: commands.Context):
+        """Toggles whether bots can be added to games of Poker. Bots play with the house's money, which is this bot's own bank account."""
+        assert ctx.guild
+        is_global = await bank.is_global()
+        config_value = self.config.pokerbots if is_global else self.config.guild(ctx.guild).pokerbots
+        value = await config_value()
+        await config_value.set(not value)
+        if not value:
+            currency_name = await self.get_currency_name(ctx.guild)
+            await ctx.send(f"The dealer of a Poker game can now add bots to it. They play with the {currency_name} of {ctx.guild.me.mention}, "
+                           f"so give it some with `{ctx.clean_prefix}bank set`.", allowed_mentions=discord.AllowedMentions.none())
+        else:
+            await ctx.send("Bots can no longer be added to games of Poker.")
+
     @simplecasinoset.command(name="pokermin")
     async def casinoset_pokermin(self, ctx: commands.Context, bet: Optional[int]):
         """The minimum starting bet for Poker."""
@@ -451,10 +918,12 @@ class SimpleCasino(BaseCasinoCog):
         config_value = self.config.coinfreespin if is_global else self.config.guild(ctx.guild).coinfreespin
         value = await config_value()
         await config_value.set(not value)
+        easy = await self.config.sloteasy() if is_global else await self.config.guild(ctx.guild).sloteasy()
+        rtp = f"The slot machine now returns {exact_rtp(easy, not value):.2%} of bets on average."
         if not value:
-            await ctx.send(f"Coins will give free spins in the slot machine.")
+            await ctx.send(f"Coins will give free spins in the slot machine. {rtp}")
         else:
-            await ctx.send(f"Coins won't give free spins in the slot machine.")
+            await ctx.send(f"Coins won't give free spins in the slot machine. {rtp}")
 
     @simplecasinoset.command(name="sloteasy")
     @bank.is_owner_if_bank_global()
@@ -467,10 +936,12 @@ class SimpleCasino(BaseCasinoCog):
         config_value = self.config.sloteasy if is_global else self.config.guild(ctx.guild).sloteasy
         value = await config_value()
         await config_value.set(not value)
+        coinfreespin = await self.config.coinfreespin() if is_global else await self.config.guild(ctx.guild).coinfreespin()
+        rtp = f"The slot machine now returns {exact_rtp(not value, coinfreespin):.2%} of bets on average."
         if not value:
-            await ctx.send(f"Removed the 10th symbol from the slot machine.")
+            await ctx.send(f"Removed the 10th symbol from the slot machine. {rtp}")
         else:
-            await ctx.send(f"Added back the 10th symbol to the slot machine.")
+            await ctx.send(f"Added back the 10th symbol to the slot machine. {rtp}")
 
 
 async def setup(bot: Red):
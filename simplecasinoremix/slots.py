@@ -3,12 +3,15 @@ import random
 import asyncio
 import discord
 from enum import Enum
-from typing import Iterable, Union, cast
-from collections import deque
+from functools import partial
+from itertools import product
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Sequence, Tuple, Union, cast
 from redbot.core import commands, bank, errors
 from redbot.core.utils.chat_formatting import humanize_number
 
 from simplecasino.base import BaseCasinoCog
+from simplecasino.metrics import phase, timed
 from simplecasino.views.again_view import AgainView
 
 JACKPOT_AMOUNT = 100
@@ -38,20 +41,24 @@ PAYOUTS = {
     DOUBLE: 2,
 }
 
-async def slots(cog: BaseCasinoCog, ctx: Union[discord.Interaction, commands.Context], bet: int):
-    author = ctx.author if isinstance(ctx, commands.Context) else ctx.user
-    assert ctx.guild and isinstance(author, discord.Member) and isinstance(ctx.channel, discord.TextChannel)
-    interaction = ctx if isinstance(ctx, discord.Interaction) else ctx.interaction
-    currency_name = await bank.get_currency_name(ctx.guild)
-    is_global = await bank.is_global()
-    easy = await cog.config.sloteasy() if is_global else await cog.config.guild(ctx.guild).sloteasy()
+@dataclass(frozen=True)
+class SlotOutcome:
+    reels: Tuple[Tuple[SlotMachine, ...], ...]  # 3 reels of 3 visible symbols, the center line is the middle one
+    multiplier: int  # 0 means the bet is lost, 1 is a free spin
+    has_three: bool
+    has_two: bool
+    jackpot_whiff: bool
+
 
-    default_reel = deque(list(cast(Iterable, SlotMachine))[:9 if easy else 10])
-    reels = []
-    for _ in range(3):
-        default_reel.rotate(random.randint(-999, 999))  # weeeeee
-        new_reel = deque(default_reel, maxlen=3)
-        reels.append(new_reel)
+def get_reel(easy: bool) -> List[SlotMachine]:
+    return list(cast(Iterable, SlotMachine))[:9 if easy else 10]
+
+
+def spin_outcome(offsets: Sequence[int], easy: bool, coinfreespin: bool) -> SlotOutcome:
+    """The result of a spin where each reel is rotated by the given offset. Used by live spins and simulations alike."""
+    default_reel = get_reel(easy)
+    size = len(default_reel)
+    reels = tuple(tuple(default_reel[(offset + i) % size] for i in range(3)) for offset in offsets)
 
     center_line = (reels[0][1], reels[1][1], reels[2][1])
 
@@ -59,37 +66,17 @@ async def slots(cog: BaseCasinoCog, ctx: Union[discord.Interaction, commands.Con
                  PAYOUTS.get(center_line[1:],
                  PAYOUTS.get(center_line[:-1])))
 
+    has_three = center_line[0] == center_line[1] == center_line[2]
+    has_two = not has_three and (center_line[0] == center_line[1] or center_line[1] == center_line[2])
     if not multiplier:
-        has_three = center_line[0] == center_line[1] == center_line[2]
-        has_two = center_line[0] == center_line[1] or center_line[1] == center_line[2]
         if has_three:
             multiplier = PAYOUTS[TRIPLE]
         elif has_two:
             multiplier = PAYOUTS[DOUBLE]
-    
-    coinfreespin = await cog.config.coinfreespin() if is_global else await cog.config.guild(ctx.guild).coinfreespin()
+
     if coinfreespin and not multiplier and SlotMachine.coin in center_line:
         multiplier = 1
 
-    if multiplier:
-        if multiplier == 1:
-            phrase = "Free spin"
-            balance = await bank.get_balance(author)
-        else:
-            phrase = f"**×{multiplier}**"
-            old_balance = await bank.get_balance(author)
-            winnings = bet * (multiplier - 1)
-            balance = old_balance + winnings
-            try:
-                await bank.deposit_credits(author, winnings)
-            except errors.BalanceTooHigh as exc:
-                await bank.set_balance(author, exc.max_balance)
-    else:
-        old_balance = await bank.get_balance(author)
-        await bank.withdraw_credits(author, bet)
-        balance = old_balance - bet
-        phrase = "*None*"
-
     jackpot_whiff = False
     if center_line.count(SlotMachine.seven) == 2:
             if (reels[0][1] == reels[1][1] == reels[2][0]  # xx^
@@ -100,24 +87,76 @@ async def slots(cog: BaseCasinoCog, ctx: Union[discord.Interaction, commands.Con
                 or reels[0][1] == reels[1][2] == reels[2][1]  # xvx
             ):
                 jackpot_whiff = True
-    
+
+    return SlotOutcome(reels, multiplier or 0, has_three, has_two, jackpot_whiff)
+
+
+# every possible spin, indexed by (o1 * size + o2) * size + o3, for each (easy, coinfreespin) setting
+OUTCOME_TABLES: Dict[Tuple[bool, bool], List[SlotOutcome]] = {
+    (easy, coinfreespin): [spin_outcome(offsets, easy, coinfreespin) for offsets in product(range(len(get_reel(easy))), repeat=3)]
+    for easy, coinfreespin in product((False, True), repeat=2)
+}
+
+
+def random_outcome(easy: bool, coinfreespin: bool, rng: random.Random) -> SlotOutcome:
+    size = len(get_reel(easy))
+    return OUTCOME_TABLES[easy, coinfreespin][(rng.randrange(size) * size + rng.randrange(size)) * size + rng.randrange(size)]
+
+
+def exact_rtp(easy: bool, coinfreespin: bool) -> float:
+    """The expected return per unit bet, including the bet itself, over every possible spin."""
+    table = OUTCOME_TABLES[easy, coinfreespin]
+    return sum(outcome.multiplier for outcome in table) / len(table)
+
+
+@timed("slots")
+async def slots(cog: BaseCasinoCog, ctx: Union[discord.Interaction, commands.Context], bet: int):
+    author = ctx.author if isinstance(ctx, commands.Context) else ctx.user
+    assert ctx.guild and isinstance(author, discord.Member) and isinstance(ctx.channel, discord.TextChannel)
+    interaction = ctx if isinstance(ctx, discord.Interaction) else ctx.interaction
+    with phase("config"):
+        currency_name = await cog.get_currency_name(ctx.guild)
+        is_global = await bank.is_global()
+        easy = await cog.config.sloteasy() if is_global else await cog.config.guild(ctx.guild).sloteasy()
+        coinfreespin = await cog.config.coinfreespin() if is_global else await cog.config.guild(ctx.guild).coinfreespin()
+
+    outcome = random_outcome(easy, coinfreespin, cog.rng.shared_stream("slots"))  # weeeeee
+    reels = outcome.reels
+    multiplier = outcome.multiplier
+    jackpot_whiff = outcome.jackpot_whiff
+
+    with phase("bank"):
+        if multiplier:
+            if multiplier == 1:
+                phrase = "Free spin"
+                balance = await bank.get_balance(author)
+            else:
+                phrase = f"**×{multiplier}**"
+                old_balance = await bank.get_balance(author)
+                winnings = bet * (multiplier - 1)
+                balance = old_balance + winnings
+                try:
+                    await bank.deposit_credits(author, winnings)
+                except errors.BalanceTooHigh as exc:
+                    await bank.set_balance(author, exc.max_balance)
+        else:
+            old_balance = await bank.get_balance(author)
+            await bank.withdraw_credits(author, bet)
+            balance = old_balance - bet
+            phrase = "*None*"
+
     # stats
-    statconfig = cog.config.user(author) if is_global else cog.config.member(author)
-    async with statconfig.all() as stats:
-        stats["slotcount"] += 1
-        stats["slotbetted"] += bet
-        if multiplier and multiplier > 0:
-            stats["slotprofit"] += bet * multiplier
-        if center_line[0] == center_line[1] == center_line[2]:
-            stats["slot3symbolcount"] += 1
-        elif center_line[0] == center_line[1] or center_line[1] == center_line[2]:
-            stats["slot2symbolcount"] += 1
-        if multiplier == 1:
-            stats["slotfreespincount"] += 1
-        elif multiplier and multiplier >= JACKPOT_AMOUNT:
-            stats["slotjackpotcount"] += 1
-        elif jackpot_whiff:
-            stats["slotjackpotwhiffcount"] += 1
+    with phase("stats"):
+        await cog.stats.add(await cog.stats_scope(ctx.guild), author.id, {
+            "slotcount": 1,
+            "slotbetted": bet,
+            "slotprofit": bet * multiplier,
+            "slot3symbolcount": int(outcome.has_three),
+            "slot2symbolcount": int(outcome.has_two and not outcome.has_three),
+            "slotfreespincount": int(multiplier == 1),
+            "slotjackpotcount": int(multiplier != 1 and multiplier >= JACKPOT_AMOUNT),
+            "slotjackpotwhiffcount": int(multiplier != 1 and multiplier < JACKPOT_AMOUNT and jackpot_whiff),
+        })
 
     embed = discord.Embed(title="Slot Machine", color=await cog.bot.get_embed_color(ctx.channel))
     embed.add_field(name="Bet", value=f"{humanize_number(bet)} {currency_name}")
@@ -143,42 +182,36 @@ async def slots(cog: BaseCasinoCog, ctx: Union[discord.Interaction, commands.Con
         elif jackpot_whiff:
             embed.title = "💀 So close..."
 
-    if interaction:
-        embed.description = first
-        await interaction.response.send_message(embed=embed, allowed_mentions=discord.AllowedMentions.none())
+    with phase("discord"):
+        if interaction:
+            embed.description = first
+            await interaction.response.send_message(embed=embed, allowed_mentions=discord.AllowedMentions.none())
+            bucket, message_key = interaction.id, interaction.id
+            edit_message = interaction.edit_original_response
+        else:
+            embed.description = first
+            message = await ctx.reply(embed=embed, allowed_mentions=discord.AllowedMentions.none())  # type: ignore
+            bucket, message_key = ctx.channel.id, message.id
+            edit_message = message.edit
+
+    # intermediate frames are dropped if the final one catches up with them while rate limited
+    with phase("animation"):
         await asyncio.sleep(1)
         embed.description = second
-        await interaction.edit_original_response(embed=embed)
+        cog.edits.submit(bucket, message_key, partial(edit_message, embed=embed.copy()))
         await asyncio.sleep(1)
         if reels[0][1] == reels[1][1]:
             await asyncio.sleep(0.5)  # extra suspense
-        embed.description = third
-        prepare_final_embed()
-        view = AgainView(cog.slot, bet, await interaction.original_response(), currency_name)
-        await interaction.edit_original_response(embed=embed, view=view)
-        # pin jackpots if possible
-        if multiplier and multiplier >= JACKPOT_AMOUNT:
-            try:
-                message = await interaction.original_response()
-                await asyncio.sleep(1)
-                await message.pin()
-            except discord.DiscordException:
-                pass
-    else:
-        embed.description = first
-        message = await ctx.reply(embed=embed, allowed_mentions=discord.AllowedMentions.none())  # type: ignore
-        await asyncio.sleep(1)
-        embed.description = second
-        await message.edit(embed=embed)
-        await asyncio.sleep(1)
-        embed.description = third
-        prepare_final_embed()
+    embed.description = third
+    prepare_final_embed()
+    with phase("discord"):
+        message = await interaction.original_response() if interaction else message
         view = AgainView(cog.slot, bet, message, currency_name)
-        await message.edit(embed=embed, view=view)
-        # pin jackpots if possible
-        if multiplier and multiplier >= JACKPOT_AMOUNT:
-            try:
-                await asyncio.sleep(1)
-                await message.pin()
-            except discord.DiscordException:
-                pass
+        await cog.edits.edit(bucket, message_key, partial(edit_message, embed=embed, view=view))
+    # pin jackpots if possible
+    if multiplier and multiplier >= JACKPOT_AMOUNT:
+        try:
+            await asyncio.sleep(1)
+            await message.pin()
+        except discord.DiscordException:
+            pass
@@ -0,0 +1,115 @@
+import time
+import argparse
+import numpy as np
+from itertools import product
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from simplecasino.slots import DOUBLE, JACKPOT_AMOUNT, OUTCOME_TABLES, PAYOUTS, TRIPLE, SlotMachine, exact_rtp, get_reel
+
+BATCH_SIZE = 10_000_000
+
+
+@dataclass
+class SlotSimResult:
+    easy: bool
+    coinfreespin: bool
+    spins: int
+    rtp: float  # average return per unit bet, including the bet itself
+    exact_rtp: float
+    variance: float
+    hit_rate: float  # spins that paid more than the bet
+    freespin_rate: float
+    jackpot_rate: float
+    whiff_rate: float
+    seconds: float
+
+    def summary(self) -> str:
+        return f"easy={self.easy} coinfreespin={self.coinfreespin}: {self.spins:,} spins in {self.seconds:.2f}s, " \
+               f"RTP {self.rtp:.4%} (exact {self.exact_rtp:.4%}), variance {self.variance:.2f}, hits {self.hit_rate:.3%}, free spins {self.freespin_rate:.3%}, " \
+               f"jackpots {self.jackpot_rate:.4%}, jackpot near-misses {self.whiff_rate:.4%}"
+
+
+def outcome_arrays(easy: bool, coinfreespin: bool) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Multiplier, jackpot and near-miss flags for every reel offset triple, indexed like the outcome tables."""
+    outcomes = OUTCOME_TABLES[easy, coinfreespin]
+    multipliers = np.array([o.multiplier for o in outcomes], dtype=np.int64)
+    whiffs = np.array([o.jackpot_whiff for o in outcomes], dtype=bool)
+    return multipliers, multipliers >= JACKPOT_AMOUNT, whiffs
+
+
+def simulate_slots(spins: int, easy: bool, coinfreespin: bool, seed: Optional[int] = None) -> SlotSimResult:
+    """Plays the given amount of random spins in batches and reports the results."""
+    start = time.perf_counter()
+    size = len(get_reel(easy))
+    multipliers, jackpots, whiffs = outcome_arrays(easy, coinfreespin)
+    rng = np.random.default_rng(seed)
+    counts = np.zeros(size ** 3, dtype=np.int64)
+    remaining = spins
+    while remaining > 0:
+        batch = min(remaining, BATCH_SIZE)
+        offsets = rng.integers(0, size, size=(3, batch), dtype=np.int32)
+        counts += np.bincount((offsets[0] * size + offsets[1]) * size + offsets[2], minlength=size ** 3)
+        remaining -= batch
+
+    mean = float(counts @ multipliers) / spins
+    return SlotSimResult(
+        easy=easy,
+        coinfreespin=coinfreespin,
+        spins=spins,
+        rtp=mean,
+        exact_rtp=exact_rtp(easy, coinfreespin),
+        variance=float(counts @ (multipliers ** 2)) / spins - mean ** 2,
+        hit_rate=float(counts[multipliers > 1].sum()) / spins,
+        freespin_rate=float(counts[multipliers == 1].sum()) / spins,
+        jackpot_rate=float(counts[jackpots].sum()) / spins,
+        whiff_rate=float(counts[whiffs & ~jackpots].sum()) / spins,
+        seconds=time.perf_counter() - start,
+    )
+
+
+def simulate_all(spins: int, seed: Optional[int] = None) -> List[SlotSimResult]:
+    return [simulate_slots(spins, easy, coinfreespin, seed) for easy, coinfreespin in product((False, True), repeat=2)]
+
+
+def validate_payouts() -> List[str]:
+    """Returns a list of problems with the payout table, if any."""
+    problems: List[str] = []
+    easy_reel = get_reel(True)
+    for key, multiplier in PAYOUTS.items():
+        if not isinstance(multiplier, int) or multiplier < 2:
+            problems.append(f"Payout for {key} should be an integer multiplier of at least 2, not {multiplier}")
+        if key in (TRIPLE, DOUBLE):
+            continue
+        if not isinstance(key, tuple) or len(key) not in (2, 3) or not all(isinstance(s, SlotMachine) for s in key):
+            problems.append(f"Payout key {key} should be a tuple of 2 or 3 symbols")
+            continue
+        if len(set(key)) != 1:
+            problems.append(f"Payout key {key} should repeat a single symbol")
+        if any(s not in easy_reel for s in key):
+            problems.append(f"Payout key {key} can't be hit when sloteasy is enabled")
+        pair = key[:2]
+        if len(key) == 3 and pair in PAYOUTS and PAYOUTS[pair] >= multiplier:
+            problems.append(f"Payout for {key} should be higher than for {pair}")
+    if PAYOUTS.get(TRIPLE, 0) <= PAYOUTS.get(DOUBLE, 0):
+        problems.append("Generic 3 symbol payout should be higher than the 2 symbol payout")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the slot machine and report its return to player.")
+    parser.add_argument("spins", type=int, nargs="?", default=100_000_000)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    for problem in validate_payouts():
+        print(f"Warning: {problem}")
+    total_spins, total_seconds = 0, 0.0
+    for result in simulate_all(args.spins, args.seed):
+        print(result.summary())
+        total_spins += result.spins
+        total_seconds += result.seconds
+    print(f"{total_spins / total_seconds * 60:,.0f} spins per minute")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from simplecasino.card import CARDS, Card, Deck
+
+# Saved poker games are packed into a compact binary snapshot, stored in config as base64.
+# Cards are single bytes (their id), integers are little-endian, and an optional value
+# is written with a preceding presence byte. Reading a snapshot that was cut off or damaged raises a ValueError.
+
+SNAPSHOT_VERSION = 3  # version 2 added the moves of the hand, version 3 the session of hands at the table
+
+_U8 = struct.Struct("<B")
+_I64 = struct.Struct("<q")
+_U64 = struct.Struct("<Q")
+_F64 = struct.Struct("<d")
+
+
+class SnapshotWriter:
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def u8(self, value: int) -> None:
+        self.buffer += _U8.pack(value)
+
+    def i64(self, value: int) -> None:
+        self.buffer += _I64.pack(value)
+
+    def u64(self, value: int) -> None:
+        self.buffer += _U64.pack(value)
+
+    def f64(self, value: float) -> None:
+        self.buffer += _F64.pack(value)
+
+    def optional_u8(self, value: Optional[int]) -> None:
+        self.u8(value is not None)
+        if value is not None:
+            self.u8(value)
+
+    def optional_u64(self, value: Optional[int]) -> None:
+        self.u8(value is not None)
+        if value is not None:
+            self.u64(value)
+
+    def optional_f64(self, value: Optional[float]) -> None:
+        self.u8(value is not None)
+        if value is not None:
+            self.f64(value)
+
+    def cards(self, cards: Iterable[Card]) -> None:
+        ids = bytes(c.id for c in cards)
+        self.u8(len(ids))
+        self.buffer += ids
+
+    def deck(self, deck: Deck) -> None:
+        self.u8(len(deck.ids))
+        self.buffer += deck.ids.tobytes()
+        self.u8(deck.size)
+
+    def balances(self, balances: Dict[int, int]) -> None:
+        self.u8(len(balances))
+        for user_id, balance in balances.items():
+            self.u64(user_id)
+            self.i64(balance)
+
+    def moves(self, moves: List[Tuple[int, int, int, int]]) -> None:
+        self.u64(len(moves))
+        for seat, move, bet, balance in moves:
+            self.u8(seat)
+            self.u8(move)
+            self.i64(bet)
+            self.i64(balance)
+
+    def getvalue(self) -> bytes:
+        return bytes(self.buffer)
+
+
+class SnapshotReader:
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def _unpack(self, fmt: struct.Struct):
+        try:
+            value = fmt.unpack_from(self.data, self.offset)[0]
+        except struct.error:
+            raise ValueError("Snapshot is truncated") from None
+        self.offset += fmt.size
+        return value
+
+    def u8(self) -> int:
+        return self._unpack(_U8)
+
+    def i64(self) -> int:
+        return self._unpack(_I64)
+
+    def u64(self) -> int:
+        return self._unpack(_U64)
+
+    def f64(self) -> float:
+        return self._unpack(_F64)
+
+    def flag(self) -> bool:
+        value = self.u8()
+        if value > 1:
+            raise ValueError(f"Snapshot has a flag of {value}")
+        return bool(value)
+
+    def optional_u8(self) -> Optional[int]:
+        return self.u8() if self.flag() else None
+
+    def optional_u64(self) -> Optional[int]:
+        return self.u64() if self.flag() else None
+
+    def optional_f64(self) -> Optional[float]:
+        return self.f64() if self.flag() else None
+
+    def _bytes(self, count: int) -> bytes:
+        if self.offset + count > len(self.data):
+            raise ValueError("Snapshot is truncated")
+        value = bytes(self.data[self.offset:self.offset + count])
+        self.offset += count
+        return value
+
+    def _card_ids(self) -> bytes:
+        ids = self._bytes(self.u8())
+        if any(cid >= len(CARDS) for cid in ids):
+            raise ValueError("Snapshot has an unknown card")
+        return ids
+
+    def cards(self) -> List[Card]:
+        return [CARDS[cid] for cid in self._card_ids()]
+
+    def deck(self) -> Deck:
+        ids = self._card_ids()
+        size = self.u8()
+        if size > len(ids):
+            raise ValueError("Snapshot has more cards left in the deck than the deck has")
+        return Deck(ids, size)
+
+    def balances(self) -> Dict[int, int]:
+        return {self.u64(): self.i64() for _ in range(self.u8())}
+
+    def moves(self) -> List[Tuple[int, int, int, int]]:
+        return [(self.u8(), self.u8(), self.i64(), self.i64()) for _ in range(self.u64())]
+
+    def end(self) -> None:
+        if self.offset != len(self.data):
+            raise ValueError("Snapshot has trailing data")
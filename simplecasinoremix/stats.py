@@ -0,0 +1,197 @@
+import json
+import asyncio
+import logging
+import aiofiles
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from redbot.core import Config
+
+from simplecasino.leaderboard import Leaderboard
+
+log = logging.getLogger("red.crab-cogs.simplecasino.stats")
+
+STATS_FLUSH_INTERVAL = 30  # seconds
+GLOBAL_SCOPE = 0  # stats are per user instead of per member when the bank is global
+
+StatsKey = Tuple[int, int]  # scope (guild id or GLOBAL_SCOPE), user id
+
+
+class StatsAggregator:
+    """
+    Collects stat increments in memory and adds them to config in batches, instead of rewriting
+    a member's whole stats document after every game. Each increment is also appended to a journal file
+    first, so that pending stats survive a crash and are applied the next time the cog loads.
+    A batch being flushed is kept in its own file, where each user is marked once their stats are written,
+    so that a crash partway through only applies the rest of the batch again.
+    """
+
+    def __init__(self, config: Config, journal_path: Path, interval: float = STATS_FLUSH_INTERVAL):
+        self.config = config
+        self.journal_path = journal_path
+        self.flushing_path = journal_path.with_suffix(".flushing")
+        self.interval = interval
+        self.pending: Dict[StatsKey, Dict[str, int]] = {}
+        self.flushing: Dict[StatsKey, Dict[str, int]] = {}  # the batch being flushed, minus what's already written
+        self.leaderboard = Leaderboard()
+        self.journal = None
+        self.lock = asyncio.Lock()  # guards pending and the journal
+        self.flush_lock = asyncio.Lock()
+        self.write_lock = asyncio.Lock()  # held while a user's stats move from the batch into config
+        self.task: Optional[asyncio.Task] = None
+        self.increments = 0  # increments added this session
+        self.writes = 0  # config documents written this session
+
+    def group(self, scope: int, user_id: int):
+        if scope == GLOBAL_SCOPE:
+            return self.config.user_from_id(user_id)
+        return self.config.member_from_ids(scope, user_id)
+
+    async def start(self) -> None:
+        """Applies stats left in the journal by a previous session, then starts flushing periodically."""
+        for path in (self.flushing_path, self.journal_path):
+            if path.exists():
+                await self.replay(path)
+        await self.build_leaderboard()
+        await self.flush()
+        self.task = asyncio.create_task(self.run())
+
+    async def replay(self, path: Path) -> None:
+        count = 0
+        batch: Dict[StatsKey, Dict[str, int]] = {}
+        async with aiofiles.open(path, "r", encoding="utf-8") as fp:
+            async for line in fp:
+                try:
+                    scope, user_id, increments = json.loads(line)
+                except ValueError:  # the last line may have been cut off mid-write
+                    log.warning(f"Skipping a malformed line in {path.name}")
+                    continue
+                if increments is None:  # already written to config
+                    batch.pop((scope, user_id), None)
+                    continue
+                totals = batch.setdefault((scope, user_id), {})
+                for stat, amount in increments.items():
+                    totals[stat] = totals.get(stat, 0) + amount
+                count += 1
+        for key, increments in batch.items():
+            self.merge(key, increments)
+        if count:
+            log.info(f"Recovered {count} unsaved stat updates from {path.name}")
+
+    async def build_leaderboard(self) -> None:
+        for user_id, stats in (await self.config.all_users()).items():
+            self.leaderboard.update(GLOBAL_SCOPE, user_id, stats)
+        for guild_id, members in (await self.config.all_members()).items():
+            for user_id, stats in members.items():
+                self.leaderboard.update(guild_id, user_id, stats)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                log.error("Failed to save casino stats", exc_info=True)
+
+    def merge(self, key: StatsKey, increments: Dict[str, int]) -> None:
+        pending = self.pending.setdefault(key, {})
+        for stat, amount in increments.items():
+            pending[stat] = pending.get(stat, 0) + amount
+
+    async def add(self, scope: int, user_id: int, increments: Dict[str, int]) -> None:
+        increments = {stat: amount for stat, amount in increments.items() if amount}
+        if not increments:
+            return
+        async with self.lock:
+            await self.append(scope, user_id, increments)
+            self.leaderboard.add(scope, user_id, increments)
+            self.increments += 1
+
+    async def append(self, scope: int, user_id: int, increments: Dict[str, int]) -> None:
+        if self.journal is None:
+            self.journal = await aiofiles.open(self.journal_path, "a", encoding="utf-8")
+        await self.journal.write(json.dumps([scope, user_id, increments]) + "\n")
+        await self.journal.flush()
+        self.merge((scope, user_id), increments)
+
+    async def get(self, scope: int, user_id: int) -> Dict[str, int]:
+        """Saved stats with any pending or unwritten increments added on top."""
+        async with self.write_lock:
+            stats = await self.group(scope, user_id).all()
+            for batch in (self.flushing, self.pending):
+                for stat, amount in batch.get((scope, user_id), {}).items():
+                    stats[stat] = stats.get(stat, 0) + amount
+        return stats
+
+    async def save_batch(self) -> None:
+        """Replaces the batch file with the batch being flushed, along with the journal it came from."""
+        temp_path = self.flushing_path.with_suffix(".tmp")
+        async with aiofiles.open(temp_path, "w", encoding="utf-8") as fp:
+            await fp.write("".join(json.dumps([scope, user_id, increments]) + "\n"
+                                   for (scope, user_id), increments in self.flushing.items()))
+        temp_path.replace(self.flushing_path)
+        self.journal_path.unlink(missing_ok=True)
+
+    async def flush(self) -> None:
+        """Adds all pending increments to config, one write per user."""
+        async with self.flush_lock:
+            async with self.lock:
+                for key, increments in self.flushing.items():  # left by a flush that was cancelled
+                    self.merge(key, increments)
+                if not self.pending:
+                    return
+                self.flushing, self.pending = self.pending, {}
+                # new increments go to a fresh journal while this batch is being written
+                if self.journal is not None:
+                    await self.journal.close()
+                    self.journal = None
+                try:
+                    await self.save_batch()
+                except Exception:
+                    self.pending, self.flushing = self.flushing, {}
+                    raise
+            try:
+                async with aiofiles.open(self.flushing_path, "a", encoding="utf-8") as marks:
+                    for scope, user_id in list(self.flushing):
+                        async with self.write_lock:
+                            async with self.group(scope, user_id).all() as stats:
+                                for stat, amount in self.flushing[scope, user_id].items():
+                                    stats[stat] = stats.get(stat, 0) + amount
+                                totals = dict(stats)
+                            del self.flushing[scope, user_id]
+                        # only a crash between the config write and this mark applies the user's stats twice
+                        await marks.write(json.dumps([scope, user_id, None]) + "\n")
+                        await marks.flush()
+                        for stat, amount in self.pending.get((scope, user_id), {}).items():  # added since the flush began
+                            totals[stat] = totals.get(stat, 0) + amount
+                        self.leaderboard.update(scope, user_id, totals)
+                        self.writes += 1
+            except Exception:
+                # keep what wasn't written for the next flush
+                async with self.lock:
+                    for (scope, user_id), increments in self.flushing.items():
+                        await self.append(scope, user_id, increments)
+                    self.flushing = {}
+                raise
+            finally:
+                if not self.flushing:
+                    self.flushing_path.unlink(missing_ok=True)
+
+    async def delete_user(self, user_id: int) -> None:
+        """Saves what's pending first, so that no stats of the user come back from the journal, then clears them in every scope."""
+        await self.flush()
+        async with self.write_lock:
+            await self.config.user_from_id(user_id).clear()
+            for guild_id, members in (await self.config.all_members()).items():
+                if user_id in members:
+                    await self.config.member_from_ids(guild_id, user_id).clear()
+            self.leaderboard = Leaderboard()
+            await self.build_leaderboard()
+
+    async def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await self.flush()
+        if self.journal is not None:
+            await self.journal.close()
+            self.journal = None
@@ -0,0 +1,261 @@
+import threading
+from enum import Enum
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from simplecasino.blackjackcore import DEALER_STAND, TWENTYONE
+from simplecasino.card import Card, CardValue
+
+# Expected values of blackjack decisions under this cog's rules: the dealer stands on any 17,
+# doesn't peek for blackjack, naturals pay 3:2, any two cards can be doubled, split hands can be doubled
+# but not split again, and a split 21 isn't a natural. Values are in units of the hand's bet.
+#
+# A shoe is described by how many cards of each rank are left, aces first and every ten-valued card
+# counted together, and values are calculated by recursion over what could be drawn from it.
+# An infinite shoe never changes as cards are drawn, so its values are the same for every hand and are precomputed.
+# Following every card out of a finite shoe takes seconds for some hands, so hints only take out the first two
+# cards drawn. That keeps every hint under 0.4s with one deck and 0.15s with more, and changes the values
+# by under a tenth of a percent with eight decks and by up to about one percent with a single deck.
+
+INFINITE = None
+HINT_DEPTH = 2  # cards drawn before the shoe stops changing, in hints
+
+Counts = Optional[Tuple[int, ...]]  # cards left of ranks 1 to 10, or INFINITE
+DealerOutcomes = Tuple[float, ...]  # chance of the dealer ending on 17, 18, 19, 20, 21, busting, or having a natural
+
+_INFINITE_PROBABILITIES = tuple(4 / 13 if rank == 10 else 1 / 13 for rank in range(1, 11))
+
+
+class Action(Enum):
+    STAND = "Stand"
+    HIT = "Hit"
+    DOUBLE = "Double"
+    SPLIT = "Split"
+
+
+CHART_LETTERS = {Action.STAND: "S", Action.HIT: "H", Action.DOUBLE: "D", Action.SPLIT: "P"}
+
+
+def card_rank(card: Card) -> int:
+    return 1 if card.value is CardValue.ACE else card.blackjack_value
+
+
+def shoe_counts(decks: int) -> Tuple[int, ...]:
+    return tuple([4 * decks] * 9 + [16 * decks])
+
+
+def add_card(total: int, soft: bool, rank: int) -> Tuple[int, bool]:
+    """Adds a card to a hand total, where a soft total counts an ace as 11."""
+    if rank == 1 and total + 11 <= TWENTYONE:
+        return total + 11, True
+    total += rank
+    if total > TWENTYONE and soft:
+        return total - 10, False
+    return total, soft
+
+
+def hand_total(ranks: Iterable[int]) -> Tuple[int, bool]:
+    total, soft = 0, False
+    for rank in ranks:
+        total, soft = add_card(total, soft, rank)
+    return total, soft
+
+
+class Analyzer:
+    """Memoized expected values for one shoe, shared by every decision made from it."""
+
+    def __init__(self, counts: Counts = INFINITE, depth: Optional[int] = None):
+        self.counts = counts
+        self.depth = depth
+        self._dealer: Dict[tuple, DealerOutcomes] = {}
+        self._stand: Dict[tuple, float] = {}
+        self._hit: Dict[tuple, float] = {}
+
+    def draws(self, counts: Counts) -> List[Tuple[int, float, Counts]]:
+        """
+        Each rank that can be drawn, its chance, and the shoe left after drawing it.
+        Past the depth, drawn cards stop being taken out of the shoe, which keeps the recursion small.
+        """
+        if counts is INFINITE:
+            return [(rank, p, INFINITE) for rank, p in zip(range(1, 11), _INFINITE_PROBABILITIES)]
+        left = sum(counts)
+        if self.depth is not None and self.counts is not INFINITE and sum(self.counts) - left >= self.depth:
+            return [(i + 1, count / left, counts) for i, count in enumerate(counts) if count]
+        result = []
+        for i, count in enumerate(counts):
+            if count:
+                after = counts[:i] + (count - 1,) + counts[i+1:]
+                result.append((i + 1, count / left, after))
+        return result
+
+    def dealer(self, total: int, soft: bool, cards: int, counts: Counts) -> DealerOutcomes:
+        key = (total, soft, cards, counts)
+        if key in self._dealer:
+            return self._dealer[key]
+        if total > TWENTYONE:
+            outcomes = (0, 0, 0, 0, 0, 1, 0)
+        elif cards == 2 and total == TWENTYONE:
+            outcomes = (0, 0, 0, 0, 0, 0, 1)
+        elif total >= DEALER_STAND:
+            outcomes = tuple(1 if total == final else 0 for final in range(DEALER_STAND, TWENTYONE + 1)) + (0, 0)
+        else:
+            result = [0.0] * 7
+            for rank, p, after in self.draws(counts):
+                for i, q in enumerate(self.dealer(*add_card(total, soft, rank), cards + 1, after)):
+                    result[i] += p * q
+            outcomes = tuple(result)
+        self._dealer[key] = outcomes
+        return outcomes
+
+    def dealer_outcomes(self, upcard: int, counts: Counts) -> DealerOutcomes:
+        return self.dealer(*add_card(0, False, upcard), 1, counts)
+
+    def stand(self, total: int, upcard: int, counts: Counts) -> float:
+        key = (total, upcard, counts)
+        if key in self._stand:
+            return self._stand[key]
+        if total > TWENTYONE:
+            value = -1.0
+        else:
+            outcomes = self.dealer_outcomes(upcard, counts)
+            value = outcomes[5] - (outcomes[6] if total < TWENTYONE else 0)
+            for final, p in zip(range(DEALER_STAND, TWENTYONE + 1), outcomes):
+                value += p if total > final else -p if total < final else 0
+        self._stand[key] = value
+        return value
+
+    def hit(self, total: int, soft: bool, upcard: int, counts: Counts) -> float:
+        """The value of hitting and then playing on as well as possible."""
+        key = (total, soft, upcard, counts)
+        if key in self._hit:
+            return self._hit[key]
+        value = 0.0
+        for rank, p, after in self.draws(counts):
+            new_total, new_soft = add_card(total, soft, rank)
+            if new_total > TWENTYONE:
+                value -= p
+            elif new_total == TWENTYONE:  # the game stands on 21 automatically
+                value += p * self.stand(new_total, upcard, after)
+            else:
+                value += p * max(self.stand(new_total, upcard, after), self.hit(new_total, new_soft, upcard, after))
+        self._hit[key] = value
+        return value
+
+    def double(self, total: int, soft: bool, upcard: int, counts: Counts) -> float:
+        return 2 * sum(p * self.stand(add_card(total, soft, rank)[0], upcard, after) for rank, p, after in self.draws(counts))
+
+    def split(self, rank: int, upcard: int, counts: Counts) -> float:
+        """Both hands have the same expected value, each starts with one of the pair and gets a new card."""
+        value = 0.0
+        for drawn, p, after in self.draws(counts):
+            total, soft = hand_total((rank, drawn))
+            if total == TWENTYONE:
+                value += p * self.stand(total, upcard, after)
+            else:
+                value += p * max(self.stand(total, upcard, after), self.hit(total, soft, upcard, after), self.double(total, soft, upcard, after))
+        return 2 * value
+
+    def actions(self, ranks: Sequence[int], upcard: int, counts: Counts, can_double: bool, can_split: bool) -> Dict[Action, float]:
+        """The expected value of every available action for a hand, given the shoe without the visible cards."""
+        total, soft = hand_total(ranks)
+        values = {Action.STAND: self.stand(total, upcard, counts)}
+        if total < TWENTYONE:
+            values[Action.HIT] = self.hit(total, soft, upcard, counts)
+            if can_double:
+                values[Action.DOUBLE] = self.double(total, soft, upcard, counts)
+            if can_split:
+                values[Action.SPLIT] = self.split(ranks[0], upcard, counts)
+        return values
+
+    def round_value(self) -> float:
+        """The expected value of a whole round played perfectly, which is minus the house edge."""
+        value = 0.0
+        for first, p1, after1 in self.draws(self.counts):
+            for upcard, p2, after2 in self.draws(after1):
+                for second, p3, after3 in self.draws(after2):
+                    total, _ = hand_total((first, second))
+                    if total == TWENTYONE:  # natural, the dealer only ties it with another natural
+                        dealer_natural = self.dealer_outcomes(upcard, after3)[6]
+                        value += p1 * p2 * p3 * 1.5 * (1 - dealer_natural)
+                    else:
+                        value += p1 * p2 * p3 * max(self.actions((first, second), upcard, after3, True, first == second).values())
+        return value
+
+
+_lock = threading.Lock()
+_infinite: Optional[Analyzer] = None
+STRATEGY_TABLES: Dict[str, Dict[Tuple[int, int], Action]] = {}  # best action by table, then (player total or pair rank, upcard)
+
+
+def infinite_analyzer() -> Analyzer:
+    if _infinite is None:
+        load_strategy()
+    assert _infinite is not None
+    return _infinite
+
+
+def load_strategy() -> None:
+    """Precomputes the infinite shoe values and the basic strategy tables. Only does work the first time it's called."""
+    global _infinite
+    with _lock:
+        if _infinite is not None:
+            return
+        analyzer = Analyzer(INFINITE)
+        hard: Dict[Tuple[int, int], Action] = {}
+        soft: Dict[Tuple[int, int], Action] = {}
+        pairs: Dict[Tuple[int, int], Action] = {}
+        for upcard in range(1, 11):
+            for total in range(5, TWENTYONE):
+                ranks = (2, total - 2) if total <= 11 else (10, total - 10)
+                values = analyzer.actions(ranks, upcard, INFINITE, True, False)
+                hard[total, upcard] = max(values, key=values.__getitem__)
+            for other in range(2, 10):
+                values = analyzer.actions((1, other), upcard, INFINITE, True, False)
+                soft[11 + other, upcard] = max(values, key=values.__getitem__)
+            for rank in range(1, 11):
+                values = analyzer.actions((rank, rank), upcard, INFINITE, True, True)
+                pairs[rank, upcard] = max(values, key=values.__getitem__)
+        STRATEGY_TABLES.update(hard=hard, soft=soft, pairs=pairs)
+        _infinite = analyzer
+
+
+def advise(hand: Sequence[Card], upcard: Card, seen: Iterable[Card], decks: Optional[int], can_double: bool, can_split: bool) -> Dict[Action, float]:
+    """
+    The expected value of every available action for a hand. With a number of decks, only the cards seen this round
+    are taken out of the shoe, so that the advice never depends on the dealer's hidden card,
+    and after HINT_DEPTH more cards are drawn the rest are drawn from the same shoe.
+    """
+    ranks = tuple(card_rank(card) for card in hand)
+    seen_ranks = tuple(sorted(card_rank(card) for card in seen)) if decks is not None else ()
+    return _advise(ranks, card_rank(upcard), seen_ranks, decks, can_double, can_split)
+
+
+@lru_cache(maxsize=1024)
+def _advise(ranks: Tuple[int, ...], upcard: int, seen: Tuple[int, ...], decks: Optional[int], can_double: bool, can_split: bool) -> Dict[Action, float]:
+    if decks is None:
+        return infinite_analyzer().actions(ranks, upcard, INFINITE, can_double, can_split)
+    counts = list(shoe_counts(decks))
+    for rank in seen:
+        counts[rank - 1] -= 1
+    return Analyzer(tuple(counts), HINT_DEPTH).actions(ranks, upcard, tuple(counts), can_double, can_split)
+
+
+def strategy_chart() -> str:
+    """The basic strategy for an infinite shoe, as text for a code block."""
+    infinite_analyzer()
+    header = "      " + " ".join(f"{'A' if upcard == 1 else upcard:>2}" for upcard in (*range(2, 11), 1))
+    lines = [header]
+    for name, table, rows in (("Hard", "hard", range(8, 18)),
+                              ("Soft", "soft", range(13, 21)),
+                              ("Pair", "pairs", (*range(2, 11), 1))):
+        lines.append(name)
+        for row in rows:
+            label = ("A" if row == 1 else str(row)) if table == "pairs" else str(row)
+            cells = " ".join(f"{CHART_LETTERS[STRATEGY_TABLES[table][row, upcard]]:>2}" for upcard in (*range(2, 11), 1))
+            lines.append(f"{label:>4}  {cells}")
+    return "\n".join(lines)
+
+
+def house_edge() -> float:
+    """The house edge against perfect play from an infinite shoe, as a fraction of the initial bet."""
+    return -infinite_analyzer().round_value()
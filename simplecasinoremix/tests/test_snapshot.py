@@ -0,0 +1,161 @@
+import json
+import random
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+from simplecasino.poker import PokerGame
+from simplecasino.rng import RngService
+from simplecasino.utils import PlayerType
+
+# Round trips of random poker games through the binary snapshot, and what happens to snapshots that were cut off or damaged.
+
+GAMES = 200
+
+
+def new_game(seed: int, players: List[int] = (), minimum_bet: int = 0) -> PokerGame:
+    cog = SimpleNamespace(rng=RngService(seed))
+    channel = SimpleNamespace(id=seed + 1000)
+    return PokerGame(cog, [SimpleNamespace(id=uid) for uid in players], channel, minimum_bet)
+
+
+def random_game(seed: int) -> PokerGame:
+    """A game with random players, played for a random number of random moves, sometimes into a later hand."""
+    rng = random.Random(seed)
+    players = rng.sample(range(1, 9), rng.randint(0, 2)) + [rng.randrange(10**17, 10**18) for _ in range(rng.randint(2, 6))]
+    rng.shuffle(players)
+    game = new_game(seed, players, rng.choice((10, 50, 100, 2500)))
+    if rng.random() < 0.1:
+        return game  # still waiting for players
+    balances = {uid: rng.randint(game.minimum_bet * 2, game.minimum_bet * 200) for uid in players}
+    game.apply_start_hand(balances)
+    for _ in range(rng.randint(0, 60)):
+        if game.all_hands_finished:
+            if rng.random() < 0.5:
+                break
+            game.apply_next_hand([], rng)
+            game.apply_start_hand(balances)
+            continue
+        player = game.current_player()
+        if player is None:
+            break
+        roll = rng.random()
+        if roll < 0.15:
+            game.apply_fold(player.id)
+        elif roll < 0.55 and game.can_check:
+            game.apply_check(player.id)
+        else:
+            bet = game.current_bet + rng.choice((0, 0, game.minimum_bet, game.minimum_bet * rng.randint(2, 20)))
+            game.apply_bet(player.id, bet, balances[player.id])
+    for player in game.players:
+        if rng.random() < 0.2:
+            player.allin_equity = rng.random()
+    if game.players and rng.random() < 0.5:
+        game.message = SimpleNamespace(id=rng.randrange(10**17, 10**18))
+    return game
+
+
+def restore(seed: int, data: bytes) -> PokerGame:
+    """Unpacks a snapshot the way a saved game is loaded, with its message."""
+    game = new_game(seed)
+    message_id = game.unpack_state(data)
+    if message_id:
+        game.message = SimpleNamespace(id=message_id)
+    return game
+
+
+def player_dicts(game: PokerGame) -> List[dict]:
+    return [player.to_dict(encode_json=True) for player in game.players]
+
+
+@pytest.mark.parametrize("seed", range(GAMES))
+def test_round_trip(seed: int):
+    game = random_game(seed)
+    data = game.pack_state()
+    restored = restore(seed, data)
+    assert (restored.message and restored.message.id) == (game.message and game.message.id)
+    assert restored.pack_state() == data
+    assert player_dicts(restored) == player_dicts(game)
+    assert restored.players_ids == game.players_ids
+    assert restored.table == game.table
+    assert list(restored.deck.ids) == list(game.deck.ids) and restored.deck.size == game.deck.size
+    assert (restored.state, restored.turn, restored.pot, restored.current_bet, restored.minimum_bet) == \
+           (game.state, game.turn, game.pot, game.current_bet, game.minimum_bet)
+    assert restored.all_hands_finished == game.all_hands_finished
+    assert restored.moves == game.moves
+    assert restored.start_balances == game.start_balances
+    assert (restored.session_hand, restored.session_nets) == (game.session_hand, game.session_nets)
+
+
+@pytest.mark.parametrize("seed", range(0, GAMES, 10))
+def test_truncated(seed: int):
+    data = random_game(seed).pack_state()
+    for length in range(len(data)):
+        with pytest.raises(ValueError):
+            new_game(seed).unpack_state(data[:length])
+
+
+@pytest.mark.parametrize("seed", range(0, GAMES, 10))
+def test_trailing_data(seed: int):
+    data = random_game(seed).pack_state()
+    with pytest.raises(ValueError):
+        new_game(seed).unpack_state(data + b"\0")
+
+
+@pytest.mark.parametrize("seed", range(GAMES))
+def test_corrupt(seed: int):
+    """A damaged snapshot either fails to load with a ValueError, or loads into a game that saves the same way."""
+    rng = random.Random(seed)
+    data = bytearray(random_game(seed).pack_state())
+    for _ in range(rng.randint(1, 4)):
+        data[rng.randrange(len(data))] = rng.randrange(256)
+    try:
+        restored = restore(seed, bytes(data))
+    except ValueError:
+        return
+    assert restored.pack_state() == bytes(data)
+
+
+def test_unknown_version():
+    data = random_game(0).pack_state()
+    with pytest.raises(ValueError):
+        new_game(0).unpack_state(bytes([0]) + data[1:])
+    with pytest.raises(ValueError):
+        new_game(0).unpack_state(bytes([255]) + data[1:])
+
+
+@pytest.mark.parametrize("seed", range(0, GAMES, 5))
+def test_legacy_layout(seed: int):
+    """Games saved as JSON before snapshots existed keep their players, cards and the cards left in the deck."""
+    game = random_game(seed)
+    for player in game.players:
+        player.allin_equity = None  # not part of the JSON layout
+    config = {
+        "players": json.dumps(player_dicts(game)),
+        "table": json.dumps([c.to_dict(encode_json=True) for c in game.table]),
+        "deck": json.dumps([c.to_dict(encode_json=True) for c in game.deck]),
+        "state": int(game.state),
+        "minimum_bet": game.minimum_bet,
+        "current_bet": game.current_bet,
+        "pot": game.pot,
+        "turn": game.turn,
+        "finished": game.all_hands_finished,
+        "message": game.message.id if game.message else None,
+    }
+    restored = new_game(seed)
+    message_id = restored.unpack_legacy_state(json.loads(json.dumps(config)))
+    assert message_id == config["message"]
+    for player in game.players:
+        player.type = PlayerType(min(player.index, PlayerType.Normal.value))  # the JSON layout lost the blinds of two players
+    assert player_dicts(restored) == player_dicts(game)
+    assert restored.players_ids == game.players_ids
+    assert restored.table == game.table
+    assert list(restored.deck) == list(game.deck)
+    assert (restored.state, restored.turn, restored.pot, restored.current_bet, restored.minimum_bet) == \
+           (game.state, game.turn, game.pot, game.current_bet, game.minimum_bet)
+    assert restored.all_hands_finished == game.all_hands_finished
+    # and it's saved in the new format from then on
+    again = restore(seed, restored.pack_state())
+    assert player_dicts(again) == player_dicts(game)
+
@@ -0,0 +1,399 @@
+import time
+import random
+import asyncio
+import logging
+import discord
+from enum import IntEnum
+from datetime import datetime
+from math import ceil
+from typing import Any, Coroutine, Dict, List, Optional, Set, Tuple
+
+from simplecasino.base import BaseCasinoCog
+from simplecasino.poker import PokerGame
+from simplecasino.pokercore import PokerPlayer
+from simplecasino.utils import POKER_MAX_PLAYERS
+
+log = logging.getLogger("red.crab-cogs.simplecasino.tournament")
+
+TOURNAMENT_STACK = 1500  # chips each player starts with
+TOURNAMENT_MAX_PLAYERS = 500
+BLIND_LEVELS = (20, 30, 40, 60, 80, 100, 150, 200, 300, 400, 600, 800, 1000, 1500, 2000, 3000, 4000, 6000, 8000, 10000)  # big blinds
+BLIND_LEVEL_TIME = 10 * 60  # seconds
+NEXT_HAND_DELAY = 10  # seconds between hands at a table, to see how the last one ended
+TURN_TIME_LIMIT = 90  # seconds before an idle player checks or folds automatically
+TICK = 5  # seconds between checks for blind levels and idle players
+PRIZE_SPLITS = (0.5, 0.3, 0.2)  # of the prize pool, by finishing place
+MIN_ENTRANTS_FOR_SPLIT = 6  # fewer than this and the winner takes it all
+
+
+class TournamentState(IntEnum):
+    Registering = 0
+    Running = 1
+    Finished = 2
+
+
+class Tournament:
+    """
+    A poker tournament in a guild, played at several tables at once with chips instead of currency.
+    Only the buy-ins and the prizes touch the bank. Stacks are as of each player's last finished hand,
+    so that a restart in the middle of a hand simply plays that hand on from its snapshot.
+    """
+
+    def __init__(self, guild_id: int, channel_id: int, host_id: int, buy_in: int):
+        self.guild_id = guild_id
+        self.channel_id = channel_id  # where it was announced, tables are threads in it
+        self.host_id = host_id
+        self.buy_in = buy_in
+        self.state = TournamentState.Registering
+        self.stacks: Dict[int, int] = {}  # of each player still in
+        self.seats: Dict[int, int] = {}  # table of each player still in
+        self.tables: List[int] = []
+        self.hands: Dict[int, int] = {}  # played at each table, to move the dealer button
+        self.eliminated: List[int] = []  # first to bust first
+        self.entrants = 0
+        self.level = 0
+        self.level_started = 0.0
+
+    @property
+    def big_blind(self) -> int:
+        return BLIND_LEVELS[min(self.level, len(BLIND_LEVELS) - 1)]
+
+    @property
+    def prize_pool(self) -> int:
+        return self.buy_in * self.entrants
+
+    def prizes(self) -> List[int]:
+        """Prize of each finishing place, first place first."""
+        splits = PRIZE_SPLITS if self.entrants >= MIN_ENTRANTS_FOR_SPLIT else (1.0,)
+        prizes = [int(self.prize_pool * split) for split in splits]
+        prizes[0] += self.prize_pool - sum(prizes)
+        return prizes
+
+    def standings(self) -> List[int]:
+        """Players by finishing place, with those still in ordered by their stacks."""
+        return sorted(self.stacks, key=self.stacks.__getitem__, reverse=True) + self.eliminated[::-1]
+
+    def players_at(self, table_id: int) -> List[int]:
+        return [user_id for user_id, seat in self.seats.items() if seat == table_id]
+
+    def register(self, user_id: int) -> None:
+        self.stacks[user_id] = TOURNAMENT_STACK
+
+    def unregister(self, user_id: int) -> None:
+        del self.stacks[user_id]
+
+    def start(self, table_ids: List[int], rng: random.Random) -> None:
+        """Seats the players at random, spread evenly between the tables."""
+        players = list(self.stacks)
+        rng.shuffle(players)
+        self.tables = list(table_ids)
+        self.seats = {user_id: self.tables[i % len(self.tables)] for i, user_id in enumerate(players)}
+        self.hands = {table_id: 0 for table_id in self.tables}
+        self.entrants = len(players)
+        self.state = TournamentState.Running
+        self.level = 0
+        self.level_started = time.time()
+
+    def tables_needed(self, players: int) -> int:
+        return max(1, ceil(players / POKER_MAX_PLAYERS))
+
+    def finish_hand(self, table_id: int, results: Dict[int, int]) -> List[int]:
+        """Applies what each player won or lost in a hand and returns who busted, those with fewer chips first."""
+        self.hands[table_id] = self.hands.get(table_id, 0) + 1
+        for user_id, net in results.items():
+            if user_id in self.stacks:
+                self.stacks[user_id] += net
+        busted = sorted((user_id for user_id in results if user_id in self.stacks and self.stacks[user_id] <= 0),
+                        key=lambda user_id: self.stacks[user_id] - results[user_id])
+        for user_id in busted:
+            self.eliminate(user_id)
+        return busted
+
+    def eliminate(self, user_id: int) -> None:
+        del self.stacks[user_id]
+        del self.seats[user_id]
+        self.eliminated.append(user_id)
+
+    def rebalance(self, table_id: int) -> Dict[int, int]:
+        """
+        Moves players away from a table that just finished a hand, the only one sure to be between hands.
+        The table is broken up if the players fit in fewer tables, otherwise it gives players to the smallest table
+        until they're even. Returns the new table of each player that moved.
+        """
+        moves: Dict[int, int] = {}
+        counts = {tid: 0 for tid in self.tables}
+        for seat in self.seats.values():
+            counts[seat] += 1
+        if len(self.tables) > self.tables_needed(len(self.stacks)):
+            self.tables.remove(table_id)
+            del counts[table_id]
+            for user_id in self.players_at(table_id):
+                target = min(self.tables, key=counts.__getitem__)
+                self.seats[user_id] = moves[user_id] = target
+                counts[target] += 1
+            return moves
+        while True:
+            target = min(self.tables, key=counts.__getitem__)
+            if counts[table_id] - counts[target] < 2:
+                return moves
+            user_id = self.players_at(table_id)[-1]
+            self.seats[user_id] = moves[user_id] = target
+            counts[table_id] -= 1
+            counts[target] += 1
+
+    def to_config(self) -> dict:
+        return {
+            "channel": self.channel_id,
+            "host": self.host_id,
+            "buy_in": self.buy_in,
+            "state": self.state.value,
+            "stacks": {str(user_id): stack for user_id, stack in self.stacks.items()},
+            "seats": {str(user_id): seat for user_id, seat in self.seats.items()},
+            "tables": self.tables,
+            "hands": {str(table_id): hands for table_id, hands in self.hands.items()},
+            "eliminated": self.eliminated,
+            "entrants": self.entrants,
+            "level": self.level,
+            "level_started": self.level_started,
+        }
+
+    @staticmethod
+    def from_config(guild_id: int, config: dict) -> "Tournament":
+        tournament = Tournament(guild_id, config["channel"], config["host"], config["buy_in"])
+        tournament.state = TournamentState(config["state"])
+        tournament.stacks = {int(user_id): stack for user_id, stack in config["stacks"].items()}
+        tournament.seats = {int(user_id): seat for user_id, seat in config["seats"].items()}
+        tournament.tables = config["tables"]
+        tournament.hands = {int(table_id): hands for table_id, hands in config["hands"].items()}
+        tournament.eliminated = config["eliminated"]
+        tournament.entrants = config["entrants"]
+        tournament.level = config["level"]
+        tournament.level_started = config["level_started"]
+        return tournament
+
+
+class TournamentTable(PokerGame):
+    """A hand at a tournament table. Bets come out of the player's chips, which are settled when the hand ends."""
+
+    @property
+    def tournament(self) -> Optional[Tournament]:
+        return self.cog.tournaments.tournaments.get(self.channel.guild.id)
+
+    def config_data(self) -> dict:
+        return {**super().config_data(), "tournament": self.channel.guild.id}
+
+    async def get_currency_name(self) -> str:
+        return "chips"
+
+    async def balance(self, player: PokerPlayer, fresh: bool = False) -> int:
+        tournament = self.tournament
+        return (tournament.stacks.get(player.id, 0) if tournament else 0) - player.total_betted
+
+    async def settle(self, transfers: Dict[int, int]) -> None:
+        pass  # chips, settled with the tournament when the hand ends
+
+    def on_hand_end(self) -> None:
+        self.cog.tournaments.hand_finished(self)
+
+    async def get_view(self) -> Optional[discord.ui.View]:
+        if self.is_finished:
+            return None  # the next hand starts by itself
+        return await super().get_view()
+
+
+class TournamentScheduler:
+    """
+    Runs the tables of every tournament. Each table plays its hands on its own, and the changes they cause
+    to their tournament are applied one at a time by a single worker, so a slow table never holds up the others.
+    """
+
+    def __init__(self, cog: BaseCasinoCog):
+        self.cog = cog
+        self.tournaments: Dict[int, Tournament] = {}  # by guild
+        self.queue: "asyncio.Queue[Tuple[int, int, Dict[int, int]]]" = asyncio.Queue()  # guild, table, results of a hand
+        self.scheduled: Set[int] = set()  # tables with a hand about to start
+        self.tasks: Set[asyncio.Task] = set()
+        self.worker: Optional[asyncio.Task] = None
+        self.ticker: Optional[asyncio.Task] = None
+
+    def is_table(self, channel_id: int) -> bool:
+        return any(channel_id in t.tables for t in self.tournaments.values() if t.state == TournamentState.Running)
+
+    async def load(self) -> None:
+        """Loads the tournaments from config, before the games at their tables are restored."""
+        for guild_id, conf in (await self.cog.config.all_guilds()).items():
+            if conf.get("tournament"):
+                try:
+                    self.tournaments[guild_id] = Tournament.from_config(guild_id, conf["tournament"])
+                except Exception:
+                    log.error(f"Loading tournament in {guild_id}", exc_info=True)
+
+    def start(self) -> None:
+        """Deals the next hand at the tables that were between hands, and starts processing results."""
+        for tournament in self.tournaments.values():
+            if tournament.state == TournamentState.Running:
+                self.schedule_idle_tables(tournament, 0)
+        self.worker = asyncio.create_task(self.run())
+        self.ticker = asyncio.create_task(self.tick())
+
+    async def close(self) -> None:
+        for task in (self.worker, self.ticker, *self.tasks):
+            if task is not None:
+                task.cancel()
+        self.tasks.clear()
+
+    def spawn(self, coro: Coroutine[Any, Any, Any]) -> None:
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.task_done)
+
+    def task_done(self, task: asyncio.Task) -> None:
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error("Tournament task failed", exc_info=task.exception())
+
+    async def save(self, tournament: Tournament) -> None:
+        conf = self.cog.config.guild_from_id(tournament.guild_id).tournament
+        if tournament.state == TournamentState.Finished:
+            await conf.set({})
+        else:
+            await conf.set(tournament.to_config())
+
+    def hand_finished(self, table: TournamentTable) -> None:
+        results = {p.id: p.winnings - p.total_betted for p in table.players}
+        self.queue.put_nowait((table.channel.guild.id, table.channel.id, results))
+
+    async def run(self) -> None:
+        while True:
+            guild_id, table_id, results = await self.queue.get()
+            tournament = self.tournaments.get(guild_id)
+            if tournament is None or tournament.state != TournamentState.Running:
+                continue
+            try:
+                await self.process_hand(tournament, table_id, results)
+            except Exception:
+                log.error(f"Processing a tournament hand in {table_id}", exc_info=True)
+
+    async def process_hand(self, tournament: Tournament, table_id: int, results: Dict[int, int]) -> None:
+        guild = self.cog.bot.get_guild(tournament.guild_id)
+        busted = tournament.finish_hand(table_id, results)
+        if guild:  # players who left the server forfeit their chips
+            for user_id in [uid for uid in tournament.players_at(table_id) if not guild.get_member(uid)]:
+                tournament.eliminate(user_id)
+                busted.append(user_id)
+        if len(tournament.stacks) <= 1:
+            await self.finish(tournament)
+            return
+        moves = tournament.rebalance(table_id)
+        await self.save(tournament)
+        lines = [f"<@{user_id}> is out of the tournament in place #{len(tournament.stacks) + len(busted) - i}."
+                 for i, user_id in enumerate(busted)]
+        lines += [f"<@{user_id}> moves to <#{target}>." for user_id, target in moves.items()]
+        channel = self.get_table(tournament, table_id)
+        if lines and channel:
+            self.spawn(channel.send("\n".join(lines), allowed_mentions=discord.AllowedMentions.none()))
+        self.schedule_idle_tables(tournament, NEXT_HAND_DELAY)
+
+    def schedule_idle_tables(self, tournament: Tournament, delay: float) -> None:
+        """Starts a hand soon at every table that has enough players and isn't playing one."""
+        for table_id in tournament.tables:
+            game = self.cog.poker_games.get(table_id)
+            if table_id in self.scheduled or (game is not None and not game.is_finished):
+                continue
+            if len(tournament.players_at(table_id)) < 2:
+                continue  # waits for players to be moved here
+            self.scheduled.add(table_id)
+            self.spawn(self.play_hand(tournament, table_id, delay))
+
+    def get_table(self, tournament: Tournament, table_id: int) -> Optional[discord.abc.Messageable]:
+        guild = self.cog.bot.get_guild(tournament.guild_id)
+        if guild is None:
+            return None
+        channel = guild.get_channel_or_thread(table_id)
+        return channel if isinstance(channel, (discord.TextChannel, discord.Thread)) else None
+
+    async def play_hand(self, tournament: Tournament, table_id: int, delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+            channel = self.get_table(tournament, table_id)
+            players = [channel.guild.get_member(uid) for uid in tournament.players_at(table_id)] if channel else []
+            players = [member for member in players if member]
+            if tournament.state != TournamentState.Running or table_id not in tournament.tables or len(players) < 2:
+                return
+            button = tournament.hands.get(table_id, 0) % len(players)
+            players = players[button:] + players[:button]
+            game = TournamentTable(self.cog, players, channel, tournament.big_blind)
+            self.cog.poker_games[table_id] = game
+        finally:
+            self.scheduled.discard(table_id)
+        await game.start_hand()
+        await game.update_message()
+
+    async def tick(self) -> None:
+        while True:
+            await asyncio.sleep(TICK)
+            now = time.time()
+            for tournament in list(self.tournaments.values()):
+                if tournament.state != TournamentState.Running:
+                    continue
+                if now - tournament.level_started >= BLIND_LEVEL_TIME and tournament.level < len(BLIND_LEVELS) - 1:
+                    tournament.level += 1
+                    tournament.level_started = now
+                    self.spawn(self.save(tournament))
+                    self.spawn(self.announce(tournament, f"⏫ Blinds are now {tournament.big_blind // 2}/{tournament.big_blind} from the next hand."))
+                for table_id in tournament.tables:
+                    game = self.cog.poker_games.get(table_id)
+                    if isinstance(game, TournamentTable) and not game.is_finished and game.turn is not None \
+                            and (datetime.now() - game.last_interacted).total_seconds() >= TURN_TIME_LIMIT:
+                        self.spawn(self.act_for_idle(game))
+
+    async def act_for_idle(self, game: TournamentTable) -> None:
+        player = game.current_player()
+        if player is None or game.is_finished:
+            return
+        if game.can_check:
+            await game.check(player.id)
+        else:
+            await game.fold(player.id)
+        if game.view:
+            game.view.stop()
+        await game.update_message()
+
+    async def announce(self, tournament: Tournament, content: str) -> None:
+        guild = self.cog.bot.get_guild(tournament.guild_id)
+        channel = guild.get_channel(tournament.channel_id) if guild else None
+        if isinstance(channel, discord.TextChannel):
+            await channel.send(content, allowed_mentions=discord.AllowedMentions.none())
+
+    async def finish(self, tournament: Tournament) -> None:
+        """Pays out the prizes and ends the tournament."""
+        tournament.state = TournamentState.Finished
+        await self.save(tournament)
+        guild = self.cog.bot.get_guild(tournament.guild_id)
+        currency_name = await self.cog.get_currency_name(guild) if guild else ""
+        lines = ["🏆 **The tournament is over!**"]
+        prizes = dict(zip(tournament.standings(), tournament.prizes()))
+        for place, (user_id, prize) in enumerate(prizes.items(), 1):
+            lines.append(f"**{place}.** <@{user_id}> wins {prize:,} {currency_name}")
+        del self.tournaments[tournament.guild_id]
+        if guild:
+            await self.cog.settlements.settle(guild, prizes)
+        await self.announce(tournament, "\n".join(lines))
+
+    async def cancel(self, tournament: Tournament) -> None:
+        """Gives everyone their buy-in back and stops every table."""
+        guild = self.cog.bot.get_guild(tournament.guild_id)
+        entrants = list(tournament.stacks) + tournament.eliminated
+        for table_id in tournament.tables:
+            game = self.cog.poker_games.get(table_id)
+            if isinstance(game, TournamentTable) and not game.is_finished:
+                game.is_cancelled = True
+                if game.view:
+                    game.view.stop()
+                await game.flush_state()
+        tournament.state = TournamentState.Finished
+        await self.save(tournament)
+        del self.tournaments[tournament.guild_id]
+        if guild:
+            await self.cog.settlements.settle(guild, {user_id: tournament.buy_in for user_id in entrants})
+
@@ -3,6 +3,8 @@ import discord
 from typing import Any, Awaitable, Callable, Optional
 from redbot.core.utils.chat_formatting import humanize_number
 
+from simplecasino.metrics import timed
+
 MAX_BUTTON_LENGTH = 80
 
 
@@ -18,6 +20,7 @@ class AgainView(discord.ui.View):
         self.again_button.callback = self.again
         self.add_item(self.again_button)
 
+    @timed("again")
     async def again(self, interaction: discord.Interaction):
         await self.callback(interaction, self.bet)
         
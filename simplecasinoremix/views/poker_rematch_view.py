@@ -1,29 +1,36 @@
-
-
-
 import discord
 
 from simplecasino.base import BasePokerGame
 
 
 class PokerRematchView(discord.ui.View):
+    """Between the hands of a session, to deal the next one in the same message."""
+
     def __init__(self, game: BasePokerGame):
         super().__init__(timeout=300)
         self.game = game
 
-    @discord.ui.button(label="Play another round", style=discord.ButtonStyle.primary)
+    @discord.ui.button(label="Next hand", style=discord.ButtonStyle.primary)
     async def rematch(self, interaction: discord.Interaction, _):
-        if interaction.user.id not in self.game.players_ids:
-            return await interaction.response.send_message("You didn't participate in this game, but you could start a new one.", ephemeral=True)
-        members = [self.game.channel.guild.get_member(uid) for uid in self.game.players_ids]
-        members = [m for m in members if m]
-        if len(members) < 2:
-            return await interaction.response.send_message("Failed to start the game as some players couldn't be found.", ephemeral=True)
-        members_shifted = members[1:] + [members[0]]
-        success = await self.game.cog.poker(interaction, members_shifted, self.game.minimum_bet)
-        if success:
-            self.stop()
-            await self.on_timeout()
+        if interaction.user.id not in self.game.players_ids or interaction.user.id in self.game.leaving:
+            return await interaction.response.send_message("You're not sitting at this table, but you could start a new game.", ephemeral=True)
+        if self.game.cog.poker_games.get(self.game.channel.id) is not self.game:
+            return await interaction.response.send_message("Another game of Poker has already begun in this channel.", ephemeral=True)
+        if self.is_finished() or not self.game.is_finished:
+            return await interaction.response.send_message("The next hand was already dealt.", ephemeral=True)
+        self.stop()
+        await interaction.response.defer()  # the bots play their first turns before the message is updated
+        if not await self.game.next_hand():
+            await interaction.edit_original_response(view=None)
+            return await interaction.followup.send("There aren't enough players left at the table to deal another hand. It takes at least two people besides the bots.")
+        await self.game.update_message(interaction)
+
+    @discord.ui.button(label="Leave table", style=discord.ButtonStyle.secondary)
+    async def leave(self, interaction: discord.Interaction, _):
+        if interaction.user.id not in self.game.players_ids or interaction.user.id in self.game.leaving:
+            return await interaction.response.send_message("You're not sitting at this table.", ephemeral=True)
+        self.game.leaving.add(interaction.user.id)
+        await interaction.response.send_message(f"{interaction.user.mention} left the table.", allowed_mentions=discord.AllowedMentions.none())
 
     async def on_timeout(self) -> None:
         await super().on_timeout()
@@ -4,10 +4,13 @@
 import re
 import logging
 import discord
-from redbot.core import bank
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Tuple
 from redbot.core.utils.chat_formatting import humanize_number
 
 from simplecasino.base import BasePokerGame
+from simplecasino.metrics import timed
 from simplecasino.utils import InsufficientFundsError
 
 log = logging.getLogger("red.crab-cogs.simplecasino.poker")
@@ -19,6 +22,23 @@ ERROR_PLAYING = "You're not playing this game!"
 ERROR_TURN = "It's not your turn!"
 
 
+@lru_cache(maxsize=256)
+def raise_ladder(minimum_bet: int) -> Tuple[int, ...]:
+    """The amounts a bet can be raised to, each a round number about a factor bigger than the last."""
+    raise_values = [minimum_bet * (RAISE_BET_FACTOR ** x) for x in range(MAX_OPTIONS)]  # multiply each consecutive step by the factor
+    raise_values = [int(val // 100) * 100 if val > 1000  # round to hundreds
+                    else int(val // 10) * 10 if val > 100  # round to tens
+                    else int(val)
+                    for val in raise_values]
+    return tuple(sorted(set(raise_values)))  # small bets round to the same amount more than once
+
+
+@lru_cache(maxsize=256)
+def raise_labels(minimum_bet: int, currency_name: str) -> Tuple[str, ...]:
+    currency_name = re.sub(r"<a?:(\w+):\d+>", r"\1", currency_name)  # extract emoji name
+    return tuple(f"{humanize_number(val)} {currency_name}" for val in raise_ladder(minimum_bet))
+
+
 class PokerView(discord.ui.View):
     def __init__(self, game: BasePokerGame, cur_player_money: int, cur_player_bet: int, currency_name: str):
         super().__init__(timeout=None)
@@ -76,14 +96,10 @@ class PokerView(discord.ui.View):
         self.add_item(self.view_button)
         self.add_item(self.bump_button)
 
-        currency_name = re.sub(r"<a?:(\w+):\d+>", r"\1", currency_name)  # extract emoji name
-        raise_values = [game.minimum_bet * (RAISE_BET_FACTOR ** x) for x in range(MAX_OPTIONS)]  # multiply each consecutive step by the factor
-        raise_values = [int(val // 100) * 100 if val > 1000  # round to hundreds
-                        else int(val // 10) * 10 if val > 100  # round to tens
-                        else int(val)
-                        for val in raise_values]
-        raise_values = [val for val in raise_values if val > game.current_bet and val <= cur_player_money]  # only valid amounts
-        raise_options = [discord.SelectOption(label=f"{humanize_number(val)} {currency_name}", value=f"{val}") for val in raise_values]
+        ladder = raise_ladder(game.minimum_bet)
+        labels = raise_labels(game.minimum_bet, currency_name)
+        valid = range(bisect_right(ladder, game.current_bet), bisect_right(ladder, cur_player_money))  # only valid amounts
+        raise_options = [discord.SelectOption(label=labels[i], value=str(ladder[i])) for i in valid]
         if raise_options:
             self.raise_select = discord.ui.Select(
                 custom_id=f"poker {game.channel.id} raise",
@@ -94,6 +110,7 @@ class PokerView(discord.ui.View):
             self.raise_select.callback = self.raisebet
             self.add_item(self.raise_select)
 
+    @timed("poker.fold")
     async def fold(self, interaction: discord.Interaction):
         assert self.game.turn is not None
         if interaction.user.id not in self.game.players_ids:
@@ -101,9 +118,11 @@ class PokerView(discord.ui.View):
         if interaction.user.id != self.game.players_ids[self.game.turn]:
             return await interaction.response.send_message(ERROR_TURN, ephemeral=True)
         self.stop()
+        await interaction.response.defer()  # the bots and any all-in runout play out before the message is updated
         await self.game.fold(interaction.user.id)
         await self.game.update_message(interaction)
     
+    @timed("poker.check")
     async def check(self, interaction: discord.Interaction):
         assert self.game.turn is not None
         if interaction.user.id not in self.game.players_ids:
@@ -113,9 +132,11 @@ class PokerView(discord.ui.View):
         if not self.game.can_check:
             return await interaction.response.send_message("You can't check right now.", ephemeral=True)
         self.stop()
+        await interaction.response.defer()  # the bots and any all-in runout play out before the message is updated
         await self.game.check(interaction.user.id)
         await self.game.update_message(interaction)
 
+    @timed("poker.call")
     async def call(self, interaction: discord.Interaction):
         assert self.game.turn is not None
         if interaction.user.id not in self.game.players_ids:
@@ -123,26 +144,30 @@ class PokerView(discord.ui.View):
         if interaction.user.id != self.game.players_ids[self.game.turn]:
             return await interaction.response.send_message(ERROR_TURN, ephemeral=True)
 
+        await interaction.response.defer()  # the bots and any all-in runout play out before the message is updated
         try:
             await self.game.bet(interaction.user.id, self.game.current_bet)
-        except InsufficientFundsError:
-            currency_name = await bank.get_currency_name(interaction.guild)
-            return await interaction.response.send_message(f"You don't have enough {currency_name} to call!", ephemeral=True)
+        except (InsufficientFundsError, ValueError):  # ValueError when the bank refuses the withdrawal
+            currency_name = await self.game.get_currency_name()
+            return await interaction.followup.send(f"You don't have enough {currency_name} to call!", ephemeral=True)
         
         self.stop()
         await self.game.update_message(interaction)
 
+    @timed("poker.view")
     async def view(self, interaction: discord.Interaction):
         if interaction.user.id not in self.game.players_ids:
             return await interaction.response.send_message(ERROR_PLAYING, ephemeral=True)
         await self.game.send_cards(interaction)
 
+    @timed("poker.bump")
     async def bump(self, interaction: discord.Interaction):
         if interaction.user.id not in self.game.players_ids:
             return await interaction.response.send_message(ERROR_PLAYING, ephemeral=True)
         self.stop()
         await self.game.update_message(None)
 
+    @timed("poker.raise")
     async def raisebet(self, interaction: discord.Interaction):
         assert self.game.turn is not None
         if interaction.user.id not in self.game.players_ids:
@@ -150,12 +175,13 @@ class PokerView(discord.ui.View):
         if interaction.user.id != self.game.players_ids[self.game.turn]:
             return await interaction.response.send_message(ERROR_TURN, ephemeral=True)
         
+        await interaction.response.defer()  # the bots and any all-in runout play out before the message is updated
         try:
             new_bet = int(interaction.data['values'][0])  # type: ignore
             await self.game.bet(interaction.user.id, new_bet)
-        except InsufficientFundsError:
-            currency_name = await bank.get_currency_name(interaction.guild)
-            return await interaction.response.send_message(f"You don't have enough {currency_name} to raise the bet!", ephemeral=True)
+        except (InsufficientFundsError, ValueError):  # ValueError when the bank refuses the withdrawal
+            currency_name = await self.game.get_currency_name()
+            return await interaction.followup.send(f"You don't have enough {currency_name} to raise the bet!", ephemeral=True)
 
         self.stop()
         await self.game.update_message(interaction)
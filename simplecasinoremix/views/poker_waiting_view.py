@@ -5,11 +5,12 @@ import discord
 from redbot.core import bank
 
 from simplecasino.base import BasePokerGame
-from simplecasino.utils import PokerState
+from simplecasino.pokercore import is_bot
+from simplecasino.utils import PokerState, InsufficientFundsError
 
 
 class PokerWaitingView(discord.ui.View):
-    def __init__(self, game: BasePokerGame):
+    def __init__(self, game: BasePokerGame, allow_bots: bool = False):
         super().__init__(timeout=None)
         self.game = game
         self.join_button = discord.ui.Button(
@@ -33,14 +34,23 @@ class PokerWaitingView(discord.ui.View):
             label="Cancel",
             style=discord.ButtonStyle.danger
         )
+        self.bot_button = discord.ui.Button(
+            custom_id=f"poker {game.channel.id} bot",
+            emoji="🤖",
+            label="Add bot",
+            style=discord.ButtonStyle.secondary
+        )
         self.join_button.callback = self.join
         self.leave_button.callback = self.leave
         self.start_button.callback = self.start
         self.cancel_button.callback = self.cancel
+        self.bot_button.callback = self.add_bot
         self.add_item(self.join_button)
         self.add_item(self.leave_button)
         self.add_item(self.start_button)
         self.add_item(self.cancel_button)
+        if allow_bots:
+            self.add_item(self.bot_button)
 
     async def join(self, interaction: discord.Interaction):
         assert isinstance(interaction.user, discord.Member)
@@ -48,7 +58,7 @@ class PokerWaitingView(discord.ui.View):
         if not success:
             return await interaction.response.send_message(message, ephemeral=True)
         if not await bank.can_spend(interaction.user, self.game.minimum_bet):
-            currency_name = await bank.get_currency_name(interaction.guild)
+            currency_name = await self.game.cog.get_currency_name(interaction.guild)
             return await interaction.response.send_message(f"You need to own at least {self.game.minimum_bet} {currency_name} to join.", ephemeral=True)
         self.leave_button.disabled = True
         await interaction.response.edit_message(embed=await self.game.get_embed(), view=self)
@@ -60,29 +70,53 @@ class PokerWaitingView(discord.ui.View):
         self.leave_button.disabled = len(self.game.players_ids) == 1
         await interaction.response.edit_message(embed=await self.game.get_embed(), view=self)
 
+    async def add_bot(self, interaction: discord.Interaction):
+        if interaction.user.id != self.game.host:
+            return await interaction.response.send_message("Only the host of the table can add bots.", ephemeral=True)
+        assert interaction.guild
+        if not await bank.can_spend(interaction.guild.me, self.game.minimum_bet):
+            currency_name = await self.game.cog.get_currency_name(interaction.guild)
+            return await interaction.response.send_message(f"Bots play with the house's {currency_name}, and there isn't enough left.", ephemeral=True)
+        success, message = self.game.try_add_bot()
+        if not success:
+            return await interaction.response.send_message(message, ephemeral=True)
+        self.leave_button.disabled = len(self.game.players_ids) == 1
+        await interaction.response.edit_message(embed=await self.game.get_embed(), view=self)
+
     async def start(self, interaction: discord.Interaction):
         assert interaction.guild
         if len(self.game.players_ids) < 2:
             return await interaction.response.send_message("The game needs at least 2 players.", ephemeral=True)
-        if interaction.user.id != self.game.players_ids[0]:
-            return await interaction.response.send_message("Only the dealer can start the game.", ephemeral=True)
+        if interaction.user.id != self.game.host:
+            return await interaction.response.send_message("Only the host of the table can start the game.", ephemeral=True)
         if self.game.state != PokerState.WaitingForPlayers:
             return await interaction.response.send_message("The game already started.", ephemeral=True)
         for pid in self.game.players_ids:
+            if is_bot(pid):
+                if not await bank.can_spend(interaction.guild.me, self.game.minimum_bet):
+                    currency_name = await self.game.cog.get_currency_name(interaction.guild)
+                    return await interaction.response.send_message(f"The house doesn't have enough {currency_name} left for the bots to play.")
+                continue
             member = interaction.guild.get_member(pid)
             if not member:
                 return await interaction.response.send_message(f"There was a problem starting the game: <@{pid}> could not be found.", ephemeral=True)
             if not await bank.can_spend(member, self.game.minimum_bet):
-                currency_name = await bank.get_currency_name(interaction.guild)
+                currency_name = await self.game.cog.get_currency_name(interaction.guild)
                 return await interaction.response.send_message(f"{member.mention} doesn't have enough {currency_name} to start the game.")
         self.stop()
-        await self.game.start_hand()
+        await interaction.response.defer()  # the bots play their first turns before the message is updated
+        try:
+            await self.game.start_hand()
+        except (InsufficientFundsError, ValueError):  # someone spent their money in the meantime
+            await self.game.update_message(interaction)
+            currency_name = await self.game.cog.get_currency_name(interaction.guild)
+            return await interaction.followup.send(f"Someone doesn't have enough {currency_name} for the blinds anymore.", ephemeral=True)
         await self.game.update_message(interaction)
 
     async def cancel(self, interaction: discord.Interaction):
         assert interaction.message and isinstance(interaction.user, discord.Member)
-        if interaction.user.id != self.game.players_ids[0]:
-            return await interaction.response.send_message("Only the dealer can cancel the game.", ephemeral=True)
+        if interaction.user.id != self.game.host:
+            return await interaction.response.send_message("Only the host of the table can cancel the game.", ephemeral=True)
         if self.game.state != PokerState.WaitingForPlayers:
             return await interaction.response.send_message("The game already started.", ephemeral=True)
         self.stop()